@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный тест HTTP API бота.
+
+Поднимает то же aiohttp-приложение, что и run(), на временной БД и временной
+папке фото; вместо Telegram — FakeBot, который только записывает отправленные
+сообщения. Для каждого сценария печатает p50/p95/p99 и запросы в секунду и
+сохраняет результат в JSON, чтобы сравнивать коммиты между собой.
+
+    python bot/bench.py                          # все сценарии
+    python bot/bench.py -c 100 -n 5000 cats order
+    python bot/bench.py -o new.json --compare old.json
+
+С DB_BACKEND=postgres и DATABASE_URL тест идёт на PostgreSQL (база должна быть пустой).
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import logging
+import asyncio
+import argparse
+import platform
+import tempfile
+import subprocess
+import statistics
+from datetime import datetime
+
+import aiohttp
+from aiohttp import web
+
+API_SECRET = 'bench-secret'
+SMALL_PHOTO = 'bench_small.jpg'     # попадает в кэш фото в памяти
+LARGE_PHOTO = 'bench_large.jpg'     # отдаётся через FileResponse
+
+
+class FakeBot:
+    """Подменяет telegram.Bot: запоминает сообщения вместо отправки."""
+
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, chat_id, text, parse_mode=None, **kwargs):
+        self.sent.append((chat_id, len(text)))
+
+
+# ──────────────── Сценарии ────────────────
+# Каждый сценарий — функция (номер запроса, состояние) → (метод, путь, kwargs)
+def _order_body(i):
+    # Позиции без id не бронируют котов, поэтому каждый заказ успешен
+    return {
+        'name': 'Bench {}'.format(i), 'phone': '+7900{:07d}'.format(i),
+        'address': 'ул. Тестовая, {}'.format(i), 'comment': '',
+        'items': [{'id': None, 'name': 'Котёнок', 'breed': 'Bench', 'price': 10000 + i}],
+    }
+
+
+SCENARIOS = {
+    'cats':        lambda i, st: ('GET', '/cats', {}),
+    'cats_etag':   lambda i, st: ('GET', '/cats', {'headers': {'If-None-Match': st['etag']}}),
+    'cats_page':   lambda i, st: ('GET', '/cats', {'params': {
+        'sort': random.choice(('new', 'price_asc', 'price_desc', 'age_asc')),
+        'limit': '24'}}),
+    'search':      lambda i, st: ('GET', '/cats/search', {'params': {
+        'q': random.choice(('сфинкс', 'рыжий', 'мейн кун', 'британ', 'ласковый'))}}),
+    'photo_small': lambda i, st: ('GET', '/photos/' + SMALL_PHOTO, {}),
+    'photo_large': lambda i, st: ('GET', '/photos/' + LARGE_PHOTO, {}),
+    'order':       lambda i, st: ('POST', '/order', {
+        'json': _order_body(i), 'headers': {'X-Secret': API_SECRET}}),
+    'feedback':    lambda i, st: ('POST', '/feedback', {
+        'json': {'name': 'Bench', 'subject': 'Вопрос', 'message': 'Сообщение {}'.format(i)},
+        'headers': {'X-Secret': API_SECRET}}),
+}
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    k = min(len(sorted_values) - 1, max(0, round(p / 100 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+async def drive(session, base_url, scenario, state, total, concurrency):
+    """Гоняет total запросов сценария в concurrency параллельных потоков."""
+    make_request = SCENARIOS[scenario]
+    latencies, statuses, errors = [], {}, 0
+    numbers = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for i in numbers:
+            method, path, kwargs = make_request(i, state)
+            start = time.perf_counter()
+            try:
+                async with session.request(method, base_url + path, **kwargs) as resp:
+                    await resp.read()
+                    status = resp.status
+            except aiohttp.ClientError:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+            statuses[status] = statuses.get(status, 0) + 1
+            if status >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    ms = lambda v: round(v * 1000, 3)
+    return {
+        'requests':   total,
+        'errors':     errors,
+        'statuses':   {str(k): v for k, v in sorted(statuses.items())},
+        'seconds':    round(elapsed, 3),
+        'rps':        round(total / elapsed, 1) if elapsed else 0.0,
+        'mean_ms':    ms(statistics.fmean(latencies)) if latencies else 0.0,
+        'p50_ms':     ms(percentile(latencies, 50)),
+        'p95_ms':     ms(percentile(latencies, 95)),
+        'p99_ms':     ms(percentile(latencies, 99)),
+        'max_ms':     ms(latencies[-1]) if latencies else 0.0,
+    }
+
+
+# ──────────────── Окружение ────────────────
+def prepare_env(tmp):
+    """Настройки бота задаются до импорта bot.py — он читает их при загрузке."""
+    photos = os.path.join(tmp, 'photos')
+    os.makedirs(photos)
+    with open(os.path.join(photos, SMALL_PHOTO), 'wb') as f:
+        f.write(os.urandom(40 * 1024))
+    with open(os.path.join(photos, LARGE_PHOTO), 'wb') as f:
+        f.write(os.urandom(1024 * 1024))
+    os.environ.update({
+        'BOT_TOKEN':     'bench',
+        'DB_PATH':       os.path.join(tmp, 'bench.db'),
+        'PHOTOS_DIR':    photos,
+        'API_SECRET':    API_SECRET,
+        'ADMIN_CHAT_ID': '1',
+        'WEBHOOK_URL':   '',
+        # Все запросы бенчмарка идут с одного адреса — лимит на клиента тут не мерится
+        'POST_RATE_BURST': '1000000000',
+    })
+
+
+async def seed_cats(bot, count):
+    breeds = ('Британская', 'Мейн-кун', 'Сфинкс', 'Шотландская', 'Бенгальская')
+    colors = ('рыжий', 'серый', 'чёрный', 'белый', 'пятнистый')
+    rnd = random.Random(42)
+    for i in range(count):
+        await bot.db_add_cat(
+            'Кот {}'.format(i), rnd.choice(breeds), rnd.randint(2, 24),
+            rnd.choice(('male', 'female')), rnd.randint(5, 150) * 1000,
+            rnd.choice(colors), 'Ласковый и игривый котёнок №{}'.format(i), '',
+        )
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5,
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ''
+
+
+async def bench(args):
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import bot
+    logging.getLogger('bot').setLevel(logging.WARNING)
+
+    fake = FakeBot()
+    bot._bot = fake
+    bot._db = bot.create_storage()
+    await bot._db.open()
+    await bot.init_db()
+    await seed_cats(bot, args.cats)
+    bot.build_photo_index()
+
+    runner = web.AppRunner(bot.create_http_app(), access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    base_url = 'http://{}:{}'.format(host, port)
+    dispatcher = asyncio.create_task(bot.outbox_dispatcher())
+
+    results = {}
+    try:
+        connector = aiohttp.TCPConnector(limit=args.concurrency)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            async with session.get(base_url + '/cats') as resp:
+                state = {'etag': resp.headers.get('ETag', '')}
+            for name in args.scenarios:
+                if args.warmup:
+                    await drive(session, base_url, name, state, args.warmup, args.concurrency)
+                results[name] = await drive(
+                    session, base_url, name, state, args.requests, args.concurrency)
+                print(format_row(name, results[name]))
+    finally:
+        dispatcher.cancel()
+        await asyncio.gather(dispatcher, return_exceptions=True)
+        await runner.cleanup()
+        await bot._db.close()
+
+    return {
+        'commit':      git_commit(),
+        'date':        datetime.now().isoformat(timespec='seconds'),
+        'python':      platform.python_version(),
+        'concurrency': args.concurrency,
+        'cats':        args.cats,
+        'telegram_sent': len(fake.sent),
+        'scenarios':   results,
+    }
+
+
+# ──────────────── Отчёт ────────────────
+HEADER = '{:<12} {:>9} {:>7} {:>9} {:>9} {:>9} {:>9}'.format(
+    'scenario', 'rps', 'errors', 'p50 ms', 'p95 ms', 'p99 ms', 'max ms')
+
+
+def format_row(name, r):
+    return '{:<12} {:>9} {:>7} {:>9} {:>9} {:>9} {:>9}'.format(
+        name, r['rps'], r['errors'], r['p50_ms'], r['p95_ms'], r['p99_ms'], r['max_ms'])
+
+
+def print_comparison(old, new):
+    print('\nСравнение с {} ({}):'.format(old.get('commit') or '?', old.get('date', '')))
+    print('{:<12} {:>10} {:>10} {:>10}'.format('scenario', 'rps', 'p50', 'p99'))
+    for name, r in new['scenarios'].items():
+        prev = old.get('scenarios', {}).get(name)
+        if not prev:
+            continue
+        delta = lambda key: '{:+.1f}%'.format((r[key] / prev[key] - 1) * 100) if prev[key] else '—'
+        print('{:<12} {:>10} {:>10} {:>10}'.format(name, delta('rps'), delta('p50_ms'), delta('p99_ms')))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Нагрузочный тест HTTP API бота')
+    parser.add_argument('scenarios', nargs='*', default=list(SCENARIOS),
+                        help='сценарии: ' + ', '.join(SCENARIOS))
+    parser.add_argument('-n', '--requests', type=int, default=2000, help='запросов на сценарий')
+    parser.add_argument('-c', '--concurrency', type=int, default=50, help='параллельных клиентов')
+    parser.add_argument('-w', '--warmup', type=int, default=200, help='запросов на прогрев')
+    parser.add_argument('--cats', type=int, default=200, help='сколько котов добавить в каталог')
+    parser.add_argument('-o', '--output', default='bench_results.json', help='куда сохранить JSON')
+    parser.add_argument('--compare', help='JSON предыдущего прогона для сравнения')
+    args = parser.parse_args(argv)
+    unknown = [s for s in args.scenarios if s not in SCENARIOS]
+    if unknown:
+        parser.error('неизвестные сценарии: ' + ', '.join(unknown))
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    with tempfile.TemporaryDirectory(prefix='cats-bench-') as tmp:
+        prepare_env(tmp)
+        print(HEADER)
+        report = asyncio.run(bench(args))
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print('\nРезультаты сохранены: {} (сообщений в Telegram: {})'.format(
+        args.output, report['telegram_sent']))
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            print_comparison(json.load(f), report)
+
+
+if __name__ == '__main__':
+    main()
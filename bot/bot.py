@@ -5,23 +5,59 @@ Telegram Bot для магазина котов.
 И Telegram Bot polling — одновременно.
 """
 
+import io
 import os
+import re
+import csv
+import hmac
+import gzip
+import json
+import hashlib
+import stat
+import socket
+import time
+import zlib
 import asyncio
 import logging
-import aiosqlite
-from datetime import datetime
-
-from aiohttp import web
+import mimetypes
+import contextlib
+import tempfile
+import multiprocessing
+from urllib.parse import parse_qsl
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from aiohttp import web, hdrs, ClientSession, UnixConnector
 from dotenv import load_dotenv
 from telegram import (
     Update, WebAppInfo,
     KeyboardButton, ReplyKeyboardMarkup, ReplyKeyboardRemove,
+    InlineKeyboardButton, InlineKeyboardMarkup,
 )
+from telegram.error import BadRequest, Forbidden, RetryAfter
 from telegram.ext import (
-    Application, CommandHandler, ConversationHandler,
+    Application, CommandHandler, ConversationHandler, CallbackQueryHandler,
     MessageHandler, filters, ContextTypes,
 )
 
+try:
+    from PIL import Image, ImageOps
+except ImportError:          # без Pillow фото сохраняются как есть, без превью
+    Image = ImageOps = None
+
+try:
+    import brotli
+except ImportError:          # без Brotli ответы сжимаются только gzip
+    brotli = None
+
+import metrics
+import templates
+from storage import (
+    CAT_FIELDS, CAT_SORTS, CatsUnavailable, PostgresStorage, SqliteStorage,
+)
+
 load_dotenv()
 
 logging.basicConfig(
@@ -37,13 +73,96 @@ ADMIN_CHAT_ID = os.getenv('ADMIN_CHAT_ID', '')  # основной (для ув
 ADMIN_IDS     = set(i.strip() for i in ADMIN_CHAT_ID.split(',') if i.strip())
 GROUP_CHAT_ID = os.getenv('GROUP_CHAT_ID', '')
 API_SECRET    = os.getenv('API_SECRET', 'cats-shop-secret')
+# Токен для админских HTTP-методов (импорт/экспорт каталога). Пусто — они выключены.
+# API_SECRET для этого не годится: он лежит в app.js у всех покупателей.
+ADMIN_TOKEN   = os.getenv('ADMIN_TOKEN', '')
 PORT          = int(os.getenv('PORT', 8080))
 DB_PATH       = os.getenv('DB_PATH', 'cats.db')
+# Где хранить данные: sqlite (файл DB_PATH) или postgres (DATABASE_URL, общая для реплик БД)
+DB_BACKEND    = os.getenv('DB_BACKEND', 'sqlite').lower()
+DATABASE_URL  = os.getenv('DATABASE_URL', '')
 PUBLIC_URL    = os.getenv('PUBLIC_URL', '').rstrip('/')   # https://cats-shop-production.up.railway.app
 PHOTOS_DIR    = os.getenv('PHOTOS_DIR', 'photos')
-
-# Глобальная ссылка на бота
+# Webhook вместо polling: https://.../telegram/webhook. Пусто — polling (локальный запуск)
+WEBHOOK_URL    = os.getenv('WEBHOOK_URL', '')
+WEBHOOK_PATH   = '/telegram/webhook'
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET') or hashlib.sha256(BOT_TOKEN.encode()).hexdigest()[:32]
+DB_READERS    = int(os.getenv('DB_READERS', 4))       # сколько соединений держать для чтения
+DB_POOL_SIZE  = int(os.getenv('DB_POOL_SIZE', 10))    # максимум соединений с PostgreSQL на процесс
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', 10))
+RESERVATION_TTL     = int(os.getenv('RESERVATION_TTL', 3600))   # сколько секунд держится бронь заказа
+PHOTO_WORKERS       = int(os.getenv('PHOTO_WORKERS', 2))        # процессов для обработки фото
+PHOTO_WIDTHS        = (320, 640, 1080)   # превью для сетки, 2x-сетки и карточки
+PHOTO_CACHE_BYTES   = int(os.getenv('PHOTO_CACHE_BYTES', 32 * 1024 * 1024))  # LRU-кэш мелких фото в памяти
+PHOTO_CACHE_MAX_FILE = 256 * 1024                                            # файлы крупнее не кэшируются
+IMPORT_MAX_BYTES    = 20 * 1024 * 1024   # как и лимит Bot API на скачивание файла
+SSE_HEARTBEAT       = 25      # секунд между комментариями-пингами в /cats/stream
+SSE_BUFFER          = 512     # сколько последних событий помнить для Last-Event-ID
+# Сколько процессов отдают HTTP (один порт, SO_REUSEPORT). Telegram-бот, outbox и
+# снятие брони работают только в главном процессе.
+WEB_WORKERS         = max(1, int(os.getenv('WEB_WORKERS', 1)))
+# Раздавать Mini App (папку docs/) с этого же сервера по /app/. Пусто — не раздавать
+DOCS_DIR            = os.getenv('DOCS_DIR', '')
+# Заказы и обращения с одного IP и от одного пользователя Telegram: POST_RATE_BURST
+# запросов подряд, дальше по одному в POST_RATE_INTERVAL секунд (в каждом процессе)
+POST_RATE_BURST     = int(os.getenv('POST_RATE_BURST', 5))
+POST_RATE_INTERVAL  = float(os.getenv('POST_RATE_INTERVAL', 60))
+POST_MAX_BYTES      = 16 * 1024   # тело /order и /feedback; форма Mini App — пара килобайт
+RATE_LIMIT_KEYS     = 10000       # сколько вёдер помнить; самые давние вытесняются
+# Сколько прокси перед ботом дописывают X-Forwarded-For (на Railway — 1). 0 — брать адрес сокета
+PROXY_HOPS          = int(os.getenv('PROXY_HOPS', 0))
+# Ключ проверки подписи Telegram.WebApp.initData (см. документацию Mini Apps)
+WEBAPP_SECRET       = hmac.new(b'WebAppData', BOT_TOKEN.encode(), hashlib.sha256).digest()
+# Сколько секунд подписанный initData действителен после auth_date: старый, даже с
+# верной подписью, могли перехватить и подставлять снова. Telegram выдаёт новый при каждом открытии
+WEBAPP_MAX_AGE      = int(os.getenv('WEBAPP_MAX_AGE', 24 * 60 * 60))
+# Рассылка о новых котятах: подписчиков за один запрос к БД и отправок одновременно.
+# Темп всё равно ограничивает _send_limiter, одновременность лишь прячет задержку Bot API
+BROADCAST_BATCH       = 200
+BROADCAST_CONCURRENCY = 20
+BROADCAST_LEASE       = 60      # секунд; не продлённую рассылку подхватит другой процесс
+HEALTH_DB_TIMEOUT     = 2.0     # /health/ready: БД, не ответившая за столько секунд, недоступна
+
+# Часовой пояс отчётов: по нему /report делит заказы на дни (одинаково в SQLite и
+# PostgreSQL), в нём же время заказов, брони и обращений в уведомлениях и /orders
+REPORT_TZ           = ZoneInfo(os.getenv('REPORT_TZ', 'UTC'))
+
+# Глобальная ссылка на бота и приложение python-telegram-bot
 _bot = None
+_tg_app = None
+# Хранилище (SqliteStorage или PostgresStorage, создаётся в run())
+_db = None
+# В HTTP-воркере: сессия до главного процесса (через Unix-сокет) для webhook
+_main_session = None
+# Что в этом процессе уже готово (GET /health/ready). В HTTP-воркере бота нет — None
+_ready = {'db': False, 'bot': False, 'http': False}
+_started_at = time.time()
+_startup_steps = {}     # шаг запуска → секунды
+
+# ──────────────── Метрики (GET /metrics) ────────────────
+HTTP_REQUESTS = metrics.Counter(
+    'http_requests_total', 'HTTP-запросы по маршруту, методу и коду ответа',
+    ('route', 'method', 'status'))
+HTTP_SECONDS = metrics.Histogram(
+    'http_request_duration_seconds', 'Время обработки HTTP-запроса', ('route', 'method'))
+DB_SECONDS = metrics.Histogram(
+    'db_query_duration_seconds', 'Время вызова db_* функций', ('func',))
+TG_SECONDS = metrics.Histogram(
+    'telegram_api_duration_seconds', 'Время вызова Bot API', ('method',))
+TG_ERRORS = metrics.Counter(
+    'telegram_api_errors_total', 'Ошибки Bot API по типу', ('method', 'error'))
+TG_PHOTO_SENDS = metrics.Counter(
+    'telegram_photo_sends_total', 'Фото котят: по file_id, загрузкой файла, по URL', ('source',))
+BROADCAST_MESSAGES = metrics.Counter(
+    'broadcast_messages_total', 'Сообщения рассылок: доставлено, бот заблокирован, ошибка',
+    ('result',))
+BOT_HANDLERS = metrics.Counter(
+    'bot_handler_calls_total', 'Вызовы обработчиков команд и шагов диалогов', ('handler',))
+metrics.Gauge('catalog_pages_cached', 'Страниц каталога в кэше', lambda: len(_catalog_pages))
+metrics.Gauge('photo_cache_bytes', 'Байт фото в кэше в памяти', lambda: _photo_bytes_total)
+
+timed_db = metrics.timed(DB_SECONDS)
+counted_handler = metrics.counted(BOT_HANDLERS)
 
 # ──────────────── ConversationHandler states ────────────────
 ADD_NAME, ADD_BREED, ADD_AGE, ADD_GENDER, ADD_PRICE, ADD_COLOR, ADD_DESC, ADD_PHOTO = range(8)
@@ -125,70 +244,1352 @@ SEED_CATS = [
 ]
 
 
+# ──────────────── Хранилище ────────────────
+def create_storage():
+    """Хранилище по DB_BACKEND: sqlite (файл DB_PATH) или postgres (DATABASE_URL)."""
+    if DB_BACKEND == 'sqlite':
+        return SqliteStorage(DB_PATH, readers=DB_READERS)
+    if DB_BACKEND == 'postgres':
+        if not DATABASE_URL:
+            raise RuntimeError('DB_BACKEND=postgres, но DATABASE_URL не задан')
+        return PostgresStorage(DATABASE_URL, pool_size=DB_POOL_SIZE)
+    raise RuntimeError('DB_BACKEND: sqlite или postgres, а не {!r}'.format(DB_BACKEND))
+
+
 # ──────────────── База данных ────────────────
+# SQL живёт в storage.py; здесь — замер времени, сброс кэша каталога и SSE.
 async def init_db():
-    """Инициализирует таблицу cats и заполняет начальными данными если пустая."""
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute('''
-            CREATE TABLE IF NOT EXISTS cats (
-                id          INTEGER PRIMARY KEY AUTOINCREMENT,
-                name        TEXT    NOT NULL,
-                breed       TEXT    NOT NULL DEFAULT 'Донской сфинкс',
-                age_months  INTEGER NOT NULL DEFAULT 3,
-                gender      TEXT    NOT NULL DEFAULT 'male',
-                price       INTEGER NOT NULL,
-                color       TEXT    NOT NULL DEFAULT '',
-                description TEXT    NOT NULL DEFAULT '',
-                image       TEXT    NOT NULL DEFAULT '',
-                available   INTEGER NOT NULL DEFAULT 1
-            )
-        ''')
-        cursor = await db.execute('SELECT COUNT(*) FROM cats')
-        count = (await cursor.fetchone())[0]
-        if count == 0:
-            for cat in SEED_CATS:
-                await db.execute(
-                    'INSERT INTO cats (name,breed,age_months,gender,price,color,description,image,available) '
-                    'VALUES (?,?,?,?,?,?,?,?,?)',
-                    (cat['name'], cat['breed'], cat['age_months'], cat['gender'],
-                     cat['price'], cat['color'], cat['description'], cat['image'],
-                     1 if cat['available'] else 0),
-                )
-        await db.commit()
-    logger.info('БД инициализирована: %s', DB_PATH)
+    """Доводит схему БД до последней версии; новую БД заполняет начальными данными."""
+    current, latest = await _db.init([
+        (cat['name'], cat['breed'], cat['age_months'], cat['gender'], cat['price'],
+         cat['color'], cat['description'], cat['image'], 1 if cat['available'] else 0)
+        for cat in SEED_CATS
+    ])
+    if current == latest:
+        logger.info('Схема БД актуальна (версия %d): %s', latest, _db.label)
+    else:
+        logger.info('Схема БД обновлена: версия %d → %d: %s', current, latest, _db.label)
 
 
+@timed_db
 async def db_get_cats():
-    async with aiosqlite.connect(DB_PATH) as db:
-        db.row_factory = aiosqlite.Row
-        cursor = await db.execute('SELECT * FROM cats ORDER BY id')
-        rows = await cursor.fetchall()
-    return [dict(r) for r in rows]
-
-
-async def db_add_cat(name, breed, age_months, gender, price, color, description, image):
-    async with aiosqlite.connect(DB_PATH) as db:
-        cursor = await db.execute(
-            'INSERT INTO cats (name,breed,age_months,gender,price,color,description,image,available) '
-            'VALUES (?,?,?,?,?,?,?,?,1)',
-            (name, breed, age_months, gender, price, color, description, image),
-        )
-        new_id = cursor.lastrowid
-        await db.commit()
+    return await _db.get_cats()
+
+
+@timed_db
+async def db_get_cat(cat_id):
+    return await _db.get_cat(cat_id)
+
+
+@timed_db
+async def db_set_cat_file_id(cat_id, file_id):
+    """file_id фото котёнка в Telegram; на каталог и его версию не влияет."""
+    await _db.set_cat_file_id(cat_id, file_id)
+
+
+@timed_db
+async def db_get_catalog_version():
+    """Возвращает (version, updated_at) каталога."""
+    return await _db.get_catalog_version()
+
+
+@timed_db
+async def db_query_cats(**query):
+    """Одна страница каталога: (cats, next_after), см. Storage.query_cats."""
+    return await _db.query_cats(**query)
+
+
+@timed_db
+async def db_get_catalog_changes(since, limit):
+    """(version, cats, removed) — изменения после версии since; cats=None — клиенту нужен reset."""
+    return await _db.get_catalog_changes(since, limit)
+
+
+@timed_db
+async def db_search_cats(terms, any_word=False, limit=20):
+    """Полнотекстовый поиск: [(id, snippet, rank)], лучшие совпадения первыми."""
+    return await _db.search_cats(terms, any_word, limit)
+
+
+@timed_db
+async def db_get_catalog_snapshot():
+    """Возвращает (version, updated_at, cats) — версию и строки одним чтением."""
+    return await _db.get_catalog_snapshot()
+
+
+@timed_db
+async def db_add_cat(name, breed, age_months, gender, price, color, description, image,
+                     photo_key=''):
+    new_id, version, row = await _db.add_cat(
+        (name, breed, age_months, gender, price, color, description, image, 1), photo_key)
+    invalidate_catalog()
+    catalog_events.publish('add', version, {'cat': cat_to_api(row)})
     return new_id
 
 
+@timed_db
 async def db_remove_cat(cat_id):
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute('DELETE FROM cats WHERE id=?', (cat_id,))
-        await db.commit()
+    version = await _db.remove_cat(cat_id)
+    invalidate_catalog()
+    if version:
+        catalog_events.publish('remove', version, {'id': cat_id})
 
 
+@timed_db
 async def db_set_available(cat_id, available: bool):
-    async with aiosqlite.connect(DB_PATH) as db:
-        await db.execute('UPDATE cats SET available=? WHERE id=?',
-                         (1 if available else 0, cat_id))
-        await db.commit()
+    """Отмечает котёнка доступным/проданным; бронь при этом снимается."""
+    version = await _db.set_available(cat_id, available)
+    invalidate_catalog()
+    if version:
+        catalog_events.publish('update', version, {
+            'cats': [{'id': cat_id, 'available': bool(available), 'reserved': False}],
+        })
+
+
+@timed_db
+async def db_import_cats(rows):
+    """Добавляет котят пачкой (кортежи CAT_FIELDS) одной транзакцией. Возвращает их число."""
+    if not rows:
+        return 0
+    version = await _db.import_cats(rows)
+    invalidate_catalog()
+    # Отдельных событий нет: открытые /cats/stream получат reset и перечитают каталог
+    catalog_events.observe(version)
+    return len(rows)
+
+
+def db_iter_cats(batch=500):
+    """Весь каталог пачками строк — для экспорта без загрузки всего в память."""
+    return _db.iter_cats(batch)
+
+
+@timed_db
+async def db_enqueue_messages(messages, parse_mode='HTML'):
+    """Кладёт сообщения [(chat_id, text)] в outbox одной транзакцией."""
+    await _db.enqueue_messages(messages, parse_mode)
+    outbox_wakeup.set()
+
+
+@timed_db
+async def db_create_order(name, phone, address, comment, items, chats, render):
+    """Сохраняет заказ, бронирует котят и ставит уведомления в outbox одной транзакцией.
+
+    items — [(cat_id, name, breed, price)] от клиента; цена берётся из каталога,
+    если кот там есть. Каждый котёнок бронируется условным UPDATE на
+    RESERVATION_TTL секунд; если хоть один уже занят — транзакция откатывается
+    и бросается CatsUnavailable. render(order_id, items, total, reserved_until)
+    строит текст уведомления. Возвращает id заказа.
+    """
+    now = int(time.time())
+    order_id, reserved, version = await _db.create_order(
+        name, phone, address, comment, items, chats, render, now, now + RESERVATION_TTL)
+    if reserved:
+        invalidate_catalog()
+        catalog_events.publish('update', version, {
+            'cats': [{'id': cat_id, 'reserved': True} for cat_id in reserved],
+        })
+    outbox_wakeup.set()
+    return order_id
+
+
+@timed_db
+async def db_set_order_status(order_id, status):
+    """Меняет статус заказа (new / done / cancelled). False — заказа нет.
+
+    done — котята из заказа отмечаются проданными, cancelled — бронь снимается.
+    """
+    result = await _db.set_order_status(order_id, status)
+    if result is None:
+        return False
+    changed, version = result
+    change = {'available': False, 'reserved': False} if status == 'done' else {'reserved': False}
+    invalidate_catalog()
+    if version:
+        catalog_events.publish('update', version, {
+            'cats': [dict(change, id=cat_id) for cat_id in changed],
+        })
+    return True
+
+
+@timed_db
+async def db_expire_reservations():
+    """Снимает просроченные брони. Возвращает число освобождённых котят."""
+    expired, version = await _db.expire_reservations(int(time.time()))
+    if expired:
+        invalidate_catalog()
+        catalog_events.publish('update', version, {
+            'cats': [{'id': cat_id, 'reserved': False} for cat_id in expired],
+        })
+    return len(expired)
+
+
+@timed_db
+async def db_get_pending_orders(limit=20):
+    """Необработанные заказы, новые сверху, с числом котят в каждом."""
+    return await _db.get_pending_orders(limit)
+
+
+@timed_db
+async def db_revenue_by_day(since):
+    """Выручка и число заказов по дням REPORT_TZ (без отменённых) начиная с since (unix time)."""
+    return await _db.revenue_by_day(since, REPORT_TZ.key)
+
+
+@timed_db
+async def db_orders_per_cat(since, limit=15):
+    """Сколько раз заказывали каждого котёнка и сколько заказов завершены продажей."""
+    return await _db.orders_per_cat(since, limit)
+
+
+@timed_db
+async def db_get_due_outbox(limit=50):
+    """Сообщения outbox, которые пора отправить, и время следующего по очереди."""
+    return await _db.get_due_outbox(limit)
+
+
+@timed_db
+async def db_outbox_sent(msg_id):
+    await _db.outbox_sent(msg_id)
+
+
+@timed_db
+async def db_outbox_failed(msg_id, attempts, error, retry_at=None):
+    """Фиксирует неудачную попытку; retry_at=None — больше не пытаться."""
+    await _db.outbox_failed(msg_id, attempts, error[:500], retry_at)
+
+
+@timed_db
+async def db_add_subscriber(chat_id, first_name):
+    """Запоминает пользователя из /start; возвращает, подписан ли он."""
+    return await _db.add_subscriber(chat_id, first_name or '', int(time.time()))
+
+
+@timed_db
+async def db_set_subscribed(chat_id, active: bool):
+    return await _db.set_subscribed(chat_id, active, int(time.time()))
+
+
+@timed_db
+async def db_deactivate_subscribers(chat_ids):
+    await _db.deactivate_subscribers(chat_ids, int(time.time()))
+
+
+@timed_db
+async def db_count_subscribers():
+    return await _db.count_subscribers()
+
+
+@timed_db
+async def db_subscribers_after(after_id, limit=BROADCAST_BATCH):
+    return await _db.subscribers_after(after_id, limit)
+
+
+@timed_db
+async def db_create_broadcast(cat_id, chat_id, message_id):
+    """Новая рассылка: (id, число подписчиков)."""
+    return await _db.create_broadcast(cat_id, chat_id, message_id, int(time.time()))
+
+
+@timed_db
+async def db_get_broadcast(broadcast_id):
+    return await _db.get_broadcast(broadcast_id)
+
+
+@timed_db
+async def db_get_running_broadcasts():
+    return await _db.get_running_broadcasts()
+
+
+@timed_db
+async def db_claim_broadcast(broadcast_id):
+    now = time.time()
+    return await _db.claim_broadcast(broadcast_id, BROADCAST_OWNER, now, now + BROADCAST_LEASE)
+
+
+@timed_db
+async def db_save_broadcast_progress(broadcast_id, after_id, sent, failed, status='running'):
+    return await _db.save_broadcast_progress(broadcast_id, after_id, sent, failed, status,
+                                             int(time.time()))
+
+
+@timed_db
+async def db_cancel_broadcast(broadcast_id):
+    return await _db.cancel_broadcast(broadcast_id, int(time.time()))
+
+
+# ──────────────── Импорт и экспорт каталога ────────────────
+GENDERS = {
+    'male': 'male', 'm': 'male', 'кот': 'male', 'м': 'male', '♂': 'male',
+    'female': 'female', 'f': 'female', 'кошка': 'female', 'ж': 'female', '♀': 'female',
+}
+IMPORT_MAX_ERRORS = 20
+
+
+class CatalogImportError(Exception):
+    """Файл импорта не прошёл проверку; errors — ['строка N: причина', ...]."""
+
+    def __init__(self, errors):
+        super().__init__('; '.join(errors))
+        self.errors = errors
+
+
+def cat_row_values(row):
+    """Проверяет строку импорта (dict) и возвращает кортеж в порядке CAT_FIELDS. Ошибка → ValueError."""
+    def text(name):
+        value = row.get(name)
+        return '' if value is None else str(value).strip()
+
+    def positive(name):
+        try:
+            value = int(text(name).replace(' ', ''))
+        except ValueError:
+            raise ValueError('{} должен быть числом'.format(name))
+        if value <= 0:
+            raise ValueError('{} должен быть больше нуля'.format(name))
+        return value
+
+    name = text('name')
+    if not name:
+        raise ValueError('нет имени')
+    gender = GENDERS.get(text('gender').lower())
+    if gender is None:
+        raise ValueError('gender: male/female или кот/кошка')
+    available = text('available').lower()
+    if available in ('', '1', 'true', 'да', 'yes'):
+        available = 1
+    elif available in ('0', 'false', 'нет', 'no'):
+        available = 0
+    else:
+        raise ValueError('available: 1/0')
+    return (name, text('breed'), positive('age_months'), gender, positive('price'),
+            text('color'), text('description'), text('image'), available)
+
+
+def parse_cats_file(data, fmt):
+    """CSV (разделитель , ; или табуляция) или JSON-массив → список кортежей для db_import_cats.
+
+    Файл принимается только целиком: при ошибках бросает CatalogImportError
+    с первыми IMPORT_MAX_ERRORS из них. Вызывать в потоке — на 10 тыс. строк
+    разбор занимает заметное время.
+    """
+    if fmt == 'json':
+        try:
+            items = json.loads(data)
+        except ValueError as exc:
+            raise CatalogImportError(['неверный JSON: {}'.format(exc)])
+        if isinstance(items, dict):
+            items = items.get('cats')
+        if not isinstance(items, list):
+            raise CatalogImportError(['ожидается массив котят или {"cats": [...]}'])
+        numbered = ((i, item) for i, item in enumerate(items, 1))
+    else:
+        try:
+            text = data.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            raise CatalogImportError(['файл должен быть в UTF-8'])
+        # Разделитель — самый частый из , ; и табуляции в строке заголовка (в названиях
+        # колонок их нет). Кавычки — как в Excel и в export_chunk: "" внутри поля — это "
+        header = text.partition('\n')[0]
+        reader = csv.DictReader(io.StringIO(text), dialect=csv.excel,
+                                delimiter=max(',;\t', key=header.count))
+        missing = [f for f in ('name', 'age_months', 'gender', 'price') if f not in (reader.fieldnames or ())]
+        if missing:
+            raise CatalogImportError(['нет колонок: ' + ', '.join(missing)])
+        numbered = ((reader.line_num, row) for row in reader)
+
+    rows, errors = [], []
+    for number, item in numbered:
+        try:
+            if not isinstance(item, dict):
+                raise ValueError('ожидается объект')
+            rows.append(cat_row_values(item))
+        except ValueError as exc:
+            errors.append('строка {}: {}'.format(number, exc))
+            if len(errors) >= IMPORT_MAX_ERRORS:
+                break
+    if errors:
+        raise CatalogImportError(errors)
+    return rows
+
+
+def export_chunk(rows, fmt, first):
+    """Пачка строк каталога в CSV или в кусок JSON-массива."""
+    columns = ('id',) + CAT_FIELDS
+    if fmt == 'json':
+        items = [json.dumps(dict(zip(columns, row)), ensure_ascii=False) for row in rows]
+        return ('' if first else ',\n') + ',\n'.join(items)
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    if first:
+        writer.writerow(columns)
+    writer.writerows(rows)
+    return buf.getvalue()
+
+
+async def export_catalog(fmt):
+    """Каталог целиком частями (str) в формате fmt."""
+    if fmt == 'json':
+        yield '['
+    first = True
+    async with contextlib.aclosing(db_iter_cats()) as batches:
+        async for rows in batches:
+            yield export_chunk(rows, fmt, first)
+            first = False
+    if fmt == 'json':
+        yield ']\n'
+    elif first:
+        yield export_chunk([], fmt, True)
+
+
+# ──────────────── Кэш каталога ────────────────
+# Готовое (уже сериализованное) тело ответа GET /cats вместе с его версией.
+# Сбрасывается в db_add_cat / db_remove_cat / db_set_available.
+_catalog       = None           # {'version', 'etag', 'last_modified', 'body'}
+_catalog_meta  = None           # (version, updated_at)
+_catalog_pages = OrderedDict()  # ключ запроса → тело страницы/поиска для текущей версии
+_catalog_gen   = 0              # растёт при каждом сбросе — защищает от гонки с пересборкой
+_catalog_lock  = asyncio.Lock()
+CATALOG_PAGES_MAX = 256         # сколько разных страниц держать в кэше
+CATS_PAGE_DEFAULT = 24
+CATS_PAGE_MAX     = 100
+
+
+def invalidate_catalog():
+    global _catalog, _catalog_meta, _catalog_gen
+    _catalog = None
+    _catalog_meta = None
+    _catalog_pages.clear()
+    _compressed.clear()
+    _catalog_gen += 1
+
+
+def cat_to_api(c):
+    """Строка таблицы cats → объект для фронтенда."""
+    return {
+        'id':          c['id'],
+        'name':        c['name'],
+        'breed':       c['breed'],
+        'age_months':  c['age_months'],
+        'gender':      c['gender'],
+        'category':    c['gender'],   # для фильтра на фронте
+        'price':       c['price'],
+        'color':       c['color'],
+        'description': c['description'],
+        'image':       c['image'],
+        'available':   bool(c['available']),
+        'reserved':    c['reserved_until'] is not None,
+        'images':      photo_variants_api(c['photo_key']),
+        'vaccinated':  True,
+        'pedigree':    True,
+    }
+
+
+async def get_catalog():
+    """Возвращает кэш каталога; БД читается только после его сброса."""
+    global _catalog
+    catalog = _catalog
+    if catalog is not None:
+        return catalog
+    # Одна пересборка на всех — остальные запросы ждут её результата
+    async with _catalog_lock:
+        if _catalog is not None:
+            return _catalog
+        gen = _catalog_gen
+        version, updated_at, cats = await db_get_catalog_snapshot()
+        catalog = {
+            'version':       version,
+            'etag':          'cats-v{}'.format(version),
+            'last_modified': updated_at,
+            'body':          json.dumps([cat_to_api(c) for c in cats],
+                                        ensure_ascii=False).encode('utf-8'),
+        }
+        if gen == _catalog_gen:
+            _catalog = catalog
+    return catalog
+
+
+async def get_catalog_version():
+    """Возвращает (version, updated_at) из кэша или из БД."""
+    global _catalog_meta
+    meta = _catalog_meta
+    if meta is None:
+        gen  = _catalog_gen
+        meta = await db_get_catalog_version()
+        if gen == _catalog_gen:
+            _catalog_meta = meta
+    return meta
+
+
+def catalog_page_key(query):
+    """Ключ кэша страницы: разобранные параметры в каноническом виде."""
+    return repr(sorted(query.items()))
+
+
+def catalog_page_etag(version, key):
+    return 'cats-v{}-{:08x}'.format(version, zlib.crc32(key.encode('utf-8')))
+
+
+async def get_catalog_page(query, key, version):
+    """Тело страницы каталога (JSON в байтах) по разобранному запросу, с кэшем."""
+    body = _catalog_pages.get(key)
+    if body is not None:
+        _catalog_pages.move_to_end(key)
+        return body
+    gen = _catalog_gen
+    cats, next_after = await db_query_cats(**query)
+    body = json.dumps({
+        'items':       [cat_to_api(c) for c in cats],
+        'next_cursor': '{}:{}'.format(*next_after) if next_after else None,
+        'version':     version,
+    }, ensure_ascii=False).encode('utf-8')
+    if gen == _catalog_gen:
+        _catalog_pages[key] = body
+        if len(_catalog_pages) > CATALOG_PAGES_MAX:
+            _catalog_pages.popitem(last=False)
+    return body
+
+
+async def get_catalog_changes(since, version):
+    """Тело ответа /cats/changes (JSON в байтах) с кэшем до следующего изменения каталога.
+
+    Клиенты с одной и той же версией получают одно и то же тело, поэтому в БД
+    идёт один запрос на версию, а не на каждого клиента.
+    """
+    if since == version:
+        return json.dumps({'version': version, 'cats': [], 'removed': []}).encode('utf-8')
+    key = 'changes:{}'.format(since)
+    body = _catalog_pages.get(key)
+    if body is not None:
+        _catalog_pages.move_to_end(key)
+        return body
+    gen = _catalog_gen
+    version, cats, removed = await db_get_catalog_changes(since, CATS_PAGE_MAX)
+    if cats is None:
+        payload = {'version': version, 'reset': True}
+    else:
+        payload = {'version': version, 'cats': [cat_to_api(c) for c in cats], 'removed': removed}
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    if gen == _catalog_gen:
+        _catalog_pages[key] = body
+        if len(_catalog_pages) > CATALOG_PAGES_MAX:
+            _catalog_pages.popitem(last=False)
+    return body
+
+
+# ──────────────── События каталога (SSE) ────────────────
+class CatalogEvents:
+    """Рассылка изменений каталога всем открытым /cats/stream.
+
+    id события — версия каталога после изменения. Клиенты не держат своих
+    очередей: все ждут один общий future, а после пробуждения забирают новые
+    события из общего кольцевого буфера уже сериализованными. Если клиент
+    пропустил версию, которой в буфере нет, он получает reset и перечитывает
+    каталог.
+    """
+
+    def __init__(self, size=SSE_BUFFER):
+        self.version = 0
+        self.closed = False
+        self._events = deque(maxlen=size)   # (версия, готовый кусок text/event-stream)
+        self._changed = None
+
+    def _wake(self):
+        if self._changed is not None and not self._changed.done():
+            self._changed.set_result(None)
+        self._changed = None
+
+    def publish(self, event, version, data):
+        payload = json.dumps(dict(data, version=version), ensure_ascii=False)
+        self._events.append((version, 'id: {}\nevent: {}\ndata: {}\n\n'.format(
+            version, event, payload).encode('utf-8')))
+        self.observe(version)
+
+    def observe(self, version):
+        """Каталог дошёл до version (возможно, изменён другим процессом)."""
+        if version > self.version:
+            self.version = version
+            self._wake()
+
+    def since(self, last_id):
+        """События после last_id по порядку; None — цепочка версий неполная, нужен reset."""
+        if last_id == self.version:
+            return []
+        if last_id > self.version:
+            return None
+        chunks, expected = [], last_id + 1
+        for version, chunk in self._events:
+            if version < expected:
+                continue
+            if version != expected:
+                return None
+            chunks.append(chunk)
+            expected += 1
+        return chunks if expected > self.version else None
+
+    def reset_chunk(self):
+        return 'id: {0}\nevent: reset\ndata: {{"version": {0}}}\n\n'.format(
+            self.version).encode('utf-8')
+
+    async def wait(self, timeout):
+        """Ждёт следующего изменения не дольше timeout. False — истёк таймаут."""
+        if self._changed is None:
+            self._changed = asyncio.get_running_loop().create_future()
+        try:
+            await asyncio.wait_for(asyncio.shield(self._changed), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    def close(self):
+        """Останов сервера: будит все потоки, чтобы они завершились."""
+        self.closed = True
+        self._wake()
+
+
+catalog_events = CatalogEvents()
+
+
+# ──────────────── Поиск ────────────────
+# Окончания, которые отрезаются от русских слов запроса: «сфинксы» → «сфинкс*»,
+# «розовая» → «розов*». Грубо, но покрывает падежи и числа без словарей.
+_RU_ENDINGS = sorted((
+    'иями', 'ями', 'ами', 'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ая', 'яя',
+    'ое', 'ее', 'ые', 'ие', 'ый', 'ий', 'ой', 'ей', 'ом', 'ем', 'ам', 'ям',
+    'ах', 'ях', 'ов', 'ев', 'ую', 'юю', 'а', 'я', 'ы', 'и', 'е', 'о', 'у', 'ю',
+    'ь', 'й',
+), key=len, reverse=True)
+_WORD_RE = re.compile(r'\w+')
+_CYRILLIC_RE = re.compile('[а-яё]')
+
+
+def _ru_stem(word):
+    if _CYRILLIC_RE.search(word):
+        for ending in _RU_ENDINGS:
+            if word.endswith(ending) and len(word) - len(ending) >= 3:
+                return word[:-len(ending)]
+    return word
+
+
+def search_terms(text):
+    """Текст из поля поиска → основы слов; хранилище ищет каждую по префиксу."""
+    return [_ru_stem(w) for w in _WORD_RE.findall(text.lower())[:8]]
+
+
+async def search_cats(text, limit):
+    """Результаты поиска (JSON в байтах) с кэшем до следующего изменения каталога."""
+    terms = search_terms(text)
+    if not terms:
+        return json.dumps({'items': []}).encode('utf-8')
+    key = 'search:{}:{}'.format(limit, ' '.join(terms))
+    body = _catalog_pages.get(key)
+    if body is not None:
+        _catalog_pages.move_to_end(key)
+        return body
+    gen = _catalog_gen
+    rows = await db_search_cats(terms, limit=limit)
+    if not rows and len(terms) > 1:
+        # Все слова сразу не нашлись — показываем хотя бы частичные совпадения
+        rows = await db_search_cats(terms, any_word=True, limit=limit)
+    body = json.dumps({
+        'items': [{'id': cat_id, 'snippet': snippet, 'rank': round(rank, 4)}
+                  for cat_id, snippet, rank in rows],
+    }, ensure_ascii=False).encode('utf-8')
+    if gen == _catalog_gen:
+        _catalog_pages[key] = body
+        if len(_catalog_pages) > CATALOG_PAGES_MAX:
+            _catalog_pages.popitem(last=False)
+    return body
+
+
+def parse_cats_query(params):
+    """Разбирает параметры GET /cats в аргументы db_query_cats. Ошибка → ValueError."""
+    def as_int(name):
+        value = params.get(name)
+        if value in (None, ''):
+            return None
+        try:
+            return int(value)
+        except ValueError:
+            raise ValueError('{} должен быть числом'.format(name))
+
+    query = {}
+    gender = params.get('gender')
+    if gender not in (None, '', 'all'):
+        if gender not in ('male', 'female'):
+            raise ValueError('gender: male или female')
+        query['gender'] = gender
+    available = params.get('available')
+    if available not in (None, ''):
+        if available not in ('1', '0', 'true', 'false'):
+            raise ValueError('available: 1/0 или true/false')
+        query['available'] = available in ('1', 'true')
+    if params.get('breed'):
+        query['breed'] = params['breed']
+    for name in ('min_price', 'max_price'):
+        value = as_int(name)
+        if value is not None:
+            query[name] = value
+    if params.get('ids'):
+        try:
+            ids = sorted({int(i) for i in params['ids'].split(',') if i.strip()})
+        except ValueError:
+            raise ValueError('ids: список чисел через запятую')
+        query['ids'] = tuple(ids[:CATS_PAGE_MAX])
+    sort = params.get('sort') or 'id'
+    if sort not in CAT_SORTS:
+        raise ValueError('sort: одно из {}'.format(', '.join(CAT_SORTS)))
+    query['sort'] = sort
+    cursor = params.get('cursor')
+    if cursor:
+        try:
+            value, cat_id = cursor.split(':')
+            query['after'] = (int(value), int(cat_id))
+        except ValueError:
+            raise ValueError('Некорректный cursor')
+    limit = as_int('limit') or CATS_PAGE_DEFAULT
+    query['limit'] = max(1, min(limit, CATS_PAGE_MAX))
+    return query
+
+
+def is_not_modified(request, etag, last_modified):
+    """Проверяет условный GET: If-None-Match, а без него — If-Modified-Since."""
+    if_none_match = request.if_none_match
+    if if_none_match is not None:
+        return any(t.value in ('*', etag) for t in if_none_match)
+    since = request.if_modified_since
+    return since is not None and int(since.timestamp()) >= last_modified
+
+
+# ──────────────── Сжатие ответов ────────────────
+# Сжатые тела каталога по ETag (в нём уже есть версия), так что каждая версия
+# сжимается один раз. Сбрасывается вместе с кэшем каталога.
+_compressed = OrderedDict()     # (etag, кодировка) → сжатое тело
+COMPRESS_MIN_SIZE = 1024        # мелкие ответы не сжимаем
+COMPRESSED_MAX    = 2 * CATALOG_PAGES_MAX
+ENCODING_SUFFIX   = {'br': 'br', 'gzip': 'gz'}
+# Файлы docs/, для которых при старте готовятся .gz/.br рядом с оригиналом
+STATIC_COMPRESS_EXT = ('.html', '.js', '.css', '.svg', '.json')
+
+
+def choose_encoding(request):
+    """Лучшая кодировка из Accept-Encoding клиента: br, затем gzip, иначе ''."""
+    accepted = {}
+    for part in request.headers.get(hdrs.ACCEPT_ENCODING, '').lower().split(','):
+        name, _, params = part.strip().partition(';')
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip()] = q
+    for encoding in ('br', 'gzip') if brotli is not None else ('gzip',):
+        if accepted.get(encoding, accepted.get('*', 0)) > 0:
+            return encoding
+    return ''
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=11)
+    return gzip.compress(body, compresslevel=9, mtime=0)
+
+
+async def get_compressed(etag, body, encoding):
+    """Сжатое тело из кэша; при промахе сжимает в потоке, чтобы не держать цикл событий."""
+    key = (etag, encoding)
+    data = _compressed.get(key)
+    if data is not None:
+        _compressed.move_to_end(key)
+        return data
+    data = await asyncio.to_thread(compress, body, encoding)
+    _compressed[key] = data
+    if len(_compressed) > COMPRESSED_MAX:
+        _compressed.popitem(last=False)
+    return data
+
+
+async def catalog_response(request, headers, etag, last_modified, get_body):
+    """Ответ с JSON каталога: выбор кодировки, свой ETag на кодировку и 304."""
+    encoding = choose_encoding(request)
+    headers[hdrs.VARY] = hdrs.ACCEPT_ENCODING
+    if encoding:
+        etag = '{}-{}'.format(etag, ENCODING_SUFFIX[encoding])
+    if is_not_modified(request, etag, last_modified):
+        resp = web.Response(status=304, headers=headers)
+    else:
+        body = await get_body()
+        if encoding and len(body) >= COMPRESS_MIN_SIZE:
+            body = await get_compressed(etag, body, encoding)
+            headers[hdrs.CONTENT_ENCODING] = encoding
+        resp = web.Response(
+            body=body, content_type='application/json', charset='utf-8', headers=headers,
+        )
+    resp.etag = etag
+    resp.last_modified = last_modified
+    return resp
+
+
+def precompress_static(directory):
+    """Кладёт рядом с файлами docs/ сжатые копии (.gz, .br) — их отдаёт web.FileResponse."""
+    encodings = [('gzip', '.gz')] + ([('br', '.br')] if brotli is not None else [])
+    count = 0
+    with os.scandir(directory) as it:
+        for entry in it:
+            if not entry.is_file() or not entry.name.endswith(STATIC_COMPRESS_EXT):
+                continue
+            mtime = entry.stat().st_mtime
+            data = None
+            for encoding, ext in encodings:
+                target = entry.path + ext
+                if os.path.exists(target) and os.stat(target).st_mtime >= mtime:
+                    continue
+                if data is None:
+                    with open(entry.path, 'rb') as f:
+                        data = f.read()
+                tmp = target + '.tmp'
+                with open(tmp, 'wb') as f:
+                    f.write(compress(data, encoding))
+                os.replace(tmp, target)
+                count += 1
+    logger.info('Сжатых копий статики обновлено: %d', count)
+
+
+# ──────────────── Отправка уведомлений (outbox) ────────────────
+class RateLimiter:
+    """Лимиты Telegram: общий темп отправки и минимальный интервал на один чат."""
+
+    def __init__(self, per_second=25, chat_interval=1.0, group_interval=3.0):
+        self.interval = 1.0 / per_second
+        self.chat_interval = chat_interval      # личные чаты: ~1 сообщение в секунду
+        self.group_interval = group_interval    # группы: ~20 сообщений в минуту
+        self._next_global = 0.0
+        self._next_chat = {}
+        self._lock = asyncio.Lock()
+
+    async def wait(self, chat_id):
+        """Ждёт, пока в chat_id можно отправить очередное сообщение."""
+        loop = asyncio.get_running_loop()
+        async with self._lock:
+            now = loop.time()
+            at = max(now, self._next_global, self._next_chat.get(chat_id, 0.0))
+            self._next_global = at + self.interval
+            is_group = str(chat_id).startswith('-')
+            self._next_chat[chat_id] = at + (self.group_interval if is_group else self.chat_interval)
+            if len(self._next_chat) > 10000:
+                self._next_chat = {k: v for k, v in self._next_chat.items() if v > now}
+        if at > now:
+            await asyncio.sleep(at - now)
+
+    def pause(self, chat_id, seconds):
+        """Telegram ответил RetryAfter — не трогаем чат указанное время."""
+        until = asyncio.get_running_loop().time() + seconds
+        self._next_chat[chat_id] = max(self._next_chat.get(chat_id, 0.0), until)
+
+    def pause_all(self, seconds):
+        """RetryAfter посреди рассылки: превышен общий лимит, ждут все чаты."""
+        until = asyncio.get_running_loop().time() + seconds
+        self._next_global = max(self._next_global, until)
+
+
+outbox_wakeup = asyncio.Event()
+_send_limiter = RateLimiter()
+
+
+def outbox_backoff(attempts):
+    """Пауза перед следующей попыткой: 5 с, 10 с, 20 с … но не больше часа."""
+    return min(5 * 2 ** (attempts - 1), 3600)
+
+
+async def bot_call(method, **kwargs):
+    """Вызов метода Bot API с замером времени (telegram_api_* в /metrics)."""
+    start = time.perf_counter()
+    try:
+        return await getattr(_bot, method)(**kwargs)
+    except Exception as exc:
+        TG_ERRORS.inc(method, type(exc).__name__)
+        raise
+    finally:
+        TG_SECONDS.observe(time.perf_counter() - start, method)
+
+
+# ──────────────── Карточка котёнка ────────────────
+def cat_photo_source(cat):
+    """Откуда загрузить фото котёнка в Telegram: путь к файлу, URL или None."""
+    names = []
+    if cat['photo_key']:
+        names.append(photo_variant_name(cat['photo_key'], PHOTO_WIDTHS[-1], 'jpg'))
+    image = cat['image']
+    if PUBLIC_URL and image.startswith(PUBLIC_URL + '/photos/'):
+        names.append(image.rsplit('/', 1)[1])
+    for name in names:
+        path = os.path.join(PHOTOS_DIR, name)
+        if os.path.isfile(path):
+            return path
+    if image.startswith(('http://', 'https://')):
+        return image
+    return None
+
+
+BAD_FILE_ID_ERRORS = ('wrong file identifier', 'wrong remote file identifier',
+                      'invalid file_id', 'file reference expired')
+
+
+def is_bad_file_id(exc):
+    """BadRequest из-за того, что Telegram больше не принимает file_id."""
+    message = str(exc).lower()
+    return any(text in message for text in BAD_FILE_ID_ERRORS)
+
+
+async def send_cat_card(chat_id, cat, heading='', footer='', reply_markup=None):
+    """Фото котёнка с подписью. Фото уходит по file_id, загружается только в первый раз.
+
+    file_id запоминается в БД. Если Telegram его больше не принимает, фото
+    загружается заново и file_id перезаписывается. Без фото — просто текст.
+    """
+    caption = templates.cat_card(cat, heading, footer)
+    if cat['tg_file_id']:
+        try:
+            message = await bot_call('send_photo', chat_id=chat_id, photo=cat['tg_file_id'],
+                                     caption=caption, parse_mode='HTML', reply_markup=reply_markup)
+            TG_PHOTO_SENDS.inc('file_id')
+            return message
+        except BadRequest as exc:
+            # Загрузка заново помогает, только если Telegram не принял сам file_id;
+            # ошибку разметки подписи или несуществующий чат она не исправит
+            if not is_bad_file_id(exc):
+                raise
+            logger.warning('file_id фото котёнка #%d устарел: %s', cat['id'], exc)
+            await db_set_cat_file_id(cat['id'], None)
+
+    source = cat_photo_source(cat)
+    if source is None:
+        return await bot_call('send_message', chat_id=chat_id, text=caption, parse_mode='HTML',
+                              reply_markup=reply_markup)
+    if source.startswith(('http://', 'https://')):
+        message = await bot_call('send_photo', chat_id=chat_id, photo=source,
+                                 caption=caption, parse_mode='HTML', reply_markup=reply_markup)
+        TG_PHOTO_SENDS.inc('url')
+    else:
+        with open(source, 'rb') as f:
+            message = await bot_call('send_photo', chat_id=chat_id, photo=f,
+                                     caption=caption, parse_mode='HTML', reply_markup=reply_markup)
+        TG_PHOTO_SENDS.inc('upload')
+    await db_set_cat_file_id(cat['id'], message.photo[-1].file_id)
+    return message
+
+
+async def _send_outbox_message(msg):
+    if msg['cat_id'] is None:
+        await bot_call('send_message', chat_id=msg['chat_id'], text=msg['text'],
+                       parse_mode=msg['parse_mode'])
+        return
+    cat = await db_get_cat(msg['cat_id'])
+    if cat is not None:      # котёнка успели удалить — карточку не шлём
+        await send_cat_card(msg['chat_id'], cat)
+
+
+async def _deliver(msg):
+    chat_id = msg['chat_id']
+    attempts = msg['attempts'] + 1
+    await _send_limiter.wait(chat_id)
+    try:
+        await _send_outbox_message(msg)
+    except RetryAfter as exc:
+        _send_limiter.pause(chat_id, exc.retry_after)
+        await db_outbox_failed(msg['id'], attempts, str(exc), time.time() + exc.retry_after)
+        return False
+    except (BadRequest, Forbidden) as exc:
+        # Повтор не поможет: неверная разметка, бот заблокирован и т. п.
+        logger.error('Сообщение #%d в %s не отправлено: %s', msg['id'], chat_id, exc)
+        await db_outbox_failed(msg['id'], attempts, str(exc))
+        return False
+    except Exception as exc:
+        if attempts >= OUTBOX_MAX_ATTEMPTS:
+            logger.error('Сообщение #%d в %s: попытки исчерпаны: %s', msg['id'], chat_id, exc)
+            await db_outbox_failed(msg['id'], attempts, str(exc))
+        else:
+            logger.warning('Ошибка отправки в %s (попытка %d): %s', chat_id, attempts, exc)
+            await db_outbox_failed(msg['id'], attempts, str(exc),
+                                   time.time() + outbox_backoff(attempts))
+        return False
+    await db_outbox_sent(msg['id'])
+    return True
+
+
+async def _deliver_chat(messages):
+    """Сообщения одного чата уходят по порядку; после сбоя остальные ждут следующего круга."""
+    for msg in messages:
+        if not await _deliver(msg):
+            return
+
+
+async def outbox_dispatcher():
+    """Фоновая задача: разбирает outbox, отправляя в разные чаты параллельно."""
+    while True:
+        try:
+            outbox_wakeup.clear()
+            due, next_at = await db_get_due_outbox()
+            if due:
+                by_chat = {}
+                for msg in due:
+                    by_chat.setdefault(msg['chat_id'], []).append(msg)
+                await asyncio.gather(*(_deliver_chat(msgs) for msgs in by_chat.values()))
+                continue
+            timeout = 30.0 if next_at is None else min(30.0, max(0.0, next_at - time.time()))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception('Сбой диспетчера outbox')
+            timeout = 5.0
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(outbox_wakeup.wait(), timeout)
+
+
+async def reservation_sweeper(interval=30):
+    """Фоновая задача: раз в interval секунд освобождает котят с истёкшей бронью."""
+    while True:
+        try:
+            expired = await db_expire_reservations()
+            if expired:
+                logger.info('Снята просроченная бронь: %d', expired)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception('Сбой при снятии брони')
+        await asyncio.sleep(interval)
+
+
+async def catalog_watcher(interval=1.0):
+    """Фоновая задача при WEB_WORKERS > 1 или PostgreSQL: замечает записи других процессов.
+
+    Сбрасывает кэш каталога, если версия в БД ушла вперёд, и будит диспетчер
+    outbox (заказы и обращения могли прийти через воркер или другую реплику).
+    """
+    seen = await _db.data_version()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            current = await _db.data_version()
+            if current == seen:
+                continue
+            seen = current
+            outbox_wakeup.set()
+            version, _ = await db_get_catalog_version()
+            if _catalog is not None:
+                cached = _catalog['version']
+            elif _catalog_meta is not None:
+                cached = _catalog_meta[0]
+            else:
+                cached = version
+            if version != cached:
+                invalidate_catalog()
+            catalog_events.observe(version)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception('Сбой при проверке версии каталога')
+
+
+def notify_chats():
+    """Чаты, куда уходят заказы и обращения."""
+    return [chat_id for chat_id in (ADMIN_CHAT_ID, GROUP_CHAT_ID) if chat_id]
+
+
+# ──────────────── Рассылка о новых котятах ────────────────
+# Подписчики читаются пачками по id (keyset), пачка рассылается параллельно
+# через общий _send_limiter — outbox с заказами не ждёт конца рассылки. После
+# каждой пачки в БД сохраняется, докуда дошли: после перезапуска рассылка
+# продолжается с того же места. Чтобы реплики не слали одно и то же, рассылку
+# ведёт один процесс, пока продлевает аренду (lease) на BROADCAST_LEASE секунд.
+BROADCAST_OWNER = '{}:{}'.format(socket.gethostname(), os.getpid())
+broadcast_wakeup = asyncio.Event()
+
+
+def shop_markup():
+    """Кнопка «открыть магазин» под анонсом (web_app-кнопки работают в личных чатах)."""
+    if not MINI_APP_URL:
+        return None
+    return InlineKeyboardMarkup([[
+        InlineKeyboardButton('🐱 Открыть магазин', web_app=WebAppInfo(url=MINI_APP_URL)),
+    ]])
+
+
+def broadcast_markup(b):
+    if b['status'] != 'running':
+        return None
+    return InlineKeyboardMarkup([[
+        InlineKeyboardButton('⛔ Остановить', callback_data='bcast:stop:{}'.format(b['id'])),
+    ]])
+
+
+async def report_broadcast(b):
+    """Обновляет у админа сообщение о ходе рассылки."""
+    if b['message_id'] is None:
+        return
+    try:
+        await bot_call('edit_message_text', chat_id=b['chat_id'], message_id=b['message_id'],
+                       text=templates.broadcast_progress(b), parse_mode='HTML',
+                       reply_markup=broadcast_markup(b))
+    except BadRequest as exc:
+        # Не изменилось или сообщение удалили — рассылке это не мешает
+        if 'not modified' not in str(exc).lower():
+            logger.warning('Рассылка #%d: отчёт не обновлён: %s', b['id'], exc)
+
+
+async def _announce(chat_id, cat, markup):
+    """Анонс одному подписчику: 'sent', 'blocked' (писать ему больше нельзя) или 'failed'."""
+    for attempt in range(1, 4):
+        await _send_limiter.wait(chat_id)
+        try:
+            await send_cat_card(chat_id, cat, templates.ANNOUNCE_HEAD, templates.ANNOUNCE_FOOT,
+                                markup)
+            return 'sent'
+        except RetryAfter as exc:
+            _send_limiter.pause_all(exc.retry_after)
+        except Forbidden:
+            return 'blocked'
+        except BadRequest as exc:
+            if 'chat not found' in str(exc).lower():
+                return 'blocked'
+            logger.warning('Рассылка: %s не отправлено: %s', chat_id, exc)
+            return 'failed'
+        except Exception as exc:
+            logger.warning('Рассылка: ошибка отправки в %s (попытка %d): %s', chat_id, attempt, exc)
+            await asyncio.sleep(outbox_backoff(attempt))
+    return 'failed'
+
+
+async def keep_broadcast_lease(broadcast_id):
+    """Продлевает аренду рассылки, пока идёт пачка. Возвращается, только потеряв её."""
+    while True:
+        await asyncio.sleep(BROADCAST_LEASE / 3)
+        try:
+            if not await db_claim_broadcast(broadcast_id):
+                return
+        except Exception:
+            logger.exception('Рассылка #%d: аренда не продлена', broadcast_id)
+
+
+async def send_batch(broadcast_id, sends):
+    """Пачка отправок под аренду. None — аренду перехватили, пачка прервана.
+
+    Пачка может идти дольше BROADCAST_LEASE (RetryAfter останавливает все
+    отправки на время, которое назвал Telegram), поэтому аренда продлевается
+    в фоне, а не только между пачками.
+    """
+    sending = asyncio.ensure_future(asyncio.gather(*sends))
+    keeper = asyncio.create_task(keep_broadcast_lease(broadcast_id))
+    try:
+        await asyncio.wait((sending, keeper), return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        lost = keeper.done() and not sending.done()
+        keeper.cancel()
+        if not sending.done():
+            sending.cancel()
+        await asyncio.gather(sending, keeper, return_exceptions=True)
+    if lost:
+        return None
+    return sending.result()
+
+
+async def run_broadcast(b):
+    """Рассылает анонс с места, где рассылка остановилась, пока она в статусе running."""
+    b = dict(b)
+    semaphore = asyncio.Semaphore(BROADCAST_CONCURRENCY)
+    markup = shop_markup()
+
+    async def send(chat_id, cat):
+        async with semaphore:
+            return await _announce(chat_id, cat, markup)
+
+    while True:
+        # Котёнка могли продать или удалить, пока шла рассылка
+        cat = await db_get_cat(b['cat_id'])
+        batch = await db_subscribers_after(b['after_id']) if cat and cat['available'] else []
+        status = 'running'
+        if not batch:
+            status = 'done' if cat and cat['available'] else 'cancelled'
+        else:
+            results = await send_batch(b['id'], (send(s['chat_id'], cat) for s in batch))
+            if results is None:
+                logger.warning('Рассылку #%d подхватил другой процесс', b['id'])
+                return
+            blocked = [s['chat_id'] for s, result in zip(batch, results) if result == 'blocked']
+            if blocked:
+                await db_deactivate_subscribers(blocked)
+            for result in results:
+                BROADCAST_MESSAGES.inc(result)
+            b['sent'] += results.count('sent')
+            b['failed'] += len(results) - results.count('sent')
+            b['after_id'] = batch[-1]['id']
+        b['status'] = await db_save_broadcast_progress(
+            b['id'], b['after_id'], b['sent'], b['failed'], status)
+        await report_broadcast(b)
+        if b['status'] != 'running':
+            logger.info('Рассылка #%d: %s, доставлено %d, не доставлено %d',
+                        b['id'], b['status'], b['sent'], b['failed'])
+            return
+        if not await db_claim_broadcast(b['id']):
+            logger.warning('Рассылку #%d подхватил другой процесс', b['id'])
+            return
+
+
+async def broadcaster(interval=30):
+    """Фоновая задача: ведёт рассылки, в том числе прерванные перезапуском."""
+    while True:
+        try:
+            broadcast_wakeup.clear()
+            for b in await db_get_running_broadcasts():
+                if await db_claim_broadcast(b['id']):
+                    await run_broadcast(b)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception('Сбой рассылки')
+        with contextlib.suppress(asyncio.TimeoutError):
+            await asyncio.wait_for(broadcast_wakeup.wait(), interval)
+
+
+# ──────────────── Фото: превью разных размеров ────────────────
+_photo_pool = None
+
+
+def photo_variant_name(key, width, ext):
+    return '{}_{}.{}'.format(key, width, ext)
+
+
+def make_photo_variants(src_path, out_dir, key):
+    """Режет исходное фото на превью PHOTO_WIDTHS в JPEG и WebP.
+
+    Выполняется в отдельном процессе (см. process_photo). Меньше исходника
+    фото не растягивается — превью просто совпадает с ним по размеру.
+    """
+    with Image.open(src_path) as img:
+        img = ImageOps.exif_transpose(img).convert('RGB')
+        for width in PHOTO_WIDTHS:
+            variant = img
+            if img.width > width:
+                height = round(img.height * width / img.width)
+                variant = img.resize((width, height), Image.LANCZOS)
+            variant.save(os.path.join(out_dir, photo_variant_name(key, width, 'jpg')),
+                         'JPEG', quality=80, optimize=True, progressive=True)
+            variant.save(os.path.join(out_dir, photo_variant_name(key, width, 'webp')),
+                         'WEBP', quality=75, method=4)
+
+
+async def process_photo(src_path, key):
+    """Строит превью в пуле процессов, не блокируя event loop.
+
+    Возвращает key, если превью готовы, иначе '' (нет Pillow или файл битый).
+    """
+    global _photo_pool
+    if Image is None:
+        return ''
+    if _photo_pool is None:
+        _photo_pool = ProcessPoolExecutor(
+            max_workers=PHOTO_WORKERS, mp_context=multiprocessing.get_context('spawn'),
+        )
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(_photo_pool, make_photo_variants,
+                                   src_path, os.path.dirname(src_path), key)
+    except Exception:
+        logger.exception('Не удалось сделать превью для %s', src_path)
+        return ''
+    return key
+
+
+def shutdown_photo_pool():
+    global _photo_pool
+    if _photo_pool is not None:
+        _photo_pool.shutdown(cancel_futures=True)
+        _photo_pool = None
+
+
+# ──────────────── Фото: индекс файлов и кэш в памяти ────────────────
+# Имена файлов — file_unique_id из Telegram, т. е. содержимое под именем
+# не меняется, и браузер может кэшировать фото навсегда.
+PHOTO_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+_photo_index = {}              # имя файла → {'size', 'mtime', 'etag'}
+_photo_bytes = OrderedDict()   # имя файла → содержимое (LRU)
+_photo_bytes_total = 0
+
+
+def index_photo(filename):
+    """Добавляет файл из PHOTOS_DIR в индекс (или обновляет запись о нём)."""
+    try:
+        st = os.stat(os.path.join(PHOTOS_DIR, filename))
+    except FileNotFoundError:
+        return None
+    if not stat.S_ISREG(st.st_mode):
+        return None
+    _drop_cached_photo(filename)
+    entry = _photo_index[filename] = {
+        'size':  st.st_size,
+        'mtime': st.st_mtime,
+        'etag':  '{:x}-{:x}'.format(st.st_mtime_ns, st.st_size),   # как у web.FileResponse
+    }
+    return entry
+
+
+def build_photo_index():
+    """Читает PHOTOS_DIR один раз при старте."""
+    _photo_index.clear()
+    if os.path.isdir(PHOTOS_DIR):
+        with os.scandir(PHOTOS_DIR) as it:
+            for entry in it:
+                if entry.is_file():
+                    index_photo(entry.name)
+    logger.info('Фото в индексе: %d', len(_photo_index))
+
+
+def _drop_cached_photo(filename):
+    global _photo_bytes_total
+    body = _photo_bytes.pop(filename, None)
+    if body is not None:
+        _photo_bytes_total -= len(body)
+
+
+async def get_cached_photo(filename, size):
+    """Содержимое мелкого фото из LRU-кэша; при промахе читает файл в потоке."""
+    global _photo_bytes_total
+    body = _photo_bytes.get(filename)
+    if body is not None:
+        _photo_bytes.move_to_end(filename)
+        return body
+
+    def read():
+        with open(os.path.join(PHOTOS_DIR, filename), 'rb') as f:
+            return f.read()
+
+    body = await asyncio.to_thread(read)
+    if len(body) == size and filename not in _photo_bytes:
+        _photo_bytes[filename] = body
+        _photo_bytes_total += size
+        while _photo_bytes_total > PHOTO_CACHE_BYTES:
+            _, old = _photo_bytes.popitem(last=False)
+            _photo_bytes_total -= len(old)
+    return body
+
+
+def photo_variants_api(key):
+    """Ссылки на превью для фронтенда (thumb + srcset) или None, если превью нет."""
+    if not key or not PUBLIC_URL:
+        return None
+
+    def srcset(ext):
+        return ', '.join('{}/photos/{} {}w'.format(PUBLIC_URL, photo_variant_name(key, w, ext), w)
+                         for w in PHOTO_WIDTHS)
+
+    return {
+        'thumb':       '{}/photos/{}'.format(PUBLIC_URL, photo_variant_name(key, PHOTO_WIDTHS[0], 'jpg')),
+        'large':       '{}/photos/{}'.format(PUBLIC_URL, photo_variant_name(key, PHOTO_WIDTHS[-1], 'jpg')),
+        'srcset':      srcset('jpg'),
+        'srcset_webp': srcset('webp'),
+    }
 
 
 # ──────────────── CORS helpers ───────────────
@@ -196,7 +1597,7 @@ def cors_headers():
     return {
         'Access-Control-Allow-Origin': '*',
         'Access-Control-Allow-Methods': 'GET, POST, OPTIONS',
-        'Access-Control-Allow-Headers': 'Content-Type, X-Secret',
+        'Access-Control-Allow-Headers': 'Content-Type, X-Secret, X-Telegram-Init-Data',
     }
 
 
@@ -204,9 +1605,202 @@ async def handle_options(request):
     return web.Response(status=200, headers=cors_headers())
 
 
+# ──────────────── Лимиты запросов ───────────────
+class TokenBuckets:
+    """Token bucket на каждый ключ; память ограничена max_keys вёдрами.
+
+    Вёдра лежат в OrderedDict в порядке последнего обращения, при переполнении
+    вытесняется самое давнее — к тому времени оно, скорее всего, и так полное.
+    """
+
+    def __init__(self, burst, interval, max_keys=RATE_LIMIT_KEYS):
+        self.burst = burst
+        self.rate = 1.0 / interval        # токенов в секунду
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()     # ключ → (токенов, когда посчитано)
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def take(self, key):
+        """Забирает токен. 0 — запрос можно выполнить, иначе через сколько секунд повторить."""
+        now = time.monotonic()
+        tokens, last = self._buckets.pop(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / self.rate
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+
+_post_limits = {
+    'order':    TokenBuckets(POST_RATE_BURST, POST_RATE_INTERVAL),
+    'feedback': TokenBuckets(POST_RATE_BURST, POST_RATE_INTERVAL),
+}
+metrics.Gauge('rate_limit_buckets', 'Вёдер в лимитах /order и /feedback',
+              lambda: sum(len(b) for b in _post_limits.values()))
+
+
+def client_ip(request):
+    """Адрес клиента: из X-Forwarded-For, если перед ботом PROXY_HOPS прокси."""
+    if PROXY_HOPS:
+        forwarded = [ip.strip() for ip in request.headers.get(hdrs.X_FORWARDED_FOR, '').split(',')]
+        if len(forwarded) >= PROXY_HOPS and forwarded[-PROXY_HOPS]:
+            return forwarded[-PROXY_HOPS]
+    return request.remote or ''
+
+
+def telegram_user_id(init_data):
+    """id пользователя из Telegram.WebApp.initData; None — данных нет, подпись неверна
+    или initData старше WEBAPP_MAX_AGE."""
+    if not init_data or not BOT_TOKEN:
+        return None
+    fields = dict(parse_qsl(init_data, keep_blank_values=True))
+    received = fields.pop('hash', '')
+    check = '\n'.join('{}={}'.format(k, v) for k, v in sorted(fields.items()))
+    expected = hmac.new(WEBAPP_SECRET, check.encode(), hashlib.sha256).hexdigest()
+    if not hmac.compare_digest(received, expected):
+        return None
+    try:
+        age = time.time() - int(fields['auth_date'])
+        if not -60 <= age <= WEBAPP_MAX_AGE:   # минута на расхождение часов
+            return None
+        return int(json.loads(fields['user'])['id'])
+    except (KeyError, ValueError, TypeError):
+        return None
+
+
+def rate_limit_wait(request, buckets):
+    """Берёт токен и из ведра IP, и из ведра пользователя Telegram; 0 — можно."""
+    waits = [buckets.take(('ip', client_ip(request)))]
+    user_id = telegram_user_id(request.headers.get('X-Telegram-Init-Data'))
+    if user_id is not None:
+        waits.append(buckets.take(('tg', user_id)))
+    return max(waits)
+
+
+async def read_body(request, limit):
+    """Тело запроса, если оно не больше limit байт, иначе None (остаток не читается)."""
+    if request.content_length is not None and request.content_length > limit:
+        return None
+    data = bytearray()
+    async for chunk in request.content.iter_chunked(64 * 1024):
+        data += chunk
+        if len(data) > limit:
+            return None
+    return bytes(data)
+
+
+async def read_public_post(request, route):
+    """Проверки POST /order и /feedback до разбора JSON, от дешёвых к дорогим.
+
+    Возвращает (data, None) или (None, ответ с ошибкой).
+    """
+    def error(status, message, **headers):
+        headers.update(cors_headers())
+        return None, web.json_response({'ok': False, 'error': message},
+                                       status=status, headers=headers)
+
+    if request.headers.get('X-Secret') != API_SECRET:
+        return error(401, 'Unauthorized')
+    if request.content_length is not None and request.content_length > POST_MAX_BYTES:
+        return error(413, 'Request too large')
+    wait = rate_limit_wait(request, _post_limits[route])
+    if wait:
+        return error(429, 'Too many requests', **{hdrs.RETRY_AFTER: str(int(wait) + 1)})
+    body = await read_body(request, POST_MAX_BYTES)
+    if body is None:
+        return error(413, 'Request too large')
+    try:
+        data = json.loads(body)
+    except ValueError:
+        return error(400, 'Invalid JSON')
+    if not isinstance(data, dict):
+        return error(400, 'Invalid JSON')
+    return data, None
+
+
 # ──────────────── HTTP: /health ───────────────
+# /health и /health/live — процесс жив и отвечает (liveness), больше ничего не
+# проверяют. /health/ready — процесс прогрет и может принимать трафик: БД
+# открыта, схема обновлена и БД отвечает, бот запущен, HTTP-сервер слушает порт.
+# Пока нет — 503, и Railway не переключает на новый деплой трафик.
+@contextlib.contextmanager
+def startup_step(name):
+    """Замеряет шаг запуска: время пишется в лог и в ответ /health/ready."""
+    start = time.perf_counter()
+    yield
+    seconds = time.perf_counter() - start
+    _startup_steps[name] = round(seconds, 3)
+    logger.info('Запуск: %s — %.0f мс', name, seconds * 1000)
+
+
+async def check_db():
+    if not _ready['db']:
+        return 'starting'
+    try:
+        await asyncio.wait_for(db_get_catalog_version(), HEALTH_DB_TIMEOUT)
+    except asyncio.TimeoutError:
+        return 'timeout'
+    except Exception as exc:
+        return 'error: {}'.format(type(exc).__name__)
+    return 'ok'
+
+
+def check_bot():
+    if _ready['bot'] is None:
+        return 'main process'      # HTTP-воркер: бот работает в главном процессе
+    if not _ready['bot']:
+        return 'starting'
+    return 'ok' if _tg_app is not None and _tg_app.running else 'stopped'
+
+
 async def handle_health(request):
-    return web.json_response({'ok': True, 'status': 'running'})
+    return web.json_response({'ok': True, 'status': 'alive',
+                              'uptime': round(time.time() - _started_at)})
+
+
+async def handle_health_ready(request):
+    checks = {
+        'db':   await check_db(),
+        'bot':  check_bot(),
+        'http': 'ok' if _ready['http'] else 'starting',
+    }
+    ready = all(value in ('ok', 'main process') for value in checks.values())
+    return web.json_response({
+        'ok': ready, 'status': 'ready' if ready else 'not ready',
+        'checks': checks, 'startup': _startup_steps,
+        'uptime': round(time.time() - _started_at),
+    }, status=200 if ready else 503)
+
+
+# ──────────────── HTTP: /metrics ──────────────
+@web.middleware
+async def metrics_middleware(request, handler):
+    """Считает запросы и время ответа по шаблону маршрута (/photos/{filename}, а не по URL)."""
+    start = time.perf_counter()
+    status = 500
+    try:
+        resp = await handler(request)
+        status = resp.status
+        return resp
+    except web.HTTPException as exc:
+        status = exc.status
+        raise
+    finally:
+        resource = request.match_info.route.resource
+        route = resource.canonical if resource is not None else 'unmatched'
+        HTTP_REQUESTS.inc(route, request.method, status)
+        HTTP_SECONDS.observe(time.perf_counter() - start, route, request.method)
+
+
+async def handle_metrics(request):
+    return web.Response(text=metrics.render(), content_type='text/plain')
 
 
 # ──────────────── HTTP: /photos/{filename} ───
@@ -214,128 +1808,290 @@ async def handle_photo_file(request):
     filename = request.match_info['filename']
     if '/' in filename or '..' in filename:
         raise web.HTTPForbidden()
-    filepath = os.path.join(PHOTOS_DIR, filename)
-    if not os.path.isfile(filepath):
+    # Промах — возможно, фото загрузили через другой процесс
+    entry = _photo_index.get(filename) or index_photo(filename)
+    if entry is None:
         raise web.HTTPNotFound()
-    return web.FileResponse(filepath)
+
+    headers = {hdrs.CACHE_CONTROL: PHOTO_CACHE_CONTROL}
+    if is_not_modified(request, entry['etag'], int(entry['mtime'])):
+        resp = web.Response(status=304, headers=headers)
+    elif entry['size'] <= PHOTO_CACHE_MAX_FILE and hdrs.RANGE not in request.headers:
+        content_type = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        resp = web.Response(body=await get_cached_photo(filename, entry['size']),
+                            content_type=content_type, headers=headers)
+    else:
+        # Крупные файлы и Range-запросы — через sendfile
+        return web.FileResponse(os.path.join(PHOTOS_DIR, filename), headers=headers)
+    resp.etag = entry['etag']
+    resp.last_modified = entry['mtime']
+    return resp
+
+
+# ──────────────── HTTP: /app/ (docs/) ─────────
+async def handle_docs(request):
+    """Mini App из DOCS_DIR; FileResponse сам отдаёт .br/.gz, если клиент их принимает."""
+    filename = request.match_info.get('filename') or 'index.html'
+    if '/' in filename or filename.startswith('.'):
+        raise web.HTTPForbidden()
+    path = os.path.join(DOCS_DIR, filename)
+    if not os.path.isfile(path):
+        raise web.HTTPNotFound()
+    return web.FileResponse(path, headers={hdrs.CACHE_CONTROL: 'no-cache'})
 
 
 # ──────────────── HTTP: /cats ─────────────────
 async def handle_cats(request):
-    cats = await db_get_cats()
-    result = []
-    for c in cats:
-        result.append({
-            'id':          c['id'],
-            'name':        c['name'],
-            'breed':       c['breed'],
-            'age_months':  c['age_months'],
-            'gender':      c['gender'],
-            'category':    c['gender'],   # для фильтра на фронте
-            'price':       c['price'],
-            'color':       c['color'],
-            'description': c['description'],
-            'image':       c['image'],
-            'available':   bool(c['available']),
-            'vaccinated':  True,
-            'pedigree':    True,
-        })
-    return web.json_response(result, headers=cors_headers())
+    headers = cors_headers()
+    headers[hdrs.CACHE_CONTROL] = 'no-cache'   # кэшировать можно, но только с проверкой
+    if request.query:
+        return await handle_cats_page(request, headers)
 
+    # Без параметров — весь каталог одним списком (совместимость со старыми клиентами)
+    catalog = await get_catalog()
 
-# ──────────────── HTTP: /order ────────────────
-async def handle_order(request):
-    if request.headers.get('X-Secret') != API_SECRET:
+    async def body():
+        return catalog['body']
+
+    return await catalog_response(
+        request, headers, catalog['etag'], catalog['last_modified'], body)
+
+
+async def handle_cats_page(request, headers):
+    """GET /cats?gender=&available=&breed=&min_price=&max_price=&sort=&cursor=&limit="""
+    try:
+        query = parse_cats_query(request.query)
+    except ValueError as exc:
         return web.json_response(
-            {'ok': False, 'error': 'Unauthorized'},
-            status=401, headers=cors_headers(),
+            {'ok': False, 'error': str(exc)},
+            status=400, headers=cors_headers(),
         )
+    version, updated_at = await get_catalog_version()
+    key = catalog_page_key(query)
+    return await catalog_response(
+        request, headers, catalog_page_etag(version, key), updated_at,
+        lambda: get_catalog_page(query, key, version))
+
+
+# ──────────────── HTTP: /cats/changes ─────────
+async def handle_cats_changes(request):
+    """GET /cats/changes?since=<версия> — котята, изменённые после since, и id удалённых.
+
+    Mini App показывает каталог из кэша и догоняет его этим запросом: обычно
+    это десятки байт вместо всей страницы. {"reset": true} — журнал так далеко
+    не помнит, каталог надо перечитать.
+    """
     try:
-        data = await request.json()
-    except Exception:
+        since = int(request.query['since'])
+    except (KeyError, ValueError):
         return web.json_response(
-            {'ok': False, 'error': 'Invalid JSON'},
+            {'ok': False, 'error': 'since должен быть числом'},
             status=400, headers=cors_headers(),
         )
+    headers = cors_headers()
+    headers[hdrs.CACHE_CONTROL] = 'no-cache'
+    version, updated_at = await get_catalog_version()
+    return await catalog_response(
+        request, headers, 'cats-v{}-since{}'.format(version, since), updated_at,
+        lambda: get_catalog_changes(since, version))
+
+
+# ──────────────── HTTP: /cats/stream ──────────
+async def handle_cats_stream(request):
+    """GET /cats/stream — Server-Sent Events: add / remove / update / reset."""
+    version, _ = await get_catalog_version()
+    catalog_events.observe(version)
+    try:
+        last_id = int(request.headers.get('Last-Event-ID') or request.query.get('since') or -1)
+    except ValueError:
+        last_id = -1
+
+    headers = cors_headers()
+    headers.update({
+        hdrs.CONTENT_TYPE:  'text/event-stream; charset=utf-8',
+        hdrs.CACHE_CONTROL: 'no-cache',
+        'X-Accel-Buffering': 'no',      # nginx и прокси не должны копить поток
+    })
+    resp = web.StreamResponse(headers=headers)
+    await resp.prepare(request)
+    try:
+        await resp.write(b'retry: 5000\n\n')
+        if last_id < 0:
+            # Новый клиент: только запоминает версию, каталог у него уже свежий
+            await resp.write('id: {}\n\n'.format(catalog_events.version).encode())
+            last_id = catalog_events.version
+        while not catalog_events.closed:
+            chunks = catalog_events.since(last_id)
+            if chunks is None:
+                chunks = [catalog_events.reset_chunk()]
+            if chunks:
+                last_id = catalog_events.version
+                await resp.write(b''.join(chunks))
+            elif not await catalog_events.wait(SSE_HEARTBEAT):
+                await resp.write(b': ping\n\n')
+    except ConnectionResetError:
+        pass
+    return resp
+
+
+# ──────────────── HTTP: /cats/search ──────────
+async def handle_cats_search(request):
+    """GET /cats/search?q=&limit= — id котов по релевантности и сниппеты."""
+    try:
+        limit = max(1, min(int(request.query.get('limit') or 20), CATS_PAGE_MAX))
+    except ValueError:
+        return web.json_response(
+            {'ok': False, 'error': 'limit должен быть числом'},
+            status=400, headers=cors_headers(),
+        )
+    body = await search_cats(request.query.get('q', ''), limit)
+    return web.Response(
+        body=body, content_type='application/json', charset='utf-8',
+        headers=cors_headers(),
+    )
 
-    items     = data.get('items', [])
-    total     = data.get('total', 0)
-    now       = datetime.now().strftime('%d.%m.%Y %H:%M')
-    total_str = '{:,}'.format(total).replace(',', ' ')
 
-    lines = [
-        '🛍️ <b>НОВЫЙ ЗАКАЗ!</b>',
-        '━' * 22,
-        '👤 <b>Имя:</b> {}'.format(data.get('name', '—')),
-        '📞 <b>Телефон:</b> {}'.format(data.get('phone', '—')),
-    ]
-    if data.get('address'):
-        lines.append('📍 <b>Адрес:</b> {}'.format(data['address']))
-    if data.get('comment'):
-        lines.append('💬 <b>Комментарий:</b> {}'.format(data['comment']))
-
-    lines.append('\n🐱 <b>Котята ({}):</b>'.format(len(items)))
-    for item in items:
-        price_str = '{:,}'.format(item['price']).replace(',', ' ')
-        lines.append('  • {} ({}) — {} ₽'.format(item['name'], item['breed'], price_str))
-
-    lines += [
-        '',
-        '💰 <b>Итого: {} ₽</b>'.format(total_str),
-        '━' * 22,
-        '🕐 {}'.format(now),
-    ]
-    msg = '\n'.join(lines)
+# ──────────────── HTTP: /order ────────────────
+async def handle_order(request):
+    data, error = await read_public_post(request, 'order')
+    if error is not None:
+        return error
 
-    for chat_id in filter(None, [ADMIN_CHAT_ID, GROUP_CHAT_ID]):
-        try:
-            await _bot.send_message(chat_id=chat_id, text=msg, parse_mode='HTML')
-        except Exception as exc:
-            logger.error('Ошибка отправки в %s: %s', chat_id, exc)
+    try:
+        items = [
+            (int(item['id']) if item.get('id') is not None else None,
+             str(item['name']), str(item.get('breed', '')), int(item['price']))
+            for item in data.get('items', [])
+        ]
+    except (TypeError, KeyError, ValueError, AttributeError):
+        return web.json_response(
+            {'ok': False, 'error': 'Invalid order'},
+            status=400, headers=cors_headers(),
+        )
+    # Каждый котёнок единственный: корзина Mini App не кладёт его дважды, а
+    # повтор бронировался бы один раз, но попадал в счёт и уведомление дважды
+    cat_ids = [item[0] for item in items if item[0] is not None]
+    if len(cat_ids) != len(set(cat_ids)):
+        return web.json_response(
+            {'ok': False, 'error': 'Duplicate items'},
+            status=400, headers=cors_headers(),
+        )
 
-    return web.json_response({'ok': True}, headers=cors_headers())
+    # Заказ, бронь и уведомления пишутся одной транзакцией, отправит фоновый
+    # диспетчер — ответ не ждёт Telegram
+    try:
+        order_id = await db_create_order(
+            str(data.get('name', '')), str(data.get('phone', '')),
+            str(data.get('address', '')), str(data.get('comment', '')),
+            items, notify_chats(),
+            lambda order_id, stored, total, reserved_until:
+                templates.order_message(order_id, data, stored, total, reserved_until, REPORT_TZ),
+        )
+    except CatsUnavailable as exc:
+        return web.json_response(
+            {'ok': False, 'error': 'Unavailable', 'unavailable': exc.cat_ids},
+            status=409, headers=cors_headers(),
+        )
+
+    return web.json_response({'ok': True, 'order_id': order_id}, headers=cors_headers())
 
 
 # ──────────────── HTTP: /feedback ─────────────
 async def handle_feedback(request):
-    if request.headers.get('X-Secret') != API_SECRET:
+    data, error = await read_public_post(request, 'feedback')
+    if error is not None:
+        return error
+
+    msg = templates.feedback_message(data, REPORT_TZ)
+
+    # Сначала сохраняем, отправит фоновый диспетчер — ответ не ждёт Telegram
+    await db_enqueue_messages([(chat_id, msg) for chat_id in notify_chats()])
+
+    return web.json_response({'ok': True}, headers=cors_headers())
+
+
+# ──────────────── HTTP: /cats/import, /cats/export ──
+def is_admin_request(request):
+    token = request.headers.get(hdrs.AUTHORIZATION, '')
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token, 'Bearer ' + ADMIN_TOKEN)
+
+
+def catalog_file_format(request):
+    fmt = request.query.get('format')
+    if not fmt:
+        fmt = 'json' if request.content_type == 'application/json' else 'csv'
+    if fmt not in ('csv', 'json'):
+        raise ValueError('format: csv или json')
+    return fmt
+
+
+async def handle_cats_import(request):
+    """POST /cats/import?format=csv|json — добавляет котят из файла (Authorization: Bearer ADMIN_TOKEN)."""
+    if not is_admin_request(request):
+        return web.json_response({'ok': False, 'error': 'Unauthorized'}, status=401)
+    try:
+        fmt = catalog_file_format(request)
+    except ValueError as exc:
+        return web.json_response({'ok': False, 'error': str(exc)}, status=400)
+
+    # Тело читается потоком: лимит client_max_size (1 МБ) тут слишком мал
+    data = await read_body(request, IMPORT_MAX_BYTES)
+    if data is None:
+        return web.json_response({'ok': False, 'error': 'File too large'}, status=413)
+    try:
+        rows = await asyncio.to_thread(parse_cats_file, data, fmt)
+    except CatalogImportError as exc:
         return web.json_response(
-            {'ok': False, 'error': 'Unauthorized'},
-            status=401, headers=cors_headers(),
-        )
+            {'ok': False, 'error': 'Invalid rows', 'errors': exc.errors}, status=400)
+    imported = await db_import_cats(rows)
+    logger.info('Импорт каталога по HTTP: %d котят', imported)
+    return web.json_response({'ok': True, 'imported': imported})
+
+
+async def handle_cats_export(request):
+    """GET /cats/export?format=csv|json — весь каталог потоком (Authorization: Bearer ADMIN_TOKEN)."""
+    if not is_admin_request(request):
+        return web.json_response({'ok': False, 'error': 'Unauthorized'}, status=401)
+    fmt = request.query.get('format', 'csv')
+    if fmt not in ('csv', 'json'):
+        return web.json_response({'ok': False, 'error': 'format: csv или json'}, status=400)
+
+    resp = web.StreamResponse(headers={
+        hdrs.CONTENT_TYPE: 'text/csv; charset=utf-8' if fmt == 'csv' else 'application/json; charset=utf-8',
+        hdrs.CONTENT_DISPOSITION: 'attachment; filename="cats.{}"'.format(fmt),
+    })
+    await resp.prepare(request)
+    async with contextlib.aclosing(export_catalog(fmt)) as chunks:
+        async for chunk in chunks:
+            await resp.write(chunk.encode('utf-8'))
+    await resp.write_eof()
+    return resp
+
+
+# ──────────────── HTTP: /telegram/webhook ─────
+async def handle_telegram_webhook(request):
+    """Апдейты от Telegram в режиме webhook — сразу в очередь python-telegram-bot."""
+    token = request.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
+    if not hmac.compare_digest(token, WEBHOOK_SECRET):
+        raise web.HTTPForbidden()
     try:
         data = await request.json()
     except Exception:
-        return web.json_response(
-            {'ok': False, 'error': 'Invalid JSON'},
-            status=400, headers=cors_headers(),
-        )
+        raise web.HTTPBadRequest()
+    await _tg_app.update_queue.put(Update.de_json(data, _bot))
+    return web.Response()
 
-    now = datetime.now().strftime('%d.%m.%Y %H:%M')
-    lines = [
-        '💬 <b>ОБРАТНАЯ СВЯЗЬ</b>',
-        '━' * 22,
-        '👤 <b>Имя:</b> {}'.format(data.get('name', '—')),
-    ]
-    if data.get('contact'):
-        lines.append('📞 <b>Контакт:</b> {}'.format(data['contact']))
-    lines += [
-        '📋 <b>Тема:</b> {}'.format(data.get('subject', '—')),
-        '',
-        '✉️ <b>Сообщение:</b>',
-        data.get('message', '—'),
-        '━' * 22,
-        '🕐 {}'.format(now),
-    ]
-    msg = '\n'.join(lines)
 
-    for chat_id in filter(None, [ADMIN_CHAT_ID, GROUP_CHAT_ID]):
-        try:
-            await _bot.send_message(chat_id=chat_id, text=msg, parse_mode='HTML')
-        except Exception as exc:
-            logger.error('Ошибка отправки в %s: %s', chat_id, exc)
-
-    return web.json_response({'ok': True}, headers=cors_headers())
+async def proxy_telegram_webhook(request):
+    """В HTTP-воркере бота нет — апдейт пересылается главному процессу как есть."""
+    headers = {
+        name: request.headers[name]
+        for name in ('X-Telegram-Bot-Api-Secret-Token', hdrs.CONTENT_TYPE)
+        if name in request.headers
+    }
+    async with _main_session.post('http://main' + WEBHOOK_PATH,
+                                  data=await request.read(), headers=headers) as resp:
+        return web.Response(status=resp.status, body=await resp.read())
 
 
 # ──────────────── Bot helpers ─────────────────
@@ -344,65 +2100,254 @@ def is_admin(update: Update) -> bool:
 
 
 # ──────────────── Bot: /start ─────────────────
+@counted_handler
 async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     keyboard = [[
         KeyboardButton('🐱 Открыть магазин котов', web_app=WebAppInfo(url=MINI_APP_URL))
     ]]
     markup = ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+    news = ''
+    if update.effective_chat.type == 'private':
+        # Подписываем на анонсы новых котят; отписавшегося /start обратно не подписывает
+        if await db_add_subscriber(update.effective_chat.id, user.first_name):
+            news = '🔔 Когда появятся новые котята, мы пришлём сообщение. /stop — отписаться.\n\n'
+        else:
+            news = '🔕 Вы отписаны от новостей питомника. /subscribe — подписаться снова.\n\n'
     await update.message.reply_text(
         'Привет, {}! 👋\n\n'
         '🐾 Добро пожаловать в питомник <b>«Мурлыка»</b>!\n\n'
         'Донские сфинксы — тёплые, гипоаллергенные и невероятно ласковые.\n\n'
-        'Нажмите кнопку ниже, чтобы открыть каталог:'.format(user.first_name),
+        '{}'
+        'Нажмите кнопку ниже, чтобы открыть каталог:'.format(templates.escape(user.first_name), news),
         reply_markup=markup,
         parse_mode='HTML',
     )
 
 
+# ──────────────── Bot: /stop, /subscribe ──────
+@counted_handler
+async def cmd_stop(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if await db_set_subscribed(update.effective_chat.id, False):
+        await update.message.reply_text(
+            '🔕 Вы отписались от новостей питомника. /subscribe — подписаться снова.')
+    else:
+        await update.message.reply_text('Вы не подписаны на новости. /subscribe — подписаться.')
+
+
+@counted_handler
+async def cmd_subscribe(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if update.effective_chat.type != 'private':
+        await update.message.reply_text('Подписаться можно в личном чате с ботом.')
+        return
+    chat_id = update.effective_chat.id
+    if not await db_add_subscriber(chat_id, update.effective_user.first_name):
+        await db_set_subscribed(chat_id, True)
+    await update.message.reply_text(
+        '🔔 Вы подписаны: пришлём сообщение, когда появятся новые котята. /stop — отписаться.')
+
+
+@counted_handler
 async def cmd_help(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = (
         '🐱 <b>Питомник «Мурлыка»</b>\n\n'
         '/start — Открыть магазин\n'
+        '/subscribe — Новости о новых котятах\n'
+        '/stop — Отписаться от новостей\n'
         '/help — Справка'
     )
     if is_admin(update):
         text += (
             '\n\n<b>👑 Управление каталогом:</b>\n'
-            '/listcats — Список всех котят\n'
+            '/cat &lt;id&gt; — Карточка котёнка с фото\n'
+            '/listcats — Каталог: листать, отмечать проданных\n'
             '/addcat — Добавить котёнка\n'
             '/soldcat &lt;id&gt; — Отметить как проданного\n'
             '/availcat &lt;id&gt; — Отметить как доступного\n'
-            '/removecat &lt;id&gt; — Удалить котёнка из каталога'
+            '/removecat &lt;id&gt; — Удалить котёнка из каталога\n'
+            '/import — Добавить котят из CSV/JSON-файла\n'
+            '/export [json] — Выгрузить каталог файлом\n'
+            '/broadcast &lt;id&gt; — Разослать анонс котёнка подписчикам\n\n'
+            '<b>📦 Заказы:</b>\n'
+            '/orders — Необработанные заказы\n'
+            '/report [дней] — Выручка и спрос по котятам\n'
+            '/orderdone &lt;id&gt; — Заказ выполнен\n'
+            '/ordercancel &lt;id&gt; — Заказ отменён'
         )
     await update.message.reply_text(text, parse_mode='HTML')
 
 
 # ──────────────── Admin: /listcats ────────────
+# Каталог листается страницами по ADMIN_PAGE_SIZE котят: каждая читается
+# keyset-запросом по id, а сообщение редактируется на месте. callback_data:
+#   cats:next:<id>              — страница после котёнка id
+#   cats:prev:<id>              — страница перед котёнком id
+#   cats:sold|avail:<id>:<after> — отметить и перерисовать страницу после after
+ADMIN_PAGE_SIZE = 10
+
+
+async def admin_cats_page(after=0, before=None):
+    """Страница /listcats: (cats, has_prev, has_next)."""
+    if before is not None:
+        cats, more = await db_query_cats(sort='new', after=(before, before), limit=ADMIN_PAGE_SIZE)
+        if not cats:
+            # Всё, что было раньше, успели удалить
+            return await admin_cats_page()
+        cats.reverse()
+        return cats, more is not None, True
+    cats, more = await db_query_cats(after=(after, after), limit=ADMIN_PAGE_SIZE)
+    if not cats and after:
+        # Страница опустела (удалили хвост каталога) — показываем последнюю
+        cats, has_prev, _ = await admin_cats_page(before=after + 1)
+        return cats, has_prev, False
+    return cats, after > 0, more is not None
+
+
+def admin_cats_keyboard(cats, has_prev, has_next):
+    after = cats[0]['id'] - 1      # с этого места страница перерисовывается после нажатия
+    rows = [[InlineKeyboardButton(
+        '{} #{} {}'.format('❌ Продан:' if c['available'] else '✅ Вернуть:', c['id'], c['name']),
+        callback_data='cats:{}:{}:{}'.format('sold' if c['available'] else 'avail', c['id'], after),
+    )] for c in cats]
+    nav = []
+    if has_prev:
+        nav.append(InlineKeyboardButton('◀️ Назад', callback_data='cats:prev:{}'.format(cats[0]['id'])))
+    if has_next:
+        nav.append(InlineKeyboardButton('Вперёд ▶️', callback_data='cats:next:{}'.format(cats[-1]['id'])))
+    if nav:
+        rows.append(nav)
+    return InlineKeyboardMarkup(rows)
+
+
+@counted_handler
 async def cmd_listcats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_admin(update):
         await update.message.reply_text('Команда недоступна.')
         return
 
-    cats = await db_get_cats()
+    cats, has_prev, has_next = await admin_cats_page()
     if not cats:
         await update.message.reply_text('Каталог пуст.')
         return
+    await update.message.reply_text(
+        templates.cat_page(cats), parse_mode='HTML',
+        reply_markup=admin_cats_keyboard(cats, has_prev, has_next),
+    )
+
+
+@counted_handler
+async def cb_listcats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Кнопки под /listcats: листание и отметка проданным/доступным."""
+    query = update.callback_query
+    if not is_admin(update):
+        await query.answer('Недоступно.')
+        return
+
+    _, action, *args = query.data.split(':')
+    notice = None
+    if action == 'next':
+        page = await admin_cats_page(after=int(args[0]))
+    elif action == 'prev':
+        page = await admin_cats_page(before=int(args[0]))
+    else:
+        cat_id, after = int(args[0]), int(args[1])
+        await db_set_available(cat_id, action == 'avail')
+        notice = '#{} {}'.format(cat_id, 'снова доступен' if action == 'avail' else 'продан')
+        page = await admin_cats_page(after=after)
+    await query.answer(notice)
+
+    cats, has_prev, has_next = page
+    try:
+        if not cats:
+            await query.edit_message_text('Каталог пуст.')
+            return
+        await query.edit_message_text(
+            templates.cat_page(cats), parse_mode='HTML',
+            reply_markup=admin_cats_keyboard(cats, has_prev, has_next),
+        )
+    except BadRequest as exc:
+        # Двойное нажатие: страница не изменилась, Telegram отвечает ошибкой
+        if 'not modified' not in str(exc).lower():
+            raise
+
+
+# ──────────────── Admin: /cat ─────────────────
+@counted_handler
+async def cmd_cat(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_admin(update):
+        await update.message.reply_text('Команда недоступна.')
+        return
+    if not context.args:
+        await update.message.reply_text('Использование: /cat <id>')
+        return
+    try:
+        cat_id = int(context.args[0])
+    except ValueError:
+        await update.message.reply_text('ID должен быть числом.')
+        return
+    cat = await db_get_cat(cat_id)
+    if cat is None:
+        await update.message.reply_text('Котёнка #{} нет в каталоге.'.format(cat_id))
+        return
+    await send_cat_card(update.effective_chat.id, cat)
+
+
+# ──────────────── Admin: /broadcast ───────────
+# Админ получает превью анонса (заодно фото загружается в Telegram, и подписчикам
+# уходит уже по file_id) и сообщение о ходе рассылки с кнопкой «Остановить»:
+#   bcast:stop:<id> — остановить рассылку id
+@counted_handler
+async def cmd_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_admin(update):
+        await update.message.reply_text('Команда недоступна.')
+        return
+    if not context.args:
+        await update.message.reply_text('Использование: /broadcast <id котёнка>')
+        return
+    try:
+        cat_id = int(context.args[0])
+    except ValueError:
+        await update.message.reply_text('ID должен быть числом.')
+        return
+    cat = await db_get_cat(cat_id)
+    if cat is None:
+        await update.message.reply_text('Котёнка #{} нет в каталоге.'.format(cat_id))
+        return
+    if not cat['available']:
+        await update.message.reply_text('Котёнок #{} уже продан — рассылать нечего.'.format(cat_id))
+        return
+    if any(b['cat_id'] == cat_id for b in await db_get_running_broadcasts()):
+        await update.message.reply_text('Рассылка о котёнке #{} уже идёт.'.format(cat_id))
+        return
+
+    chat_id = update.effective_chat.id
+    await send_cat_card(chat_id, cat, templates.ANNOUNCE_HEAD, templates.ANNOUNCE_FOOT,
+                        shop_markup())
+    message = await update.message.reply_text('📣 Рассылка запускается…')
+    broadcast_id, total = await db_create_broadcast(cat_id, chat_id, message.message_id)
+    await report_broadcast(await db_get_broadcast(broadcast_id))
+    broadcast_wakeup.set()
+    logger.info('Рассылка #%d о котёнке #%d: подписчиков %d', broadcast_id, cat_id, total)
+
 
-    lines = ['📋 <b>Каталог котят:</b>\n']
-    for c in cats:
-        status = '✅' if c['available'] else '❌'
-        price_str = '{:,}'.format(c['price']).replace(',', ' ')
-        lines.append('{} <b>#{}</b> {} — {} ₽ | {} мес. | {}'.format(
-            status, c['id'], c['name'], price_str,
-            c['age_months'], '♂' if c['gender'] == 'male' else '♀',
-        ))
+@counted_handler
+async def cb_broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Кнопка «Остановить» под сообщением о ходе рассылки."""
+    query = update.callback_query
+    if not is_admin(update):
+        await query.answer('Недоступно.')
+        return
 
-    lines.append('\n<i>/soldcat &lt;id&gt; — продан | /availcat &lt;id&gt; — доступен | /removecat &lt;id&gt; — удалить</i>')
-    await update.message.reply_text('\n'.join(lines), parse_mode='HTML')
+    broadcast_id = int(query.data.split(':')[2])
+    stopped = await db_cancel_broadcast(broadcast_id)
+    await query.answer('Рассылка остановлена' if stopped else 'Рассылка уже завершена')
+    b = await db_get_broadcast(broadcast_id)
+    if b is not None:
+        await report_broadcast(b)
 
 
 # ──────────────── Admin: /soldcat, /availcat, /removecat ──
+@counted_handler
 async def cmd_soldcat(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_admin(update):
         await update.message.reply_text('Команда недоступна.')
@@ -419,6 +2364,7 @@ async def cmd_soldcat(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text('✅ Котёнок #{} отмечен как проданный.'.format(cat_id))
 
 
+@counted_handler
 async def cmd_availcat(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_admin(update):
         await update.message.reply_text('Команда недоступна.')
@@ -435,6 +2381,7 @@ async def cmd_availcat(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text('✅ Котёнок #{} снова доступен.'.format(cat_id))
 
 
+@counted_handler
 async def cmd_removecat(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_admin(update):
         await update.message.reply_text('Команда недоступна.')
@@ -451,7 +2398,136 @@ async def cmd_removecat(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text('🗑️ Котёнок #{} удалён из каталога.'.format(cat_id))
 
 
+# ──────────────── Admin: /orders, /report ────────────
+@counted_handler
+async def cmd_orders(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_admin(update):
+        await update.message.reply_text('Команда недоступна.')
+        return
+
+    orders = await db_get_pending_orders()
+    if not orders:
+        await update.message.reply_text('Необработанных заказов нет.')
+        return
+
+    await update.message.reply_text(templates.pending_orders(orders, REPORT_TZ), parse_mode='HTML')
+
+
+def report_since(days, now=None):
+    """Начало отчёта за days календарных дней REPORT_TZ (последний из них — сегодня)."""
+    today = (now or datetime.now(REPORT_TZ)).replace(hour=0, minute=0, second=0, microsecond=0)
+    return int((today - timedelta(days=days - 1)).timestamp())
+
+
+@counted_handler
+async def cmd_report(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_admin(update):
+        await update.message.reply_text('Команда недоступна.')
+        return
+    try:
+        days = int(context.args[0]) if context.args else 7
+        if days <= 0:
+            raise ValueError
+    except ValueError:
+        await update.message.reply_text('Использование: /report [число дней]')
+        return
+
+    since = report_since(days)
+    by_day = await db_revenue_by_day(since)
+    per_cat = await db_orders_per_cat(since)
+
+    await update.message.reply_text(
+        templates.report(days, by_day, per_cat), parse_mode='HTML')
+
+
+async def _set_order_status(update, context, status, usage, done_text):
+    if not is_admin(update):
+        await update.message.reply_text('Команда недоступна.')
+        return
+    if not context.args:
+        await update.message.reply_text(usage)
+        return
+    try:
+        order_id = int(context.args[0])
+    except ValueError:
+        await update.message.reply_text('ID должен быть числом.')
+        return
+    if not await db_set_order_status(order_id, status):
+        await update.message.reply_text('Заказ #{} не найден.'.format(order_id))
+        return
+    await update.message.reply_text(done_text.format(order_id))
+
+
+@counted_handler
+async def cmd_orderdone(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await _set_order_status(update, context, 'done',
+                            'Использование: /orderdone <id>', '✅ Заказ #{} выполнен.')
+
+
+@counted_handler
+async def cmd_ordercancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    await _set_order_status(update, context, 'cancelled',
+                            'Использование: /ordercancel <id>', '🚫 Заказ #{} отменён.')
+
+
+# ──────────────── Admin: /import, /export ────────────
+IMPORT_HELP = (
+    '📥 <b>Импорт котят</b>\n\n'
+    'Отправьте файл <b>.csv</b> или <b>.json</b> (UTF-8). Колонки:\n'
+    '<code>name, breed, age_months, gender, price, color, description, image, available</code>\n\n'
+    'gender — male/female (или кот/кошка), available — 1/0 (по умолчанию 1).\n'
+    'Файл добавляется целиком или не добавляется вовсе, если в нём есть ошибки.\n'
+    'Выгрузить текущий каталог: /export или /export json'
+)
+
+
+@counted_handler
+async def cmd_import(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_admin(update):
+        await update.message.reply_text('Команда недоступна.')
+        return
+    await update.message.reply_text(IMPORT_HELP, parse_mode='HTML')
+
+
+@counted_handler
+async def cmd_import_file(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_admin(update):
+        return
+    document = update.message.document
+    if document.file_size and document.file_size > IMPORT_MAX_BYTES:
+        await update.message.reply_text('Файл слишком большой (максимум 20 МБ).')
+        return
+    fmt = 'json' if document.file_name.lower().endswith('.json') else 'csv'
+    tg_file = await context.bot.get_file(document.file_id)
+    data = bytes(await tg_file.download_as_bytearray())
+    try:
+        rows = await asyncio.to_thread(parse_cats_file, data, fmt)
+    except CatalogImportError as exc:
+        await update.message.reply_text(
+            '❌ Файл не импортирован:\n' + '\n'.join(exc.errors))
+        return
+    imported = await db_import_cats(rows)
+    logger.info('Импорт каталога из Telegram: %d котят', imported)
+    await update.message.reply_text('✅ Добавлено котят: {}'.format(imported))
+
+
+@counted_handler
+async def cmd_export(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_admin(update):
+        await update.message.reply_text('Команда недоступна.')
+        return
+    fmt = 'json' if context.args and context.args[0].lower() == 'json' else 'csv'
+    buf = io.BytesIO()
+    async with contextlib.aclosing(export_catalog(fmt)) as chunks:
+        async for chunk in chunks:
+            buf.write(chunk.encode('utf-8'))
+    buf.seek(0)
+    await update.message.reply_document(
+        buf, filename='cats-{}.{}'.format(datetime.now().strftime('%Y%m%d'), fmt))
+
+
 # ──────────────── Admin: /addcat (диалог) ────────────────
+@counted_handler
 async def addcat_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_admin(update):
         await update.message.reply_text('Команда недоступна.')
@@ -468,6 +2544,7 @@ async def addcat_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return ADD_NAME
 
 
+@counted_handler
 async def addcat_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data['new_cat']['name'] = update.message.text.strip()
     await update.message.reply_text(
@@ -478,6 +2555,7 @@ async def addcat_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return ADD_BREED
 
 
+@counted_handler
 async def addcat_breed(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = update.message.text.strip()
     context.user_data['new_cat']['breed'] = text if text != '.' else 'Донской сфинкс'
@@ -488,6 +2566,7 @@ async def addcat_breed(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return ADD_AGE
 
 
+@counted_handler
 async def addcat_age(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         age = int(update.message.text.strip())
@@ -508,6 +2587,7 @@ async def addcat_age(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return ADD_GENDER
 
 
+@counted_handler
 async def addcat_gender(update: Update, context: ContextTypes.DEFAULT_TYPE):
     text = update.message.text.strip()
     context.user_data['new_cat']['gender'] = 'female' if '♀' in text or 'Кошка' in text else 'male'
@@ -519,6 +2599,7 @@ async def addcat_gender(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return ADD_PRICE
 
 
+@counted_handler
 async def addcat_price(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         price = int(update.message.text.strip().replace(' ', '').replace(',', ''))
@@ -536,6 +2617,7 @@ async def addcat_price(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return ADD_COLOR
 
 
+@counted_handler
 async def addcat_color(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data['new_cat']['color'] = update.message.text.strip()
     await update.message.reply_text(
@@ -545,6 +2627,7 @@ async def addcat_color(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return ADD_DESC
 
 
+@counted_handler
 async def addcat_desc(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data['new_cat']['description'] = update.message.text.strip()
     await update.message.reply_text(
@@ -556,6 +2639,7 @@ async def addcat_desc(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return ADD_PHOTO
 
 
+@counted_handler
 async def addcat_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if update.message.photo:
         # Пользователь отправил фото — скачиваем и сохраняем
@@ -563,22 +2647,33 @@ async def addcat_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
         tg_file  = await context.bot.get_file(tg_photo.file_id)
         os.makedirs(PHOTOS_DIR, exist_ok=True)
         filename = '{}.jpg'.format(tg_photo.file_unique_id)
-        await tg_file.download_to_drive(os.path.join(PHOTOS_DIR, filename))
+        filepath = os.path.join(PHOTOS_DIR, filename)
+        await tg_file.download_to_drive(filepath)
         image = '{}/photos/{}'.format(PUBLIC_URL, filename) if PUBLIC_URL else ''
+        file_id = tg_photo.file_id     # по нему /cat и заказы шлют фото без загрузки
+        photo_key = await process_photo(filepath, tg_photo.file_unique_id)
+        index_photo(filename)
+        if photo_key:
+            for width in PHOTO_WIDTHS:
+                for ext in ('jpg', 'webp'):
+                    index_photo(photo_variant_name(photo_key, width, ext))
     else:
         text  = update.message.text.strip()
         image = text if text != '.' else ''
+        photo_key = ''
+        file_id = None
 
     cat = context.user_data['new_cat']
     cat['image'] = image
 
-    price_str  = '{:,}'.format(cat['price']).replace(',', ' ')
     gender_str = '♂ Кот' if cat['gender'] == 'male' else '♀ Кошка'
 
     new_id = await db_add_cat(
         cat['name'], cat['breed'], cat['age_months'], cat['gender'],
-        cat['price'], cat['color'], cat['description'], image,
+        cat['price'], cat['color'], cat['description'], image, photo_key,
     )
+    if file_id:
+        await db_set_cat_file_id(new_id, file_id)
 
     await update.message.reply_text(
         '✅ <b>Котёнок добавлен в каталог! ID: #{}</b>\n\n'
@@ -588,11 +2683,13 @@ async def addcat_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
         '<b>Пол:</b> {gender}\n'
         '<b>Цена:</b> {price} ₽\n'
         '<b>Окрас:</b> {color}\n'
-        '<b>Фото:</b> {image}'.format(
+        '<b>Фото:</b> {image}\n\n'
+        '📣 /broadcast {id} — разослать анонс подписчикам'.format(
             new_id,
-            name=cat['name'], breed=cat['breed'], age=cat['age_months'],
-            gender=gender_str, price=price_str, color=cat['color'],
-            image=image if image else '(не указано)',
+            name=templates.escape(cat['name']), breed=templates.escape(cat['breed']),
+            age=cat['age_months'], gender=gender_str, price=templates.price(cat['price']),
+            color=templates.escape(cat['color']),
+            image=templates.escape(image) if image else '(не указано)', id=new_id,
         ),
         parse_mode='HTML',
         reply_markup=ReplyKeyboardRemove(),
@@ -601,6 +2698,7 @@ async def addcat_photo(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return ConversationHandler.END
 
 
+@counted_handler
 async def addcat_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data.pop('new_cat', None)
     await update.message.reply_text('Добавление отменено.', reply_markup=ReplyKeyboardRemove())
@@ -608,25 +2706,143 @@ async def addcat_cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 # ──────────────── Запуск ─────────────────────
+def create_http_app(worker=False):
+    """HTTP-приложение со всеми маршрутами (его же поднимает bench.py)."""
+    http_app = web.Application(middlewares=[metrics_middleware])
+    http_app.router.add_get('/health',             handle_health)
+    http_app.router.add_get('/health/live',        handle_health)
+    http_app.router.add_get('/health/ready',       handle_health_ready)
+    http_app.router.add_get('/metrics',            handle_metrics)
+    http_app.router.add_get('/cats',               handle_cats)
+    http_app.router.add_get('/cats/search',        handle_cats_search)
+    http_app.router.add_get('/cats/stream',        handle_cats_stream)
+    http_app.router.add_get('/cats/changes',       handle_cats_changes)
+    http_app.router.add_get('/photos/{filename}',  handle_photo_file)
+    http_app.router.add_post('/order',    handle_order)
+    http_app.router.add_post('/feedback', handle_feedback)
+    http_app.router.add_post('/cats/import',       handle_cats_import)
+    http_app.router.add_get('/cats/export',        handle_cats_export)
+    http_app.router.add_route('OPTIONS', '/cats',     handle_options)
+    http_app.router.add_route('OPTIONS', '/cats/search', handle_options)
+    http_app.router.add_route('OPTIONS', '/cats/changes', handle_options)
+    http_app.router.add_route('OPTIONS', '/order',    handle_options)
+    http_app.router.add_route('OPTIONS', '/feedback', handle_options)
+    if DOCS_DIR:
+        http_app.router.add_get('/app/',            handle_docs)
+        http_app.router.add_get('/app/{filename}',  handle_docs)
+    if WEBHOOK_URL:
+        http_app.router.add_post(
+            WEBHOOK_PATH, proxy_telegram_webhook if worker else handle_telegram_webhook)
+    return http_app
+
+
+def web_worker(number, main_socket):
+    """Точка входа дочернего HTTP-процесса (WEB_WORKERS > 1)."""
+    asyncio.run(serve_worker(number, main_socket))
+
+
+async def serve_worker(number, main_socket):
+    global _db, _main_session
+    parent = os.getppid()
+    _ready['bot'] = None
+    _db = create_storage()
+    with startup_step('БД'):
+        # Схему уже обновил главный процесс: воркер её только открывает
+        await _db.open()
+        _ready['db'] = True
+    with startup_step('индекс фото'):
+        build_photo_index()
+    with startup_step('кэш каталога'):
+        await get_catalog()
+    if WEBHOOK_URL:
+        _main_session = ClientSession(connector=UnixConnector(path=main_socket))
+
+    runner = web.AppRunner(create_http_app(worker=True))
+    await runner.setup()
+    site = web.TCPSite(runner, '0.0.0.0', PORT, reuse_port=True)
+    await site.start()
+    _ready['http'] = True
+    logger.info('HTTP-воркер %d запущен (pid %d)', number, os.getpid())
+
+    watcher = asyncio.create_task(catalog_watcher())
+    try:
+        # Главный процесс завершился — завершаемся и мы
+        while os.getppid() == parent:
+            await asyncio.sleep(1)
+    finally:
+        watcher.cancel()
+        await asyncio.gather(watcher, return_exceptions=True)
+        catalog_events.close()
+        await runner.cleanup()
+        if _main_session is not None:
+            await _main_session.close()
+        await _db.close()
+
+
+def start_web_workers(main_socket):
+    ctx = multiprocessing.get_context('spawn')
+    workers = []
+    for number in range(1, WEB_WORKERS):
+        proc = ctx.Process(target=web_worker, args=(number, main_socket),
+                           name='web-worker-{}'.format(number), daemon=True)
+        proc.start()
+        workers.append(proc)
+    return workers
+
+
+def stop_web_workers(workers):
+    for proc in workers:
+        proc.terminate()
+    for proc in workers:
+        proc.join(5)
+
+
 async def run():
-    global _bot
+    global _bot, _tg_app, _db
 
     if not BOT_TOKEN:
         print('ОШИБКА: BOT_TOKEN не задан!')
         return
 
-    # Инициализируем БД
-    await init_db()
+    # Открываем пул соединений и применяем миграции схемы
+    _db = create_storage()
+    with startup_step('БД'):
+        await _db.open()
+        await init_db()
+        _ready['db'] = True
+    with startup_step('индекс фото'):
+        build_photo_index()
+    if DOCS_DIR:
+        with startup_step('сжатие статики'):
+            precompress_static(DOCS_DIR)
+    with startup_step('кэш каталога'):
+        await get_catalog()
 
     # ── Telegram bot ──
     tg_app = Application.builder().token(BOT_TOKEN).build()
 
     tg_app.add_handler(CommandHandler('start',     cmd_start))
     tg_app.add_handler(CommandHandler('help',      cmd_help))
+    tg_app.add_handler(CommandHandler('stop',      cmd_stop))
+    tg_app.add_handler(CommandHandler('subscribe', cmd_subscribe))
     tg_app.add_handler(CommandHandler('listcats',  cmd_listcats))
+    tg_app.add_handler(CommandHandler('cat',       cmd_cat))
+    tg_app.add_handler(CallbackQueryHandler(cb_listcats, pattern=r'^cats:'))
     tg_app.add_handler(CommandHandler('soldcat',   cmd_soldcat))
     tg_app.add_handler(CommandHandler('availcat',  cmd_availcat))
     tg_app.add_handler(CommandHandler('removecat', cmd_removecat))
+    tg_app.add_handler(CommandHandler('orders',      cmd_orders))
+    tg_app.add_handler(CommandHandler('report',      cmd_report))
+    tg_app.add_handler(CommandHandler('orderdone',   cmd_orderdone))
+    tg_app.add_handler(CommandHandler('ordercancel', cmd_ordercancel))
+    tg_app.add_handler(CommandHandler('import',      cmd_import))
+    tg_app.add_handler(CommandHandler('export',      cmd_export))
+    tg_app.add_handler(CommandHandler('broadcast',   cmd_broadcast))
+    tg_app.add_handler(CallbackQueryHandler(cb_broadcast, pattern=r'^bcast:stop:'))
+    tg_app.add_handler(MessageHandler(
+        filters.Document.FileExtension('csv') | filters.Document.FileExtension('json'),
+        cmd_import_file,
+    ))
 
     addcat_handler = ConversationHandler(
         entry_points=[CommandHandler('addcat', addcat_start)],
@@ -649,38 +2865,70 @@ async def run():
     tg_app.add_handler(addcat_handler)
 
     _bot = tg_app.bot
+    _tg_app = tg_app
 
     # ── HTTP server ──
-    http_app = web.Application()
-    http_app.router.add_get('/health',             handle_health)
-    http_app.router.add_get('/cats',               handle_cats)
-    http_app.router.add_get('/photos/{filename}',  handle_photo_file)
-    http_app.router.add_post('/order',    handle_order)
-    http_app.router.add_post('/feedback', handle_feedback)
-    http_app.router.add_route('OPTIONS', '/cats',     handle_options)
-    http_app.router.add_route('OPTIONS', '/order',    handle_options)
-    http_app.router.add_route('OPTIONS', '/feedback', handle_options)
-
+    # Сервер поднимается раньше бота, чтобы Railway видел /health/ready (503 до конца запуска)
+    http_app = create_http_app()
     runner = web.AppRunner(http_app)
     await runner.setup()
-    site = web.TCPSite(runner, '0.0.0.0', PORT)
-    await site.start()
-    logger.info('HTTP сервер запущен на порту %d', PORT)
-
-    # ── Start polling ──
-    await tg_app.initialize()
-    await tg_app.start()
-    await tg_app.updater.start_polling(allowed_updates=Update.ALL_TYPES)
-    logger.info('Бот запущен!')
+    multi = WEB_WORKERS > 1
+    site = web.TCPSite(runner, '0.0.0.0', PORT, reuse_port=multi or None)
+    with startup_step('HTTP'):
+        await site.start()
+        _ready['http'] = True
+    workers, main_socket = [], None
+    if multi:
+        # Через этот сокет воркеры пересылают апдейты webhook
+        main_socket = os.path.join(tempfile.gettempdir(), 'cats-bot-{}.sock'.format(os.getpid()))
+        if WEBHOOK_URL:
+            await web.UnixSite(runner, main_socket).start()
+        workers = start_web_workers(main_socket)
+    logger.info('HTTP сервер запущен на порту %d (процессов: %d)', PORT, WEB_WORKERS)
+
+    # ── Start webhook / polling ──
+    with startup_step('бот'):
+        await tg_app.initialize()
+        await tg_app.start()
+        if WEBHOOK_URL:
+            await tg_app.bot.set_webhook(
+                WEBHOOK_URL, secret_token=WEBHOOK_SECRET, allowed_updates=Update.ALL_TYPES,
+            )
+            logger.info('Бот запущен (webhook): %s', WEBHOOK_URL)
+        else:
+            # start_polling сам снимает webhook, если он был установлен
+            await tg_app.updater.start_polling(allowed_updates=Update.ALL_TYPES)
+            logger.info('Бот запущен!')
+        _ready['bot'] = True
     logger.info('Mini App URL: %s', MINI_APP_URL)
+    logger.info('Готов за %.1f с', time.time() - _started_at)
+
+    background = [
+        asyncio.create_task(outbox_dispatcher()),
+        asyncio.create_task(reservation_sweeper()),
+        asyncio.create_task(broadcaster()),
+    ]
+    if multi or _db.shared:
+        background.append(asyncio.create_task(catalog_watcher()))
 
     try:
         await asyncio.Event().wait()
     finally:
-        await tg_app.updater.stop()
+        for task in background:
+            task.cancel()
+        await asyncio.gather(*background, return_exceptions=True)
+        stop_web_workers(workers)
+        if tg_app.updater.running:
+            await tg_app.updater.stop()
         await tg_app.stop()
         await tg_app.shutdown()
+        catalog_events.close()
         await runner.cleanup()
+        if main_socket is not None:
+            with contextlib.suppress(FileNotFoundError):
+                os.unlink(main_socket)
+        shutdown_photo_pool()
+        await _db.close()
 
 
 if __name__ == '__main__':
@@ -0,0 +1,151 @@
+"""
+Метрики в текстовом формате Prometheus — без внешних зависимостей.
+
+Счётчики и гистограммы живут в памяти процесса; запись значения — это
+поиск в словаре и bisect, поэтому их можно не выключать в проде.
+"""
+
+import time
+import bisect
+import functools
+
+# Границы корзин гистограмм по умолчанию (секунды)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REGISTRY = []
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=''):
+    pairs = ['{}="{}"'.format(n, _escape(v)) for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    """Монотонный счётчик с метками."""
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._values = {}
+        REGISTRY.append(self)
+
+    def inc(self, *labels, amount=1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = ['# HELP {} {}'.format(self.name, self.help),
+                 '# TYPE {} counter'.format(self.name)]
+        for labels, value in self._values.items():
+            lines.append('{}{} {}'.format(self.name, _labels(self.label_names, labels), value))
+        return lines
+
+
+class Gauge:
+    """Текущее значение, которое вычисляется функцией в момент отдачи метрик."""
+
+    def __init__(self, name, help, func):
+        self.name = name
+        self.help = help
+        self.func = func
+        REGISTRY.append(self)
+
+    def render(self):
+        return ['# HELP {} {}'.format(self.name, self.help),
+                '# TYPE {} gauge'.format(self.name),
+                '{} {}'.format(self.name, self.func())]
+
+
+class Histogram:
+    """Гистограмма длительностей с метками; корзины хранятся не накопленными."""
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._series = {}   # метки → [счётчики по корзинам, сумма, количество]
+        REGISTRY.append(self)
+
+    def observe(self, value, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * len(self.buckets), 0.0, 0]
+        i = bisect.bisect_left(self.buckets, value)
+        if i < len(self.buckets):
+            series[0][i] += 1
+        series[1] += value
+        series[2] += 1
+
+    def time(self, *labels):
+        """Контекстный менеджер: замеряет время блока."""
+        return _Timer(self, labels)
+
+    def render(self):
+        lines = ['# HELP {} {}'.format(self.name, self.help),
+                 '# TYPE {} histogram'.format(self.name)]
+        for labels, (counts, total, count) in self._series.items():
+            cumulative = 0
+            for bound, n in zip(self.buckets, counts):
+                cumulative += n
+                lines.append('{}_bucket{} {}'.format(
+                    self.name, _labels(self.label_names, labels, 'le="{}"'.format(bound)), cumulative))
+            lines.append('{}_bucket{} {}'.format(
+                self.name, _labels(self.label_names, labels, 'le="+Inf"'), count))
+            lines.append('{}_sum{} {}'.format(self.name, _labels(self.label_names, labels), total))
+            lines.append('{}_count{} {}'.format(self.name, _labels(self.label_names, labels), count))
+        return lines
+
+
+class _Timer:
+    __slots__ = ('histogram', 'labels', 'start')
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, *self.labels)
+
+
+def timed(histogram):
+    """Декоратор корутины: время каждого вызова с меткой — именем функции."""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start, func.__name__)
+        return wrapper
+    return decorator
+
+
+def counted(counter):
+    """Декоратор корутины: счётчик вызовов с меткой — именем функции."""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            counter.inc(func.__name__)
+            return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def render():
+    """Все метрики процесса в текстовом формате Prometheus."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
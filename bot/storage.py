@@ -0,0 +1,1492 @@
+"""
+Хранилище данных бота: SQLite (файл, по умолчанию) или PostgreSQL (asyncpg).
+
+bot.py ходит в БД только через методы Storage, SQL каждой СУБД живёт в своём
+классе. Хранилище ничего не знает о кэше каталога и SSE: методы, меняющие
+каталог, возвращают его новую версию, а сбросом кэша и рассылкой событий
+занимаются обёртки db_* в bot.py.
+"""
+
+import time
+import sqlite3
+import asyncio
+import logging
+import contextlib
+from abc import ABC, abstractmethod
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from urllib.parse import urlsplit
+
+import aiosqlite
+
+try:
+    import asyncpg
+except ImportError:          # без asyncpg доступен только SQLite
+    asyncpg = None
+
+logger = logging.getLogger(__name__)
+
+# Поля котёнка, которые задаёт админ: начальные данные, импорт и экспорт
+CAT_FIELDS = ('name', 'breed', 'age_months', 'gender', 'price', 'color',
+              'description', 'image', 'available')
+
+# Журнал изменений каталога (catalog_changes): сколько последних версий хранить
+# и как часто (раз в сколько версий) чистить более старые записи
+CHANGES_KEEP = 1000
+CHANGES_PRUNE_EVERY = 100
+
+# Сортировки GET /cats: имя → (колонка, направление). Вторичный ключ всегда id.
+CAT_SORTS = {
+    'id':         ('id', 'ASC'),
+    'new':        ('id', 'DESC'),
+    'price_asc':  ('price', 'ASC'),
+    'price_desc': ('price', 'DESC'),
+    'age_asc':    ('age_months', 'ASC'),
+    'age_desc':   ('age_months', 'DESC'),
+}
+
+
+class CatsUnavailable(Exception):
+    """Часть котят из заказа уже продана или забронирована другим покупателем."""
+
+    def __init__(self, cat_ids):
+        super().__init__('Котята недоступны: {}'.format(cat_ids))
+        self.cat_ids = cat_ids
+
+
+class Storage(ABC):
+    """Общий интерфейс хранилищ.
+
+    Строки возвращаются словарями (колонка → значение). Методы, меняющие
+    каталог, возвращают новую версию каталога или None, если ничего не
+    изменилось. Хранилище, в котором реализованы не все методы, не создаётся
+    (TypeError при создании, а не посреди запроса).
+    """
+
+    label = ''        # что писать в лог вместо строки подключения (в ней пароль)
+    shared = False    # БД могут менять другие серверы — кэш надо сверять с ней всегда
+
+    @abstractmethod
+    def placeholder(self, n):
+        """Параметр запроса номер n (с 1) в синтаксисе СУБД."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def _fetch(self, sql, params=()):
+        """Строки запроса на чтение списком словарей."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def open(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def close(self):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def init(self, seed):
+        """Применяет недостающие миграции схемы. Возвращает (было, стало) — номера версий.
+
+        Схема уже последней версии — ничего не делает. При создании БД
+        (версия 0) пустой каталог заполняет seed (кортежи CAT_FIELDS).
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def data_version(self):
+        """Значение, которое меняется при каждой записи в каталог или outbox."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_catalog_version(self):
+        """(version, updated_at) каталога."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_catalog_snapshot(self):
+        """(version, updated_at, cats) — версия и строки из одного снимка БД."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_catalog_changes(self, since, limit):
+        """(version, cats, removed) — строки котят, изменённых после версии since, и id удалённых.
+
+        cats=None — журнал не покрывает since или изменений больше limit:
+        клиенту дешевле перечитать каталог.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def search_cats(self, terms, any_word, limit):
+        """Полнотекстовый поиск по основам слов: [(id, snippet, rank)], лучшие первыми."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def add_cat(self, values, photo_key):
+        """Добавляет котёнка (кортеж CAT_FIELDS). Возвращает (id, version, строка)."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def remove_cat(self, cat_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def set_available(self, cat_id, available):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def import_cats(self, rows):
+        raise NotImplementedError
+
+    @abstractmethod
+    def iter_cats(self, batch):
+        """Асинхронный генератор: пачки кортежей (id, *CAT_FIELDS) по порядку id."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def enqueue_messages(self, messages, parse_mode):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def set_cat_file_id(self, cat_id, file_id):
+        """Запоминает file_id фото котёнка в Telegram. Версию каталога не меняет."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def create_order(self, name, phone, address, comment, items, chats, render,
+                           now, reserved_until):
+        """Заказ, бронь котят и outbox одной транзакцией. Возвращает (order_id, reserved, version).
+
+        В outbox каждого чата встаёт текст заказа, а за ним карточки
+        забронированных котят. Если кто-то из котят уже занят — откат и
+        CatsUnavailable.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def set_order_status(self, order_id, status):
+        """None — заказа нет, иначе (id котят, которых это изменило, version)."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def expire_reservations(self, now):
+        """(id освобождённых котят, version)."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def revenue_by_day(self, since, tz):
+        """Выручка по дням с since; день — дата в часовом поясе tz (имя IANA, например Europe/Moscow).
+
+        Дни делятся по правилам пояса на момент каждого заказа, так что переход
+        на летнее время не сдвигает старые заказы в соседний день.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_due_outbox(self, limit):
+        """(сообщения, которые пора отправить; время следующего по очереди или None)."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def outbox_sent(self, msg_id):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def outbox_failed(self, msg_id, attempts, error, retry_at):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def add_subscriber(self, chat_id, first_name, now):
+        """Новый подписчик (из /start). Уже известный — только обновляется имя.
+
+        Возвращает, подписан ли он: отписавшегося /start обратно не подписывает.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def set_subscribed(self, chat_id, active, now):
+        """Подписка / отписка. False — такого подписчика нет."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def deactivate_subscribers(self, chat_ids, now):
+        """Отписывает чаты, куда бот больше не может писать (заблокировали бота)."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def create_broadcast(self, cat_id, chat_id, message_id, now):
+        """Новая рассылка о котёнке; отчёт о ходе — в сообщение message_id. Возвращает (id, total)."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def claim_broadcast(self, broadcast_id, owner, now, until):
+        """Берёт рассылку в работу до until или продлевает свою. False — её ведёт другой процесс."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def save_broadcast_progress(self, broadcast_id, after_id, sent, failed, status, now):
+        """Сохраняет, докуда дошла рассылка, и возвращает её статус.
+
+        Остановленную (cancel_broadcast) рассылку status не возобновляет.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    async def cancel_broadcast(self, broadcast_id, now):
+        """Останавливает идущую рассылку. False — она уже не идёт."""
+        raise NotImplementedError
+
+    # ── Общие запросы: отличаются только плейсхолдерами ──
+    async def get_cats(self):
+        return await self._fetch('SELECT * FROM cats ORDER BY id')
+
+    async def get_cat(self, cat_id):
+        rows = await self._fetch('SELECT * FROM cats WHERE id = ' + self.placeholder(1), (cat_id,))
+        return rows[0] if rows else None
+
+    async def query_cats(self, gender=None, available=None, breed=None, min_price=None,
+                         max_price=None, ids=None, sort='id', after=None, limit=24):
+        """Одна страница каталога с фильтрами и keyset-курсором.
+
+        after — (значение ключа сортировки, id) последней строки предыдущей страницы.
+        Возвращает (cats, next_after); next_after is None, если страница последняя.
+        """
+        column, direction = CAT_SORTS[sort]
+        where, params = [], []
+
+        def arg(value):
+            params.append(value)
+            return self.placeholder(len(params))
+
+        if gender is not None:
+            where.append('gender = ' + arg(gender))
+        if available is not None:
+            where.append('available = ' + arg(1 if available else 0))
+        if breed is not None:
+            where.append('breed = ' + arg(breed))
+        if min_price is not None:
+            where.append('price >= ' + arg(min_price))
+        if max_price is not None:
+            where.append('price <= ' + arg(max_price))
+        if ids is not None:
+            where.append('id IN ({})'.format(','.join(arg(i) for i in ids)) if ids else '1 = 0')
+        if after is not None:
+            op = '>' if direction == 'ASC' else '<'
+            if column == 'id':
+                where.append('id {} {}'.format(op, arg(after[1])))
+            else:
+                where.append('({}, id) {} ({}, {})'.format(column, op, arg(after[0]), arg(after[1])))
+
+        sql = 'SELECT * FROM cats'
+        if where:
+            sql += ' WHERE ' + ' AND '.join(where)
+        if column == 'id':
+            sql += ' ORDER BY id {}'.format(direction)
+        else:
+            sql += ' ORDER BY {0} {1}, id {1}'.format(column, direction)
+        sql += ' LIMIT ' + arg(limit + 1)
+
+        rows = await self._fetch(sql, params)
+        cats = rows[:limit]
+        next_after = None
+        if len(rows) > limit:
+            last = cats[-1]
+            next_after = (last[column], last['id'])
+        return cats, next_after
+
+    async def count_subscribers(self):
+        rows = await self._fetch('SELECT COUNT(*) AS n FROM subscribers WHERE active = 1')
+        return rows[0]['n']
+
+    async def subscribers_after(self, after_id, limit):
+        """Следующая пачка подписчиков по id (keyset): [{'id', 'chat_id'}]."""
+        return await self._fetch(
+            'SELECT id, chat_id FROM subscribers WHERE id > {} AND active = 1 '
+            'ORDER BY id LIMIT {}'.format(self.placeholder(1), self.placeholder(2)),
+            (after_id, limit),
+        )
+
+    async def get_broadcast(self, broadcast_id):
+        rows = await self._fetch('SELECT * FROM broadcasts WHERE id = ' + self.placeholder(1),
+                                 (broadcast_id,))
+        return rows[0] if rows else None
+
+    async def get_running_broadcasts(self):
+        return await self._fetch("SELECT * FROM broadcasts WHERE status = 'running' ORDER BY id")
+
+    async def get_pending_orders(self, limit):
+        """Необработанные заказы, новые сверху, с числом котят в каждом."""
+        return await self._fetch(
+            'SELECT o.id, o.created_at, o.name, o.phone, o.total, COUNT(oi.id) AS items '
+            'FROM orders o LEFT JOIN order_items oi ON oi.order_id = o.id '
+            "WHERE o.status = 'new' GROUP BY o.id ORDER BY o.created_at DESC "
+            'LIMIT ' + self.placeholder(1),
+            (limit,),
+        )
+
+    async def orders_per_cat(self, since, limit):
+        """Сколько раз заказывали каждого котёнка и сколько заказов завершены продажей."""
+        return await self._fetch(
+            'SELECT oi.cat_id, MAX(COALESCE(c.name, oi.name)) AS name, '
+            '       COUNT(DISTINCT o.id) AS ordered, '
+            "       COUNT(DISTINCT CASE WHEN o.status = 'done' THEN o.id END) AS done "
+            'FROM order_items oi '
+            'JOIN orders o ON o.id = oi.order_id '
+            'LEFT JOIN cats c ON c.id = oi.cat_id '
+            'WHERE o.created_at >= {} '
+            'GROUP BY oi.cat_id, CASE WHEN oi.cat_id IS NULL THEN oi.name END '
+            'ORDER BY ordered DESC, done DESC LIMIT {}'.format(
+                self.placeholder(1), self.placeholder(2)),
+            (since, limit),
+        )
+
+
+# ──────────────── SQLite ────────────────
+def fts_match_query(terms, any_word=False):
+    """Основы слов → выражение FTS5 MATCH (каждая ищется по префиксу)."""
+    return (' OR ' if any_word else ' ').join('"{}"*'.format(t) for t in terms)
+
+
+def day_in_tz(ts, tz):
+    """SQL-функция day_in_tz(ts, tz): дата YYYY-MM-DD момента ts (unix time) в поясе tz.
+
+    В SQLite нет базы часовых поясов, поэтому день считает zoneinfo.
+    """
+    return datetime.fromtimestamp(ts, ZoneInfo(tz)).strftime('%Y-%m-%d')
+
+
+class SqliteStorage(Storage):
+    """Долгоживущие соединения с SQLite: один писатель и несколько читателей.
+
+    В режиме WAL читатели не ждут записи админских команд, а потоки
+    aiosqlite создаются один раз при старте, а не на каждый запрос.
+    """
+
+    PRAGMAS = (
+        'PRAGMA synchronous = NORMAL',
+        'PRAGMA busy_timeout = 5000',
+        'PRAGMA temp_store = MEMORY',
+        'PRAGMA cache_size = -16000',      # ~16 МБ на соединение
+        'PRAGMA mmap_size = 268435456',    # 256 МБ
+        'PRAGMA foreign_keys = ON',
+    )
+
+    def __init__(self, path, readers=4):
+        self.path = path
+        self.label = path
+        self.readers_count = max(1, readers)
+        self._writer = None
+        self._write_lock = asyncio.Lock()
+        self._readers = asyncio.Queue()
+        self._all_readers = []
+
+    def placeholder(self, n):
+        return '?'
+
+    async def _connect(self, query_only=False):
+        conn = await aiosqlite.connect(self.path)
+        conn.row_factory = aiosqlite.Row
+        pragmas = self.PRAGMAS + (('PRAGMA query_only = ON',) if query_only else ())
+        for pragma in pragmas:
+            async with conn.execute(pragma):
+                pass
+        await conn.create_function('day_in_tz', 2, day_in_tz, deterministic=True)
+        return conn
+
+    async def open(self):
+        self._writer = await self._connect()
+        async with self._writer.execute('PRAGMA journal_mode = WAL'):
+            pass
+        for _ in range(self.readers_count):
+            conn = await self._connect(query_only=True)
+            self._all_readers.append(conn)
+            self._readers.put_nowait(conn)
+        logger.info('БД открыта: %s (читателей: %d)', self.path, self.readers_count)
+
+    async def close(self):
+        for conn in self._all_readers:
+            await conn.close()
+        self._all_readers.clear()
+        if self._writer is not None:
+            await self._writer.close()
+            self._writer = None
+
+    async def data_version(self):
+        """PRAGMA data_version писателя: меняется, когда в БД записал кто-то другой."""
+        async with self._write_lock:
+            async with self._writer.execute('PRAGMA data_version') as cursor:
+                (version,) = await cursor.fetchone()
+        return version
+
+    @contextlib.asynccontextmanager
+    async def read(self):
+        """Берёт свободное соединение для чтения на время блока."""
+        conn = await self._readers.get()
+        try:
+            yield conn
+        finally:
+            if conn.in_transaction:
+                await conn.rollback()
+            self._readers.put_nowait(conn)
+
+    @contextlib.asynccontextmanager
+    async def write(self):
+        """Транзакция на соединении-писателе: commit в конце блока, rollback при ошибке."""
+        async with self._write_lock:
+            try:
+                yield self._writer
+            except BaseException:
+                await self._writer.rollback()
+                raise
+            await self._writer.commit()
+
+    async def _fetch(self, sql, params=()):
+        async with self.read() as db:
+            cursor = await db.execute(sql, params)
+            rows = await cursor.fetchall()
+        return [dict(r) for r in rows]
+
+    @staticmethod
+    async def _add_column(db, table, column, ddl):
+        """ALTER TABLE ADD COLUMN, если такой колонки ещё нет (для старых БД)."""
+        cursor = await db.execute('PRAGMA table_info({})'.format(table))
+        if column not in [row['name'] for row in await cursor.fetchall()]:
+            await db.execute('ALTER TABLE {} ADD COLUMN {} {}'.format(table, column, ddl))
+
+    @staticmethod
+    async def _bump_version(db, cat_ids):
+        """Увеличивает версию каталога в той же транзакции, что и само изменение.
+
+        cat_ids — кого изменение затронуло, они пишутся в журнал catalog_changes.
+        Возвращает новую версию.
+        """
+        async with db.execute(
+            'UPDATE catalog_meta SET version = version + 1, updated_at = ? WHERE id = 1 RETURNING version',
+            (int(time.time()),),
+        ) as cursor:
+            (version,) = await cursor.fetchone()
+        await db.executemany(
+            'INSERT OR IGNORE INTO catalog_changes (version, cat_id) VALUES (?, ?)',
+            [(version, cat_id) for cat_id in cat_ids],
+        )
+        if version % CHANGES_PRUNE_EVERY == 0:
+            await db.execute('DELETE FROM catalog_changes WHERE version <= ?',
+                             (version - CHANGES_KEEP,))
+            await db.execute('UPDATE catalog_meta SET changes_from = MAX(changes_from, ?) WHERE id = 1',
+                             (version - CHANGES_KEEP,))
+        return version
+
+    async def _migrate_base(self, db):
+        """Схема, сложившаяся до появления миграций.
+
+        Шаг идемпотентен: его проходят и БД, созданные старыми версиями бота
+        (user_version = 0), — недостающие таблицы и колонки добавляются.
+        """
+        await db.execute('''
+            CREATE TABLE IF NOT EXISTS cats (
+                id          INTEGER PRIMARY KEY AUTOINCREMENT,
+                name        TEXT    NOT NULL,
+                breed       TEXT    NOT NULL DEFAULT 'Донской сфинкс',
+                age_months  INTEGER NOT NULL DEFAULT 3,
+                gender      TEXT    NOT NULL DEFAULT 'male',
+                price       INTEGER NOT NULL,
+                color       TEXT    NOT NULL DEFAULT '',
+                description TEXT    NOT NULL DEFAULT '',
+                image       TEXT    NOT NULL DEFAULT '',
+                available   INTEGER NOT NULL DEFAULT 1
+            )
+        ''')
+        # Ключ загруженного фото: по нему строятся имена превью {key}_{ширина}.jpg/.webp
+        await self._add_column(db, 'cats', 'photo_key', "TEXT NOT NULL DEFAULT ''")
+        # Бронь: до какого момента (unix time) и каким заказом котёнок придержан
+        await self._add_column(db, 'cats', 'reserved_until', 'INTEGER')
+        await self._add_column(db, 'cats', 'reserved_order', 'INTEGER')
+        # file_id фото в Telegram: карточка котёнка уходит ссылкой, без повторной загрузки
+        await self._add_column(db, 'cats', 'tg_file_id', 'TEXT')
+        await db.execute(
+            'CREATE INDEX IF NOT EXISTS idx_cats_reserved ON cats (reserved_until) '
+            'WHERE reserved_until IS NOT NULL'
+        )
+        # Индексы под фильтры и сортировки GET /cats (keyset-пагинация по (ключ, id))
+        await self._script(db, '''
+            CREATE INDEX IF NOT EXISTS idx_cats_price     ON cats (price, id);
+            CREATE INDEX IF NOT EXISTS idx_cats_age       ON cats (age_months, id);
+            CREATE INDEX IF NOT EXISTS idx_cats_breed     ON cats (breed, id);
+            CREATE INDEX IF NOT EXISTS idx_cats_gender    ON cats (gender, id);
+            CREATE INDEX IF NOT EXISTS idx_cats_gender_price ON cats (gender, price, id);
+            CREATE INDEX IF NOT EXISTS idx_cats_available ON cats (available, id);
+        ''')
+        # Полнотекстовый индекс по cats; триггеры держат его в актуальном состоянии
+        await self._script(db, '''
+            CREATE VIRTUAL TABLE IF NOT EXISTS cats_fts USING fts5(
+                name, breed, color, description,
+                content='cats', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2',
+                prefix='2 3'
+            );
+            CREATE TRIGGER IF NOT EXISTS cats_fts_ai AFTER INSERT ON cats BEGIN
+                INSERT INTO cats_fts (rowid, name, breed, color, description)
+                VALUES (new.id, new.name, new.breed, new.color, new.description);
+            END;
+            CREATE TRIGGER IF NOT EXISTS cats_fts_ad AFTER DELETE ON cats BEGIN
+                INSERT INTO cats_fts (cats_fts, rowid, name, breed, color, description)
+                VALUES ('delete', old.id, old.name, old.breed, old.color, old.description);
+            END;
+            DROP TRIGGER IF EXISTS cats_fts_au;
+            CREATE TRIGGER cats_fts_au AFTER UPDATE OF name, breed, color, description ON cats BEGIN
+                INSERT INTO cats_fts (cats_fts, rowid, name, breed, color, description)
+                VALUES ('delete', old.id, old.name, old.breed, old.color, old.description);
+                INSERT INTO cats_fts (rowid, name, breed, color, description)
+                VALUES (new.id, new.name, new.breed, new.color, new.description);
+            END;
+        ''')
+        # Индекс мог отстать от cats в старой БД — собираем заново (один раз)
+        await db.execute("INSERT INTO cats_fts (cats_fts) VALUES ('rebuild')")
+        # Очередь исходящих уведомлений: заказ сначала пишется сюда, потом отправляется
+        await self._script(db, '''
+            CREATE TABLE IF NOT EXISTS outbox (
+                id          INTEGER PRIMARY KEY AUTOINCREMENT,
+                chat_id     TEXT    NOT NULL,
+                text        TEXT    NOT NULL,
+                parse_mode  TEXT,
+                status      TEXT    NOT NULL DEFAULT 'pending',
+                attempts    INTEGER NOT NULL DEFAULT 0,
+                next_at     REAL    NOT NULL,
+                created_at  REAL    NOT NULL,
+                last_error  TEXT
+            );
+            CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (status, next_at);
+        ''')
+        # cat_id задан — вместо text отправляется карточка котёнка с фото
+        await self._add_column(db, 'outbox', 'cat_id', 'INTEGER')
+        # Заказы из Mini App: шапка заказа + позиции (котята)
+        await self._script(db, '''
+            CREATE TABLE IF NOT EXISTS orders (
+                id          INTEGER PRIMARY KEY AUTOINCREMENT,
+                created_at  INTEGER NOT NULL,
+                status      TEXT    NOT NULL DEFAULT 'new',
+                name        TEXT    NOT NULL DEFAULT '',
+                phone       TEXT    NOT NULL DEFAULT '',
+                address     TEXT    NOT NULL DEFAULT '',
+                comment     TEXT    NOT NULL DEFAULT '',
+                total       INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS idx_orders_created ON orders (created_at);
+            CREATE INDEX IF NOT EXISTS idx_orders_status  ON orders (status, created_at);
+            CREATE TABLE IF NOT EXISTS order_items (
+                id          INTEGER PRIMARY KEY AUTOINCREMENT,
+                order_id    INTEGER NOT NULL REFERENCES orders (id) ON DELETE CASCADE,
+                cat_id      INTEGER REFERENCES cats (id) ON DELETE SET NULL,
+                name        TEXT    NOT NULL,
+                breed       TEXT    NOT NULL DEFAULT '',
+                price       INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_order_items_order ON order_items (order_id);
+            CREATE INDEX IF NOT EXISTS idx_order_items_cat   ON order_items (cat_id);
+        ''')
+        # Версия каталога: растёт при каждом изменении, из неё строится ETag
+        await db.execute('''
+            CREATE TABLE IF NOT EXISTS catalog_meta (
+                id          INTEGER PRIMARY KEY CHECK (id = 1),
+                version     INTEGER NOT NULL,
+                updated_at  INTEGER NOT NULL
+            )
+        ''')
+        await db.execute(
+            'INSERT OR IGNORE INTO catalog_meta (id, version, updated_at) VALUES (1, 1, ?)',
+            (int(time.time()),),
+        )
+        # Журнал: какие котята менялись в какой версии — для GET /cats/changes.
+        # changes_from — самая ранняя версия, от которой журнал полон
+        await self._add_column(db, 'catalog_meta', 'changes_from', 'INTEGER')
+        await db.execute('''
+            CREATE TABLE IF NOT EXISTS catalog_changes (
+                version     INTEGER NOT NULL,
+                cat_id      INTEGER NOT NULL,
+                PRIMARY KEY (version, cat_id)
+            ) WITHOUT ROWID
+        ''')
+        await db.execute('UPDATE catalog_meta SET changes_from = version WHERE changes_from IS NULL')
+
+    async def _migrate_subscribers(self, db):
+        # after_id — id последнего обработанного подписчика: с него рассылка
+        # продолжается после перезапуска
+        await self._script(db, '''
+            CREATE TABLE IF NOT EXISTS subscribers (
+                id          INTEGER PRIMARY KEY AUTOINCREMENT,
+                chat_id     INTEGER NOT NULL UNIQUE,
+                first_name  TEXT    NOT NULL DEFAULT '',
+                active      INTEGER NOT NULL DEFAULT 1,
+                created_at  INTEGER NOT NULL,
+                updated_at  INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS broadcasts (
+                id          INTEGER PRIMARY KEY AUTOINCREMENT,
+                cat_id      INTEGER NOT NULL,
+                status      TEXT    NOT NULL DEFAULT 'running',
+                chat_id     INTEGER NOT NULL,
+                message_id  INTEGER,
+                total       INTEGER NOT NULL DEFAULT 0,
+                sent        INTEGER NOT NULL DEFAULT 0,
+                failed      INTEGER NOT NULL DEFAULT 0,
+                after_id    INTEGER NOT NULL DEFAULT 0,
+                owner       TEXT,
+                lease_until REAL,
+                created_at  INTEGER NOT NULL,
+                finished_at INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS idx_broadcasts_status ON broadcasts (status);
+        ''')
+
+    # Миграции по порядку: номер шага = позиция + 1. Номер последнего применённого
+    # хранится в PRAGMA user_version. Новые шаги только дописываются в конец
+    MIGRATIONS = (
+        ('каталог, поиск, outbox, заказы, журнал изменений каталога', _migrate_base),
+        ('подписчики на новости питомника и рассылки о новых котятах', _migrate_subscribers),
+    )
+
+    @staticmethod
+    async def _script(db, script):
+        """Выполняет операторы скрипта по одному.
+
+        executescript сам делает COMMIT, а миграция должна идти одной транзакцией.
+        """
+        statement = ''
+        for line in script.splitlines(keepends=True):
+            statement += line
+            if sqlite3.complete_statement(statement):
+                await db.execute(statement)
+                statement = ''
+
+    async def _schema_version(self, db):
+        async with db.execute('PRAGMA user_version') as cursor:
+            (version,) = await cursor.fetchone()
+        return version
+
+    async def init(self, seed):
+        latest = len(self.MIGRATIONS)
+        async with self.write() as db:
+            current = await self._schema_version(db)
+            if current >= latest:
+                return current, current
+            # IMMEDIATE: второй процесс с тем же файлом ждёт, а потом видит новую версию
+            await db.execute('BEGIN IMMEDIATE')
+            current = await self._schema_version(db)
+            for version in range(current + 1, latest + 1):
+                name, step = self.MIGRATIONS[version - 1]
+                started = time.perf_counter()
+                await step(self, db)
+                logger.info('Миграция %d (%s): %.0f мс', version, name,
+                            (time.perf_counter() - started) * 1000)
+            await db.execute('PRAGMA user_version = {:d}'.format(latest))
+            if current == 0:
+                cursor = await db.execute('SELECT EXISTS (SELECT 1 FROM cats)')
+                if not (await cursor.fetchone())[0]:
+                    await db.executemany(
+                        'INSERT INTO cats ({}) VALUES ({})'.format(
+                            ','.join(CAT_FIELDS), ','.join('?' * len(CAT_FIELDS))),
+                        seed,
+                    )
+        return current, latest
+
+    async def get_catalog_version(self):
+        async with self.read() as db:
+            cursor = await db.execute('SELECT version, updated_at FROM catalog_meta WHERE id = 1')
+            version, updated_at = await cursor.fetchone()
+        return version, updated_at
+
+    async def get_catalog_snapshot(self):
+        async with self.read() as db:
+            await db.execute('BEGIN')
+            cursor = await db.execute('SELECT version, updated_at FROM catalog_meta WHERE id = 1')
+            version, updated_at = await cursor.fetchone()
+            cursor = await db.execute('SELECT * FROM cats ORDER BY id')
+            rows = await cursor.fetchall()
+        return version, updated_at, [dict(r) for r in rows]
+
+    async def get_catalog_changes(self, since, limit):
+        async with self.read() as db:
+            await db.execute('BEGIN')
+            cursor = await db.execute('SELECT version, changes_from FROM catalog_meta WHERE id = 1')
+            version, changes_from = await cursor.fetchone()
+            if not changes_from <= since <= version:
+                return version, None, None
+            cursor = await db.execute(
+                'SELECT DISTINCT cat_id FROM catalog_changes WHERE version > ? LIMIT ?',
+                (since, limit + 1),
+            )
+            ids = [row[0] for row in await cursor.fetchall()]
+            if len(ids) > limit:
+                return version, None, None
+            cursor = await db.execute(
+                'SELECT * FROM cats WHERE id IN ({}) ORDER BY id'.format(','.join('?' * len(ids))),
+                ids,
+            )
+            rows = [dict(r) for r in await cursor.fetchall()]
+        return version, rows, sorted(set(ids) - {row['id'] for row in rows})
+
+    async def search_cats(self, terms, any_word, limit):
+        async with self.read() as db:
+            cursor = await db.execute(
+                "SELECT rowid, snippet(cats_fts, -1, '<b>', '</b>', '…', 12), "
+                '       bm25(cats_fts, 10.0, 5.0, 3.0, 1.0) AS rank '
+                'FROM cats_fts WHERE cats_fts MATCH ? ORDER BY rank LIMIT ?',
+                (fts_match_query(terms, any_word), limit),
+            )
+            rows = await cursor.fetchall()
+        return [tuple(r) for r in rows]
+
+    async def add_cat(self, values, photo_key):
+        async with self.write() as db:
+            cursor = await db.execute(
+                'INSERT INTO cats ({},photo_key) VALUES ({},?)'.format(
+                    ','.join(CAT_FIELDS), ','.join('?' * len(CAT_FIELDS))),
+                tuple(values) + (photo_key,),
+            )
+            new_id = cursor.lastrowid
+            version = await self._bump_version(db, [new_id])
+            cursor = await db.execute('SELECT * FROM cats WHERE id = ?', (new_id,))
+            row = dict(await cursor.fetchone())
+        return new_id, version, row
+
+    async def remove_cat(self, cat_id):
+        async with self.write() as db:
+            cursor = await db.execute('DELETE FROM cats WHERE id=?', (cat_id,))
+            return await self._bump_version(db, [cat_id]) if cursor.rowcount else None
+
+    async def set_available(self, cat_id, available):
+        async with self.write() as db:
+            cursor = await db.execute(
+                'UPDATE cats SET available=?, reserved_until=NULL, reserved_order=NULL '
+                'WHERE id=? AND (available<>? OR reserved_until IS NOT NULL)',
+                (1 if available else 0, cat_id, 1 if available else 0),
+            )
+            return await self._bump_version(db, [cat_id]) if cursor.rowcount else None
+
+    async def import_cats(self, rows):
+        async with self.write() as db:
+            cursor = await db.execute('SELECT COALESCE(MAX(id), 0) FROM cats')
+            (last_id,) = await cursor.fetchone()
+            await db.executemany(
+                'INSERT INTO cats ({}) VALUES ({})'.format(
+                    ','.join(CAT_FIELDS), ','.join('?' * len(CAT_FIELDS))),
+                rows,
+            )
+            cursor = await db.execute('SELECT id FROM cats WHERE id > ?', (last_id,))
+            return await self._bump_version(db, [row[0] for row in await cursor.fetchall()])
+
+    async def iter_cats(self, batch):
+        async with self.read() as db:
+            async with db.execute(
+                'SELECT id, {} FROM cats ORDER BY id'.format(','.join(CAT_FIELDS)),
+            ) as cursor:
+                while True:
+                    rows = await cursor.fetchmany(batch)
+                    if not rows:
+                        break
+                    yield rows
+
+    @staticmethod
+    async def _enqueue(db, messages, parse_mode, cards=()):
+        """messages — [(chat_id, text)], cards — [(chat_id, cat_id)]; карточки встают после текстов."""
+        now = time.time()
+        await db.executemany(
+            'INSERT INTO outbox (chat_id, text, parse_mode, next_at, created_at, cat_id) '
+            'VALUES (?,?,?,?,?,?)',
+            [(str(chat_id), text, parse_mode, now, now, None) for chat_id, text in messages]
+            + [(str(chat_id), '', parse_mode, now, now, cat_id) for chat_id, cat_id in cards],
+        )
+
+    async def enqueue_messages(self, messages, parse_mode):
+        async with self.write() as db:
+            await self._enqueue(db, messages, parse_mode)
+
+    async def create_order(self, name, phone, address, comment, items, chats, render,
+                           now, reserved_until):
+        async with self.write() as db:
+            cursor = await db.execute(
+                'INSERT INTO orders (created_at, name, phone, address, comment) VALUES (?,?,?,?,?)',
+                (now, name, phone, address, comment),
+            )
+            order_id = cursor.lastrowid
+            taken, reserved = [], []
+            for cat_id in sorted({item[0] for item in items if item[0] is not None}):
+                cursor = await db.execute(
+                    'UPDATE cats SET reserved_until = ?, reserved_order = ? '
+                    'WHERE id = ? AND available = 1 '
+                    '  AND (reserved_until IS NULL OR reserved_until <= ?)',
+                    (reserved_until, order_id, cat_id, now),
+                )
+                if cursor.rowcount:
+                    reserved.append(cat_id)
+                else:
+                    taken.append(cat_id)
+            if taken:
+                raise CatsUnavailable(taken)
+            version = await self._bump_version(db, reserved) if reserved else None
+            await db.executemany(
+                # Котёнок из каталога — имя, порода и цена берутся из БД; данные
+                # клиента остаются только для позиций, которых в каталоге нет
+                'INSERT INTO order_items (order_id, cat_id, name, breed, price) VALUES '
+                '(?1, (SELECT id FROM cats WHERE id = ?2), '
+                ' COALESCE((SELECT name FROM cats WHERE id = ?2), ?3), '
+                ' COALESCE((SELECT breed FROM cats WHERE id = ?2), ?4), '
+                ' COALESCE((SELECT price FROM cats WHERE id = ?2), ?5))',
+                [(order_id, cat_id, item_name, breed, price)
+                 for cat_id, item_name, breed, price in items],
+            )
+            cursor = await db.execute(
+                'SELECT name, breed, price FROM order_items WHERE order_id = ? ORDER BY id', (order_id,),
+            )
+            stored = [dict(r) for r in await cursor.fetchall()]
+            total = sum(item['price'] for item in stored)
+            await db.execute('UPDATE orders SET total = ? WHERE id = ?', (total, order_id))
+            text = render(order_id, stored, total, reserved_until)
+            await self._enqueue(db, [(chat_id, text) for chat_id in chats], 'HTML',
+                                [(chat_id, cat_id) for chat_id in chats for cat_id in reserved])
+        return order_id, reserved, version
+
+    async def set_order_status(self, order_id, status):
+        async with self.write() as db:
+            cursor = await db.execute('UPDATE orders SET status = ? WHERE id = ?', (status, order_id))
+            if not cursor.rowcount:
+                return None
+            if status == 'done':
+                cursor = await db.execute(
+                    'UPDATE cats SET available = 0, reserved_until = NULL, reserved_order = NULL '
+                    'WHERE id IN (SELECT cat_id FROM order_items WHERE order_id = ?) RETURNING id',
+                    (order_id,),
+                )
+            else:
+                cursor = await db.execute(
+                    'UPDATE cats SET reserved_until = NULL, reserved_order = NULL '
+                    'WHERE reserved_order = ? RETURNING id',
+                    (order_id,),
+                )
+            changed = sorted(row[0] for row in await cursor.fetchall())
+            version = await self._bump_version(db, changed) if changed else None
+        return changed, version
+
+    async def expire_reservations(self, now):
+        async with self.write() as db:
+            cursor = await db.execute(
+                'UPDATE cats SET reserved_until = NULL, reserved_order = NULL '
+                'WHERE reserved_until IS NOT NULL AND reserved_until <= ? RETURNING id',
+                (now,),
+            )
+            expired = sorted(row[0] for row in await cursor.fetchall())
+            version = await self._bump_version(db, expired) if expired else None
+        return expired, version
+
+    async def revenue_by_day(self, since, tz):
+        return await self._fetch(
+            'SELECT day_in_tz(created_at, ?) AS day, '
+            '       COUNT(*) AS orders, SUM(total) AS revenue '
+            'FROM orders WHERE created_at >= ? AND status <> ? '
+            'GROUP BY day ORDER BY day',
+            (tz, since, 'cancelled'),
+        )
+
+    async def get_due_outbox(self, limit):
+        now = time.time()
+        async with self.read() as db:
+            cursor = await db.execute(
+                "SELECT id, chat_id, text, parse_mode, attempts, cat_id FROM outbox "
+                "WHERE status = 'pending' AND next_at <= ? ORDER BY id LIMIT ?",
+                (now, limit),
+            )
+            rows = [dict(r) for r in await cursor.fetchall()]
+            cursor = await db.execute(
+                "SELECT MIN(next_at) FROM outbox WHERE status = 'pending' AND next_at > ?", (now,),
+            )
+            next_at = (await cursor.fetchone())[0]
+        return rows, next_at
+
+    async def set_cat_file_id(self, cat_id, file_id):
+        async with self.write() as db:
+            await db.execute('UPDATE cats SET tg_file_id = ? WHERE id = ?', (file_id, cat_id))
+
+    async def outbox_sent(self, msg_id):
+        async with self.write() as db:
+            await db.execute('DELETE FROM outbox WHERE id = ?', (msg_id,))
+
+    async def outbox_failed(self, msg_id, attempts, error, retry_at):
+        async with self.write() as db:
+            await db.execute(
+                'UPDATE outbox SET attempts = ?, last_error = ?, status = ?, next_at = ? WHERE id = ?',
+                (attempts, error, 'pending' if retry_at else 'failed',
+                 retry_at or time.time(), msg_id),
+            )
+
+    async def add_subscriber(self, chat_id, first_name, now):
+        async with self.write() as db:
+            async with db.execute(
+                'INSERT INTO subscribers (chat_id, first_name, created_at, updated_at) '
+                'VALUES (?, ?, ?, ?) ON CONFLICT (chat_id) DO UPDATE '
+                'SET first_name = excluded.first_name, updated_at = excluded.updated_at '
+                'RETURNING active',
+                (chat_id, first_name, now, now),
+            ) as cursor:
+                (active,) = await cursor.fetchone()
+        return bool(active)
+
+    async def set_subscribed(self, chat_id, active, now):
+        async with self.write() as db:
+            cursor = await db.execute(
+                'UPDATE subscribers SET active = ?, updated_at = ? WHERE chat_id = ?',
+                (1 if active else 0, now, chat_id),
+            )
+            return cursor.rowcount > 0
+
+    async def deactivate_subscribers(self, chat_ids, now):
+        async with self.write() as db:
+            await db.executemany(
+                'UPDATE subscribers SET active = 0, updated_at = ? WHERE chat_id = ?',
+                [(now, chat_id) for chat_id in chat_ids],
+            )
+
+    async def create_broadcast(self, cat_id, chat_id, message_id, now):
+        async with self.write() as db:
+            async with db.execute(
+                'INSERT INTO broadcasts (cat_id, chat_id, message_id, total, created_at) '
+                'SELECT ?, ?, ?, COUNT(*), ? FROM subscribers WHERE active = 1 '
+                'RETURNING id, total',
+                (cat_id, chat_id, message_id, now),
+            ) as cursor:
+                broadcast_id, total = await cursor.fetchone()
+        return broadcast_id, total
+
+    async def claim_broadcast(self, broadcast_id, owner, now, until):
+        async with self.write() as db:
+            cursor = await db.execute(
+                'UPDATE broadcasts SET owner = ?, lease_until = ? '
+                "WHERE id = ? AND status = 'running' "
+                '  AND (owner = ? OR lease_until IS NULL OR lease_until < ?)',
+                (owner, until, broadcast_id, owner, now),
+            )
+            return cursor.rowcount > 0
+
+    async def save_broadcast_progress(self, broadcast_id, after_id, sent, failed, status, now):
+        async with self.write() as db:
+            async with db.execute(
+                'UPDATE broadcasts SET after_id = ?, sent = ?, failed = ?, '
+                "    status = CASE status WHEN 'running' THEN ? ELSE status END, "
+                '    finished_at = COALESCE(finished_at, ?) WHERE id = ? RETURNING status',
+                (after_id, sent, failed, status, None if status == 'running' else now, broadcast_id),
+            ) as cursor:
+                row = await cursor.fetchone()
+        return row[0] if row else None
+
+    async def cancel_broadcast(self, broadcast_id, now):
+        async with self.write() as db:
+            cursor = await db.execute(
+                "UPDATE broadcasts SET status = 'cancelled', finished_at = ? "
+                "WHERE id = ? AND status = 'running'",
+                (now, broadcast_id),
+            )
+            return cursor.rowcount > 0
+
+
+# ──────────────── PostgreSQL ────────────────
+# Вектор для полнотекстового поиска. Основы слов бот строит сам, поэтому
+# словарь 'simple' (только нижний регистр); ё → е, как remove_diacritics в FTS5.
+# Выражение то же, что в индексе idx_cats_search, иначе индекс не используется.
+PG_SEARCH_VECTOR = (
+    "setweight(to_tsvector('simple', translate(name, 'Ёё', 'Ее')), 'A') || "
+    "setweight(to_tsvector('simple', translate(breed, 'Ёё', 'Ее')), 'B') || "
+    "setweight(to_tsvector('simple', translate(color, 'Ёё', 'Ее')), 'C') || "
+    "setweight(to_tsvector('simple', translate(description, 'Ёё', 'Ее')), 'D')"
+)
+
+PG_SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS cats (
+        id             INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        name           TEXT    NOT NULL,
+        breed          TEXT    NOT NULL DEFAULT 'Донской сфинкс',
+        age_months     INTEGER NOT NULL DEFAULT 3,
+        gender         TEXT    NOT NULL DEFAULT 'male',
+        price          INTEGER NOT NULL,
+        color          TEXT    NOT NULL DEFAULT '',
+        description    TEXT    NOT NULL DEFAULT '',
+        image          TEXT    NOT NULL DEFAULT '',
+        available      INTEGER NOT NULL DEFAULT 1,
+        photo_key      TEXT    NOT NULL DEFAULT '',
+        reserved_until BIGINT,
+        reserved_order INTEGER
+    );
+    CREATE INDEX IF NOT EXISTS idx_cats_reserved ON cats (reserved_until)
+        WHERE reserved_until IS NOT NULL;
+    CREATE INDEX IF NOT EXISTS idx_cats_price     ON cats (price, id);
+    CREATE INDEX IF NOT EXISTS idx_cats_age       ON cats (age_months, id);
+    CREATE INDEX IF NOT EXISTS idx_cats_breed     ON cats (breed, id);
+    CREATE INDEX IF NOT EXISTS idx_cats_gender    ON cats (gender, id);
+    CREATE INDEX IF NOT EXISTS idx_cats_gender_price ON cats (gender, price, id);
+    CREATE INDEX IF NOT EXISTS idx_cats_available ON cats (available, id);
+    CREATE INDEX IF NOT EXISTS idx_cats_search ON cats USING GIN ((''' + PG_SEARCH_VECTOR + '''));
+    ALTER TABLE cats ADD COLUMN IF NOT EXISTS tg_file_id TEXT;
+
+    CREATE TABLE IF NOT EXISTS outbox (
+        id          BIGINT  GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        chat_id     TEXT    NOT NULL,
+        text        TEXT    NOT NULL,
+        parse_mode  TEXT,
+        status      TEXT    NOT NULL DEFAULT 'pending',
+        attempts    INTEGER NOT NULL DEFAULT 0,
+        next_at     DOUBLE PRECISION NOT NULL,
+        created_at  DOUBLE PRECISION NOT NULL,
+        last_error  TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox (status, next_at);
+    ALTER TABLE outbox ADD COLUMN IF NOT EXISTS cat_id INTEGER;
+
+    CREATE TABLE IF NOT EXISTS orders (
+        id          INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        created_at  BIGINT  NOT NULL,
+        status      TEXT    NOT NULL DEFAULT 'new',
+        name        TEXT    NOT NULL DEFAULT '',
+        phone       TEXT    NOT NULL DEFAULT '',
+        address     TEXT    NOT NULL DEFAULT '',
+        comment     TEXT    NOT NULL DEFAULT '',
+        total       INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS idx_orders_created ON orders (created_at);
+    CREATE INDEX IF NOT EXISTS idx_orders_status  ON orders (status, created_at);
+    CREATE TABLE IF NOT EXISTS order_items (
+        id          INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        order_id    INTEGER NOT NULL REFERENCES orders (id) ON DELETE CASCADE,
+        cat_id      INTEGER REFERENCES cats (id) ON DELETE SET NULL,
+        name        TEXT    NOT NULL,
+        breed       TEXT    NOT NULL DEFAULT '',
+        price       INTEGER NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_order_items_order ON order_items (order_id);
+    CREATE INDEX IF NOT EXISTS idx_order_items_cat   ON order_items (cat_id);
+
+    CREATE TABLE IF NOT EXISTS catalog_meta (
+        id          INTEGER PRIMARY KEY CHECK (id = 1),
+        version     INTEGER NOT NULL,
+        updated_at  BIGINT  NOT NULL
+    );
+    ALTER TABLE catalog_meta ADD COLUMN IF NOT EXISTS changes_from INTEGER;
+    CREATE TABLE IF NOT EXISTS catalog_changes (
+        version     INTEGER NOT NULL,
+        cat_id      INTEGER NOT NULL,
+        PRIMARY KEY (version, cat_id)
+    );
+    INSERT INTO catalog_meta (id, version, updated_at)
+        VALUES (1, 1, EXTRACT(EPOCH FROM now())::BIGINT)
+        ON CONFLICT (id) DO NOTHING;
+    UPDATE catalog_meta SET changes_from = version WHERE changes_from IS NULL;
+'''
+
+PG_SUBSCRIBERS = '''
+    CREATE TABLE IF NOT EXISTS subscribers (
+        id          INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        chat_id     BIGINT  NOT NULL UNIQUE,
+        first_name  TEXT    NOT NULL DEFAULT '',
+        active      INTEGER NOT NULL DEFAULT 1,
+        created_at  BIGINT  NOT NULL,
+        updated_at  BIGINT  NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS broadcasts (
+        id          INTEGER GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY,
+        cat_id      INTEGER NOT NULL,
+        status      TEXT    NOT NULL DEFAULT 'running',
+        chat_id     BIGINT  NOT NULL,
+        message_id  BIGINT,
+        total       INTEGER NOT NULL DEFAULT 0,
+        sent        INTEGER NOT NULL DEFAULT 0,
+        failed      INTEGER NOT NULL DEFAULT 0,
+        after_id    INTEGER NOT NULL DEFAULT 0,
+        owner       TEXT,
+        lease_until DOUBLE PRECISION,
+        created_at  BIGINT  NOT NULL,
+        finished_at BIGINT
+    );
+    CREATE INDEX IF NOT EXISTS idx_broadcasts_status ON broadcasts (status);
+'''
+
+# Миграции по порядку: номер шага = позиция + 1, номер последнего применённого —
+# в schema_version. Первый шаг — схема до появления миграций, он идемпотентен.
+# Новые шаги только дописываются в конец
+PG_MIGRATIONS = (
+    ('каталог, поиск, outbox, заказы, журнал изменений каталога', PG_SCHEMA),
+    ('подписчики на новости питомника и рассылки о новых котятах', PG_SUBSCRIBERS),
+)
+
+
+class PostgresStorage(Storage):
+    """PostgreSQL через пул соединений asyncpg.
+
+    БД общая для всех реплик и переживает редеплой. asyncpg готовит каждый
+    запрос (PREPARE) один раз на соединение и дальше берёт его из кэша, так
+    что SQL пишется обычными строками с $1, $2, …
+    """
+
+    shared = True
+    INIT_LOCK = 0x636174       # pg_advisory_xact_lock: реплики мигрируют схему по очереди
+    OUTBOX_LEASE = 300         # столько секунд взятое сообщение outbox не видно другим репликам
+
+    def __init__(self, dsn, pool_size=10):
+        if asyncpg is None:
+            raise RuntimeError('Для DB_BACKEND=postgres нужен пакет asyncpg')
+        self.dsn = dsn
+        parts = urlsplit(dsn)
+        self.label = 'postgres://{}{}'.format(parts.hostname or '', parts.path)
+        self.pool_size = max(1, pool_size)
+        self._pool = None
+
+    def placeholder(self, n):
+        return '${}'.format(n)
+
+    async def open(self):
+        self._pool = await asyncpg.create_pool(
+            self.dsn, min_size=1, max_size=self.pool_size,
+            statement_cache_size=256, command_timeout=30,
+        )
+        logger.info('БД открыта: %s (пул до %d соединений)', self.label, self.pool_size)
+
+    async def close(self):
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+    @contextlib.asynccontextmanager
+    async def transaction(self, **kwargs):
+        """Соединение из пула с транзакцией на время блока."""
+        async with self._pool.acquire() as conn:
+            async with conn.transaction(**kwargs):
+                yield conn
+
+    async def _fetch(self, sql, params=()):
+        return [dict(r) for r in await self._pool.fetch(sql, *params)]
+
+    @staticmethod
+    async def _bump_version(conn, cat_ids):
+        version = await conn.fetchval(
+            'UPDATE catalog_meta SET version = version + 1, updated_at = $1 WHERE id = 1 RETURNING version',
+            int(time.time()),
+        )
+        await conn.execute(
+            'INSERT INTO catalog_changes (version, cat_id) SELECT $1, unnest($2::int[]) '
+            'ON CONFLICT DO NOTHING',
+            version, list(cat_ids),
+        )
+        if version % CHANGES_PRUNE_EVERY == 0:
+            await conn.execute('DELETE FROM catalog_changes WHERE version <= $1',
+                               version - CHANGES_KEEP)
+            await conn.execute(
+                'UPDATE catalog_meta SET changes_from = GREATEST(changes_from, $1) WHERE id = 1',
+                version - CHANGES_KEEP,
+            )
+        return version
+
+    @staticmethod
+    async def _schema_version(conn):
+        if await conn.fetchval("SELECT to_regclass('schema_version')") is None:
+            return 0
+        return await conn.fetchval('SELECT version FROM schema_version WHERE id = 1') or 0
+
+    async def init(self, seed):
+        latest = len(PG_MIGRATIONS)
+        async with self._pool.acquire() as conn:
+            current = await self._schema_version(conn)
+        if current >= latest:
+            return current, current
+        async with self.transaction() as conn:
+            await conn.execute('SELECT pg_advisory_xact_lock($1)', self.INIT_LOCK)
+            current = await self._schema_version(conn)
+            for version in range(current + 1, latest + 1):
+                name, sql = PG_MIGRATIONS[version - 1]
+                started = time.perf_counter()
+                await conn.execute(sql)
+                logger.info('Миграция %d (%s): %.0f мс', version, name,
+                            (time.perf_counter() - started) * 1000)
+            await conn.execute('''
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    id      INTEGER PRIMARY KEY CHECK (id = 1),
+                    version INTEGER NOT NULL
+                )
+            ''')
+            await conn.execute(
+                'INSERT INTO schema_version (id, version) VALUES (1, $1) '
+                'ON CONFLICT (id) DO UPDATE SET version = excluded.version',
+                latest,
+            )
+            if current == 0 and not await conn.fetchval('SELECT EXISTS (SELECT 1 FROM cats)'):
+                await conn.copy_records_to_table('cats', records=seed, columns=CAT_FIELDS)
+        return current, latest
+
+    async def data_version(self):
+        """Версия каталога и последний id outbox — меняются при записи с любой реплики."""
+        row = await self._pool.fetchrow(
+            'SELECT version, pg_sequence_last_value('
+            "    pg_get_serial_sequence('outbox', 'id')::regclass) "
+            'FROM catalog_meta WHERE id = 1'
+        )
+        return tuple(row)
+
+    async def get_catalog_version(self):
+        row = await self._pool.fetchrow('SELECT version, updated_at FROM catalog_meta WHERE id = 1')
+        return row['version'], row['updated_at']
+
+    async def get_catalog_snapshot(self):
+        async with self.transaction(isolation='repeatable_read', readonly=True) as conn:
+            version, updated_at = await conn.fetchrow(
+                'SELECT version, updated_at FROM catalog_meta WHERE id = 1')
+            rows = await conn.fetch('SELECT * FROM cats ORDER BY id')
+        return version, updated_at, [dict(r) for r in rows]
+
+    async def get_catalog_changes(self, since, limit):
+        async with self.transaction(isolation='repeatable_read', readonly=True) as conn:
+            version, changes_from = await conn.fetchrow(
+                'SELECT version, changes_from FROM catalog_meta WHERE id = 1')
+            if not changes_from <= since <= version:
+                return version, None, None
+            ids = [row['cat_id'] for row in await conn.fetch(
+                'SELECT DISTINCT cat_id FROM catalog_changes WHERE version > $1 LIMIT $2',
+                since, limit + 1,
+            )]
+            if len(ids) > limit:
+                return version, None, None
+            rows = await conn.fetch('SELECT * FROM cats WHERE id = ANY($1::int[]) ORDER BY id', ids)
+        return version, [dict(r) for r in rows], sorted(set(ids) - {row['id'] for row in rows})
+
+    async def search_cats(self, terms, any_word, limit):
+        query = (' | ' if any_word else ' & ').join("'{}':*".format(t) for t in terms)
+        rows = await self._pool.fetch(
+            'SELECT id, ts_headline(\'simple\', concat_ws(\' \', name, breed, color, description), q, '
+            "           'StartSel=<b>, StopSel=</b>, MaxWords=12, MinWords=4, MaxFragments=1'), "
+            # ts_rank: чем больше, тем лучше. Знак меняем, чтобы rank вёл себя как bm25 в SQLite
+            "       -ts_rank('{{0.1, 0.3, 0.5, 1.0}}', {0}, q) AS rank "
+            "FROM cats, to_tsquery('simple', translate($1, 'Ёё', 'Ее')) AS q "
+            'WHERE {0} @@ q ORDER BY rank LIMIT $2'.format(PG_SEARCH_VECTOR),
+            query, limit,
+        )
+        return [tuple(r) for r in rows]
+
+    async def add_cat(self, values, photo_key):
+        async with self.transaction() as conn:
+            row = await conn.fetchrow(
+                'INSERT INTO cats ({},photo_key) VALUES ({}) RETURNING *'.format(
+                    ','.join(CAT_FIELDS),
+                    ','.join(self.placeholder(n) for n in range(1, len(CAT_FIELDS) + 2))),
+                *values, photo_key,
+            )
+            version = await self._bump_version(conn, [row['id']])
+        return row['id'], version, dict(row)
+
+    async def remove_cat(self, cat_id):
+        async with self.transaction() as conn:
+            deleted = await conn.fetchval('DELETE FROM cats WHERE id = $1 RETURNING id', cat_id)
+            return await self._bump_version(conn, [cat_id]) if deleted is not None else None
+
+    async def set_available(self, cat_id, available):
+        async with self.transaction() as conn:
+            changed = await conn.fetchval(
+                'UPDATE cats SET available = $1, reserved_until = NULL, reserved_order = NULL '
+                'WHERE id = $2 AND (available <> $1 OR reserved_until IS NOT NULL) RETURNING id',
+                1 if available else 0, cat_id,
+            )
+            return await self._bump_version(conn, [cat_id]) if changed is not None else None
+
+    async def import_cats(self, rows):
+        # COPY вместо INSERT: тысячи строк одним потоком, без разбора запроса на каждую
+        async with self.transaction() as conn:
+            last_id = await conn.fetchval('SELECT COALESCE(MAX(id), 0) FROM cats')
+            await conn.copy_records_to_table('cats', records=rows, columns=CAT_FIELDS)
+            rows = await conn.fetch('SELECT id FROM cats WHERE id > $1', last_id)
+            return await self._bump_version(conn, [row['id'] for row in rows])
+
+    async def iter_cats(self, batch):
+        async with self.transaction(readonly=True) as conn:
+            cursor = await conn.cursor(
+                'SELECT id, {} FROM cats ORDER BY id'.format(','.join(CAT_FIELDS)))
+            while True:
+                rows = await cursor.fetch(batch)
+                if not rows:
+                    break
+                yield [tuple(r) for r in rows]
+
+    @staticmethod
+    async def _enqueue(conn, messages, parse_mode, cards=()):
+        now = time.time()
+        await conn.executemany(
+            'INSERT INTO outbox (chat_id, text, parse_mode, next_at, created_at, cat_id) '
+            'VALUES ($1, $2, $3, $4, $4, $5)',
+            [(str(chat_id), text, parse_mode, now, None) for chat_id, text in messages]
+            + [(str(chat_id), '', parse_mode, now, cat_id) for chat_id, cat_id in cards],
+        )
+
+    async def enqueue_messages(self, messages, parse_mode):
+        async with self.transaction() as conn:
+            await self._enqueue(conn, messages, parse_mode)
+
+    async def create_order(self, name, phone, address, comment, items, chats, render,
+                           now, reserved_until):
+        async with self.transaction() as conn:
+            order_id = await conn.fetchval(
+                'INSERT INTO orders (created_at, name, phone, address, comment) '
+                'VALUES ($1, $2, $3, $4, $5) RETURNING id',
+                now, name, phone, address, comment,
+            )
+            wanted = sorted({item[0] for item in items if item[0] is not None})
+            # Одним UPDATE: строки блокируются, и второй покупатель после нашего
+            # commit увидит reserved_until уже заполненным
+            reserved = sorted(row['id'] for row in await conn.fetch(
+                'UPDATE cats SET reserved_until = $1, reserved_order = $2 '
+                'WHERE id = ANY($3::int[]) AND available = 1 '
+                '  AND (reserved_until IS NULL OR reserved_until <= $4) RETURNING id',
+                reserved_until, order_id, wanted, now,
+            ))
+            taken = sorted(set(wanted) - set(reserved))
+            if taken:
+                raise CatsUnavailable(taken)
+            version = await self._bump_version(conn, reserved) if reserved else None
+            await conn.executemany(
+                'INSERT INTO order_items (order_id, cat_id, name, breed, price) VALUES '
+                '($1, (SELECT id FROM cats WHERE id = $2), '
+                ' COALESCE((SELECT name FROM cats WHERE id = $2), $3), '
+                ' COALESCE((SELECT breed FROM cats WHERE id = $2), $4), '
+                ' COALESCE((SELECT price FROM cats WHERE id = $2), $5))',
+                [(order_id, cat_id, item_name, breed, price)
+                 for cat_id, item_name, breed, price in items],
+            )
+            stored = [dict(r) for r in await conn.fetch(
+                'SELECT name, breed, price FROM order_items WHERE order_id = $1 ORDER BY id', order_id,
+            )]
+            total = sum(item['price'] for item in stored)
+            await conn.execute('UPDATE orders SET total = $1 WHERE id = $2', total, order_id)
+            text = render(order_id, stored, total, reserved_until)
+            await self._enqueue(conn, [(chat_id, text) for chat_id in chats], 'HTML',
+                                [(chat_id, cat_id) for chat_id in chats for cat_id in reserved])
+        return order_id, reserved, version
+
+    async def set_order_status(self, order_id, status):
+        async with self.transaction() as conn:
+            found = await conn.fetchval(
+                'UPDATE orders SET status = $1 WHERE id = $2 RETURNING id', status, order_id)
+            if found is None:
+                return None
+            if status == 'done':
+                rows = await conn.fetch(
+                    'UPDATE cats SET available = 0, reserved_until = NULL, reserved_order = NULL '
+                    'WHERE id IN (SELECT cat_id FROM order_items WHERE order_id = $1) RETURNING id',
+                    order_id,
+                )
+            else:
+                rows = await conn.fetch(
+                    'UPDATE cats SET reserved_until = NULL, reserved_order = NULL '
+                    'WHERE reserved_order = $1 RETURNING id',
+                    order_id,
+                )
+            changed = sorted(row['id'] for row in rows)
+            version = await self._bump_version(conn, changed) if changed else None
+        return changed, version
+
+    async def expire_reservations(self, now):
+        async with self.transaction() as conn:
+            rows = await conn.fetch(
+                'UPDATE cats SET reserved_until = NULL, reserved_order = NULL '
+                'WHERE reserved_until IS NOT NULL AND reserved_until <= $1 RETURNING id',
+                now,
+            )
+            expired = sorted(row['id'] for row in rows)
+            version = await self._bump_version(conn, expired) if expired else None
+        return expired, version
+
+    async def revenue_by_day(self, since, tz):
+        # AT TIME ZONE с именем пояса — день не зависит от часового пояса сессии
+        return await self._fetch(
+            "SELECT to_char(to_timestamp(created_at) AT TIME ZONE $1, 'YYYY-MM-DD') AS day, "
+            '       COUNT(*) AS orders, SUM(total) AS revenue '
+            'FROM orders WHERE created_at >= $2 AND status <> $3 '
+            'GROUP BY day ORDER BY day',
+            (tz, since, 'cancelled'),
+        )
+
+    async def get_due_outbox(self, limit):
+        """Берёт сообщения в работу: другие реплики не получат их OUTBOX_LEASE секунд."""
+        now = time.time()
+        async with self.transaction() as conn:
+            rows = await conn.fetch(
+                'UPDATE outbox SET next_at = $2 WHERE id IN ('
+                "    SELECT id FROM outbox WHERE status = 'pending' AND next_at <= $1 "
+                '    ORDER BY id LIMIT $3 FOR UPDATE SKIP LOCKED'
+                ') RETURNING id, chat_id, text, parse_mode, attempts, cat_id',
+                now, now + self.OUTBOX_LEASE, limit,
+            )
+            next_at = await conn.fetchval(
+                "SELECT MIN(next_at) FROM outbox WHERE status = 'pending' AND next_at > $1", now,
+            )
+        return sorted((dict(r) for r in rows), key=lambda r: r['id']), next_at
+
+    async def set_cat_file_id(self, cat_id, file_id):
+        await self._pool.execute('UPDATE cats SET tg_file_id = $1 WHERE id = $2', file_id, cat_id)
+
+    async def outbox_sent(self, msg_id):
+        await self._pool.execute('DELETE FROM outbox WHERE id = $1', msg_id)
+
+    async def outbox_failed(self, msg_id, attempts, error, retry_at):
+        await self._pool.execute(
+            'UPDATE outbox SET attempts = $1, last_error = $2, status = $3, next_at = $4 WHERE id = $5',
+            attempts, error, 'pending' if retry_at else 'failed', retry_at or time.time(), msg_id,
+        )
+
+    async def add_subscriber(self, chat_id, first_name, now):
+        active = await self._pool.fetchval(
+            'INSERT INTO subscribers (chat_id, first_name, created_at, updated_at) '
+            'VALUES ($1, $2, $3, $3) ON CONFLICT (chat_id) DO UPDATE '
+            'SET first_name = excluded.first_name, updated_at = excluded.updated_at '
+            'RETURNING active',
+            chat_id, first_name, now,
+        )
+        return bool(active)
+
+    async def set_subscribed(self, chat_id, active, now):
+        found = await self._pool.fetchval(
+            'UPDATE subscribers SET active = $1, updated_at = $2 WHERE chat_id = $3 RETURNING id',
+            1 if active else 0, now, chat_id,
+        )
+        return found is not None
+
+    async def deactivate_subscribers(self, chat_ids, now):
+        await self._pool.execute(
+            'UPDATE subscribers SET active = 0, updated_at = $1 WHERE chat_id = ANY($2::bigint[])',
+            now, list(chat_ids),
+        )
+
+    async def create_broadcast(self, cat_id, chat_id, message_id, now):
+        row = await self._pool.fetchrow(
+            'INSERT INTO broadcasts (cat_id, chat_id, message_id, total, created_at) '
+            'SELECT $1, $2, $3, COUNT(*), $4 FROM subscribers WHERE active = 1 '
+            'RETURNING id, total',
+            cat_id, chat_id, message_id, now,
+        )
+        return row['id'], row['total']
+
+    async def claim_broadcast(self, broadcast_id, owner, now, until):
+        found = await self._pool.fetchval(
+            'UPDATE broadcasts SET owner = $1, lease_until = $2 '
+            "WHERE id = $3 AND status = 'running' "
+            '  AND (owner = $1 OR lease_until IS NULL OR lease_until < $4) RETURNING id',
+            owner, until, broadcast_id, now,
+        )
+        return found is not None
+
+    async def save_broadcast_progress(self, broadcast_id, after_id, sent, failed, status, now):
+        return await self._pool.fetchval(
+            'UPDATE broadcasts SET after_id = $1, sent = $2, failed = $3, '
+            "    status = CASE status WHEN 'running' THEN $4 ELSE status END, "
+            '    finished_at = COALESCE(finished_at, $5) WHERE id = $6 RETURNING status',
+            after_id, sent, failed, status, None if status == 'running' else now, broadcast_id,
+        )
+
+    async def cancel_broadcast(self, broadcast_id, now):
+        found = await self._pool.fetchval(
+            "UPDATE broadcasts SET status = 'cancelled', finished_at = $1 "
+            "WHERE id = $2 AND status = 'running' RETURNING id",
+            now, broadcast_id,
+        )
+        return found is not None
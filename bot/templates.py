@@ -0,0 +1,257 @@
+"""
+Тексты уведомлений и ответов бота в HTML-разметке Telegram.
+
+Шаблоны разбираются один раз при импорте, а подставляемые значения
+экранируются: имя вроде «<Мурка>» из формы заказа не ломает parse_mode='HTML',
+и сообщение не уходит в outbox на повтор с ошибкой BadRequest.
+"""
+
+import html
+import string
+import functools
+from datetime import datetime
+
+RULE = '━' * 22
+
+_formatter = string.Formatter()
+
+
+class Markup(str):
+    """Уже готовый HTML — Template подставляет его без экранирования."""
+
+
+def escape(value):
+    if isinstance(value, Markup):
+        return value
+    return html.escape(str(value), quote=False)
+
+
+class Template:
+    """Шаблон с полями {name}; разбирается при создании, а не при каждом render()."""
+
+    __slots__ = ('parts',)
+
+    def __init__(self, source):
+        self.parts = []     # [(текст, имя поля или None)]
+        for literal, field, spec, conversion in _formatter.parse(source):
+            if spec or conversion:
+                raise ValueError('Template: форматирование полей не поддерживается: {!r}'.format(field))
+            self.parts.append((literal, field))
+
+    def render(self, **values):
+        out = []
+        for literal, field in self.parts:
+            out.append(literal)
+            if field is not None:
+                out.append(escape(values[field]))
+        return Markup(''.join(out))
+
+
+@functools.lru_cache(maxsize=4096)
+def price(value):
+    """35000 → '35 000'. Цен в каталоге немного, поэтому результат кэшируется."""
+    return '{:,}'.format(value).replace(',', ' ')
+
+
+# Время в сообщениях — в часовом поясе tz (REPORT_TZ бота), как и дни в /report
+def _now(tz):
+    return datetime.now(tz).strftime('%d.%m.%Y %H:%M')
+
+
+def _time(ts, tz):
+    return datetime.fromtimestamp(ts, tz).strftime('%d.%m %H:%M')
+
+
+def _field(data, name):
+    value = data.get(name)
+    return '—' if value in (None, '') else value
+
+
+# ──────────────── Заказ из Mini App ────────────────
+ORDER_HEAD = Template(
+    '🛍️ <b>НОВЫЙ ЗАКАЗ #{order_id}!</b>\n' + RULE + '\n'
+    '👤 <b>Имя:</b> {name}\n'
+    '📞 <b>Телефон:</b> {phone}'
+)
+ORDER_ADDRESS = Template('📍 <b>Адрес:</b> {address}')
+ORDER_COMMENT = Template('💬 <b>Комментарий:</b> {comment}')
+ORDER_ITEMS = Template('\n🐱 <b>Котята ({count}):</b>')
+ORDER_ITEM = Template('  • {name} ({breed}) — {price} ₽')
+ORDER_FOOT = Template(
+    '\n💰 <b>Итого: {total} ₽</b>\n'
+    '⏳ Бронь до {reserved_until}\n' + RULE + '\n'
+    '🕐 {now}'
+)
+
+
+def order_message(order_id, data, items, total, reserved_until, tz):
+    """Текст уведомления о заказе для админов."""
+    lines = [ORDER_HEAD.render(order_id=order_id, name=_field(data, 'name'),
+                               phone=_field(data, 'phone'))]
+    if data.get('address'):
+        lines.append(ORDER_ADDRESS.render(address=data['address']))
+    if data.get('comment'):
+        lines.append(ORDER_COMMENT.render(comment=data['comment']))
+    lines.append(ORDER_ITEMS.render(count=len(items)))
+    for item in items:
+        lines.append(ORDER_ITEM.render(name=item['name'], breed=item['breed'],
+                                       price=price(item['price'])))
+    lines.append(ORDER_FOOT.render(
+        total=price(total),
+        reserved_until=_time(reserved_until, tz),
+        now=_now(tz),
+    ))
+    return '\n'.join(lines)
+
+
+# ──────────────── Обратная связь ────────────────
+FEEDBACK_HEAD = Template('💬 <b>ОБРАТНАЯ СВЯЗЬ</b>\n' + RULE + '\n👤 <b>Имя:</b> {name}')
+FEEDBACK_CONTACT = Template('📞 <b>Контакт:</b> {contact}')
+FEEDBACK_BODY = Template(
+    '📋 <b>Тема:</b> {subject}\n\n'
+    '✉️ <b>Сообщение:</b>\n'
+    '{message}\n' + RULE + '\n'
+    '🕐 {now}'
+)
+
+
+def feedback_message(data, tz):
+    """Текст обращения из формы обратной связи."""
+    lines = [FEEDBACK_HEAD.render(name=_field(data, 'name'))]
+    if data.get('contact'):
+        lines.append(FEEDBACK_CONTACT.render(contact=data['contact']))
+    lines.append(FEEDBACK_BODY.render(subject=_field(data, 'subject'),
+                                      message=_field(data, 'message'), now=_now(tz)))
+    return '\n'.join(lines)
+
+
+# ──────────────── Карточка котёнка: /cat, фото к заказу, рассылка ────────────────
+CAPTION_MAX = 1024       # лимит подписи к фото в Telegram
+CAT_CARD = Template(
+    '🐱 <b>{name}</b> #{id}\n'
+    '{breed}, {age} мес., {gender}\n'
+    '🎨 {color}\n'
+    '💰 <b>{price} ₽</b> — {status}\n\n'
+    '{description}'
+)
+
+
+def cat_card(cat, heading='', footer=''):
+    """Подпись к фото котёнка; описание обрезается, чтобы влезть в CAPTION_MAX.
+
+    heading и footer — готовый HTML над и под карточкой (анонс рассылки).
+    """
+    if not cat['available']:
+        status = 'продан'
+    elif cat['reserved_until']:
+        status = 'забронирован'
+    else:
+        status = 'в продаже'
+    values = dict(
+        id=cat['id'], name=cat['name'], breed=cat['breed'], age=cat['age_months'],
+        gender='кот' if cat['gender'] == 'male' else 'кошка', color=cat['color'] or '—',
+        price=price(cat['price']), status=status, description=cat['description'],
+    )
+    render = lambda: heading + CAT_CARD.render(**values) + footer
+    text = render()
+    description = cat['description']
+    # Экранирование удлиняет текст, поэтому режем, пока не влезет
+    while len(text) > CAPTION_MAX and description:
+        description = description[:len(description) - (len(text) - CAPTION_MAX) - 1]
+        values['description'] = description.rstrip() + '…'
+        text = render()
+    return text
+
+
+# ──────────────── Рассылка о новом котёнке ────────────────
+ANNOUNCE_HEAD = Markup('🎉 <b>Новый котёнок в питомнике!</b>\n\n')
+ANNOUNCE_FOOT = Markup('\n\n<i>/stop — отписаться от новостей</i>')
+BROADCAST_STATUS = {
+    'running': '📣 Рассылка идёт…',
+    'done': '✅ Рассылка завершена',
+    'cancelled': '⛔ Рассылка остановлена',
+}
+BROADCAST_PROGRESS = Template(
+    '{status}\n' + RULE + '\n'
+    '🐱 Котёнок #{cat_id}\n'
+    '👥 Подписчиков: {total}\n'
+    '📨 Доставлено: {sent}\n'
+    '🚫 Не доставлено: {failed}'
+)
+
+
+def broadcast_progress(b):
+    """Отчёт о ходе рассылки; админу он обновляется в одном и том же сообщении."""
+    return BROADCAST_PROGRESS.render(
+        status=BROADCAST_STATUS[b['status']], cat_id=b['cat_id'], total=b['total'],
+        sent=b['sent'], failed=b['failed'],
+    )
+
+
+# ──────────────── Админ: /listcats, /orders, /report ────────────────
+CAT_LINE = Template('{status} <b>#{id}</b> {name} — {price} ₽ | {age} мес. | {gender}')
+CAT_PAGE_HEAD = Template('📋 <b>Каталог котят</b> (#{first} — #{last}):\n')
+CAT_PAGE_FOOT = (
+    '\n<i>⏳ — забронирован заказом. Кнопки ниже отмечают котёнка проданным '
+    'или возвращают в продажу.</i>\n'
+    '<i>/removecat &lt;id&gt; — удалить</i>'
+)
+
+
+def cat_page(cats):
+    """Одна страница каталога для /listcats (котята по порядку id)."""
+    lines = [CAT_PAGE_HEAD.render(first=cats[0]['id'], last=cats[-1]['id'])]
+    for c in cats:
+        lines.append(CAT_LINE.render(
+            status=('⏳' if c['reserved_until'] else '✅') if c['available'] else '❌',
+            id=c['id'], name=c['name'], price=price(c['price']), age=c['age_months'],
+            gender='♂' if c['gender'] == 'male' else '♀',
+        ))
+    lines.append(CAT_PAGE_FOOT)
+    return '\n'.join(lines)
+
+
+ORDER_LINE = Template('<b>#{id}</b> {created} — {name}, {phone} — {total} ₽ ({items} шт.)')
+
+
+def pending_orders(orders, tz):
+    """Список необработанных заказов для /orders."""
+    lines = ['📦 <b>Необработанные заказы:</b>\n']
+    for o in orders:
+        lines.append(ORDER_LINE.render(
+            id=o['id'], created=_time(o['created_at'], tz),
+            name=o['name'] or '—', phone=o['phone'] or '—', total=price(o['total']),
+            items=o['items'],
+        ))
+    lines.append('\n<i>/orderdone &lt;id&gt; — выполнен | /ordercancel &lt;id&gt; — отменён</i>')
+    return '\n'.join(lines)
+
+
+REPORT_DAY = Template('{day} — {orders} зак. — {revenue} ₽')
+REPORT_TOTAL = Template('<b>Итого: {revenue} ₽, заказов: {orders}</b>')
+REPORT_CAT = Template('{id}{name} — {ordered} / {done} ({share})')
+
+
+def report(days, by_day, per_cat):
+    """Отчёт /report: выручка по дням и спрос по котятам."""
+    lines = ['📊 <b>Отчёт за {} дн.</b>\n'.format(days), '<b>Выручка по дням:</b>']
+    for row in by_day:
+        lines.append(REPORT_DAY.render(
+            day=datetime.strptime(row['day'], '%Y-%m-%d').strftime('%d.%m'),
+            orders=row['orders'], revenue=price(row['revenue']),
+        ))
+    if not by_day:
+        lines.append('<i>заказов не было</i>')
+    lines.append(REPORT_TOTAL.render(
+        revenue=price(sum(row['revenue'] for row in by_day)),
+        orders=sum(row['orders'] for row in by_day),
+    ))
+    if per_cat:
+        lines.append('\n<b>Спрос по котятам</b> (заказан / продан):')
+        for row in per_cat:
+            lines.append(REPORT_CAT.render(
+                id='#{} '.format(row['cat_id']) if row['cat_id'] else '',
+                name=row['name'], ordered=row['ordered'], done=row['done'],
+                share='{:.0%}'.format(row['done'] / row['ordered']),
+            ))
+    return '\n'.join(lines)
@@ -9,17 +9,46 @@ const BOT_API_URL = 'https://cats-shop-production.up.railway.app';
 const API_SECRET  = 'cats-shop-secret2026';  // ← Должен совпадать с API_SECRET в Railway
 
 // ============================================================
-//  CATALOG DATA — загружается из API бота
+//  CATALOG DATA — загружается из API бота постранично
 // ============================================================
-let CATS = [];
+const PAGE_SIZE = 24;
 
-async function loadCats() {
+let CATS = [];               // текущая выдача (с учётом фильтров и сортировки)
+const catIndex = new Map();  // все когда-либо загруженные коты: id → cat
+
+function rememberCats(list) {
+  list.forEach(cat => catIndex.set(cat.id, cat));
+}
+
+function findCat(id) {
+  return catIndex.get(id);
+}
+
+function catsQuery(extra) {
+  const params = new URLSearchParams({ limit: PAGE_SIZE, sort: state.sort });
+  if (state.category !== 'all') params.set('gender', state.category);
+  Object.entries(extra || {}).forEach(([k, v]) => params.set(k, v));
+  return BOT_API_URL + '/cats?' + params;
+}
+
+/**
+ * Загружает первую страницу (append=false) или следующую (append=true).
+ * fresh=true — мимо кэша service worker'а, прямо с сервера.
+ */
+async function loadCats(append = false, fresh = false) {
   if (!BOT_API_URL) return;
   const grid = document.getElementById('catalog-grid');
+  const extra = append && state.nextCursor ? { cursor: state.nextCursor } : {};
+  state.loading = true;
   try {
-    const resp = await fetch(BOT_API_URL + '/cats');
+    const resp = await fetch(catsQuery(extra), fresh ? { cache: 'no-cache' } : {});
     if (!resp.ok) throw new Error('HTTP ' + resp.status);
-    CATS = await resp.json();
+    const page = await resp.json();
+    rememberCats(page.items);
+    CATS = append ? CATS.concat(page.items) : page.items;
+    state.nextCursor = page.next_cursor;
+    // Страница могла прийти из кэша: с её версии syncCatalog() догонит каталог
+    if (!append || page.version < state.catalogVersion) state.catalogVersion = page.version;
   } catch (err) {
     console.error('[loadCats]', err);
     if (grid) {
@@ -33,15 +62,134 @@ async function loadCats() {
           </button>
         </div>`;
     }
+  } finally {
+    state.loading = false;
+  }
+}
+
+async function loadMoreCats() {
+  if (state.loading || !state.nextCursor) return;
+  await loadCats(true);
+  renderCatalog();
+}
+
+/** Догружает котов из корзины, которых нет в текущей выдаче. */
+async function ensureCartCats() {
+  const missing = state.cart.filter(id => !catIndex.has(id));
+  if (!missing.length || !BOT_API_URL) return;
+  try {
+    const resp = await fetch(BOT_API_URL + '/cats?ids=' + missing.join(','));
+    if (!resp.ok) throw new Error('HTTP ' + resp.status);
+    rememberCats((await resp.json()).items);
+  } catch (err) {
+    console.error('[ensureCartCats]', err);
+  }
+}
+
+// ============================================================
+//  LIVE UPDATES — изменения каталога с сервера (Server-Sent Events)
+// ============================================================
+function rerenderPage() {
+  switch (state.page) {
+    case 'catalog': renderCatalog(); break;
+    case 'detail':  renderDetail(state.detailCatId); break;
+    case 'cart':    renderCart(); break;
+    case 'order':   renderOrderForm(); break;
+  }
+}
+
+function catAdded(cat) {
+  rememberCats([cat]);
+  const fits = state.category === 'all' || state.category === cat.gender;
+  if (state.sort === 'new' && fits && !CATS.some(c => c.id === cat.id)) CATS.unshift(cat);
+}
+
+function catRemoved(id) {
+  catIndex.delete(id);
+  CATS = CATS.filter(cat => cat.id !== id);
+  if (state.cart.includes(id)) {
+    state.cart = state.cart.filter(cartId => cartId !== id);
+    saveCart();
+    updateCartBadge();
+  }
+}
+
+function catsUpdated(changes) {
+  changes.forEach(change => {
+    const cat = findCat(change.id);
+    if (cat) Object.assign(cat, change);
+  });
+}
+
+/** После удаления котят: если открыта карточка одного из них — назад в каталог. */
+function rerenderAfterRemove(ids) {
+  if (state.page === 'detail' && ids.includes(state.detailCatId)) navigate('catalog');
+  else rerenderPage();
+}
+
+/** Перечитывает текущую выдачу с сервера, мимо кэша. */
+async function reloadCats() {
+  if (state.searchIds) return;
+  await loadCats(false, true);
+  rerenderPage();
+}
+
+/**
+ * Догоняет выдачу, показанную из кэша: сервер присылает только котят,
+ * изменённых после state.catalogVersion, и id удалённых.
+ */
+async function syncCatalog() {
+  if (!BOT_API_URL || state.catalogVersion == null) return;
+  try {
+    const resp = await fetch(BOT_API_URL + '/cats/changes?since=' + state.catalogVersion);
+    if (!resp.ok) throw new Error('HTTP ' + resp.status);
+    const delta = await resp.json();
+    if (delta.reset) {
+      await reloadCats();
+      return;
+    }
+    delta.cats.forEach(cat => (catIndex.has(cat.id) ? catsUpdated([cat]) : catAdded(cat)));
+    delta.removed.forEach(catRemoved);
+    state.catalogVersion = delta.version;
+    if (delta.cats.length || delta.removed.length) rerenderAfterRemove(delta.removed);
+  } catch (err) {
+    console.error('[syncCatalog]', err);
   }
 }
 
+function connectCatStream() {
+  if (!BOT_API_URL || !window.EventSource) return;
+  // since — версия, до которой выдача уже догнана: сервер пришлёт всё, что было после.
+  // Дальше EventSource сам переподключается и передаёт Last-Event-ID
+  const since = state.catalogVersion != null ? '?since=' + state.catalogVersion : '';
+  const source = new EventSource(BOT_API_URL + '/cats/stream' + since);
+
+  source.addEventListener('add', e => {
+    catAdded(JSON.parse(e.data).cat);
+    if (state.page === 'catalog') renderCatalog();
+  });
+
+  source.addEventListener('remove', e => {
+    const { id } = JSON.parse(e.data);
+    catRemoved(id);
+    rerenderAfterRemove([id]);
+  });
+
+  source.addEventListener('update', e => {
+    catsUpdated(JSON.parse(e.data).cats);
+    rerenderPage();
+  });
+
+  // Пропущено слишком много изменений — перечитываем текущую выдачу
+  source.addEventListener('reset', reloadCats);
+}
+
 async function retryLoadCats() {
   const grid = document.getElementById('catalog-grid');
   if (grid) {
     grid.innerHTML = '<div class="no-results"><div class="no-results-emoji">⏳</div><p>Загрузка...</p></div>';
   }
-  await loadCats();
+  await loadCats(false, true);
   renderCatalog();
 }
 
@@ -53,8 +201,13 @@ const state = {
   prevPage: null,
   cart: [],
   category: 'all',
+  sort: 'id',
   search: '',
+  searchIds: null,             // результат поиска на сервере (id по релевантности)
   detailCatId: null,
+  nextCursor: null,
+  loading: false,
+  catalogVersion: null,        // версия каталога, до которой догнана выдача
 };
 
 // ============================================================
@@ -83,9 +236,17 @@ document.addEventListener('DOMContentLoaded', async () => {
     grid.innerHTML = '<div class="no-results"><div class="no-results-emoji">⏳</div><p>Загрузка каталога...</p></div>';
   }
 
+  // При следующих открытиях оболочка и каталог берутся из кэша (см. sw.js)
+  if ('serviceWorker' in navigator) {
+    navigator.serviceWorker.register('sw.js').catch(err => console.error('[sw]', err));
+  }
+
   await loadCats();
   renderCatalog();
   updateCartBadge();
+  ensureCartCats();
+  await syncCatalog();
+  connectCatStream();
 });
 
 // ============================================================
@@ -131,7 +292,7 @@ function navigate(page, data) {
 
   // Update title
   if (page === 'detail') {
-    const cat = CATS.find(c => c.id === data);
+    const cat = findCat(data);
     document.getElementById('header-title').textContent = cat ? cat.name : 'Кот';
   } else {
     document.getElementById('header-title').textContent = PAGE_TITLES[page] || '';
@@ -141,8 +302,8 @@ function navigate(page, data) {
   switch (page) {
     case 'catalog':  renderCatalog(); break;
     case 'detail':   state.detailCatId = data; renderDetail(data); break;
-    case 'cart':     renderCart(); break;
-    case 'order':    renderOrderForm(); break;
+    case 'cart':     ensureCartCats().then(renderCart); break;
+    case 'order':    ensureCartCats().then(renderOrderForm); break;
   }
 }
 
@@ -167,19 +328,20 @@ function renderCatalog() {
     return;
   }
 
+  const more = state.nextCursor && !state.searchIds
+    ? `<button class="btn-secondary load-more" onclick="loadMoreCats()">Показать ещё</button>`
+    : '';
+
   grid.innerHTML = cats.map(cat => `
     <div class="cat-card" onclick="navigate('detail', ${cat.id})">
       ${!cat.available ? '<div class="sold-overlay"><div class="sold-label">Продан</div></div>' : ''}
-      <img
-        class="cat-card-img"
-        src="${cat.image}"
-        alt="${cat.name}"
+      ${catImage(cat, 'cat-card-img', '50vw', `
         loading="lazy"
         onerror="this.outerHTML='<div class=\\'cat-img-placeholder\\'>🐱</div>'"
-      >
+      `)}
       <div class="cat-card-body">
-        <div class="cat-avail-badge ${cat.available ? 'available' : 'sold'}">
-          ${cat.available ? '✓ Доступен' : '✗ Продан'}
+        <div class="cat-avail-badge ${!cat.available ? 'sold' : cat.reserved ? 'reserved' : 'available'}">
+          ${!cat.available ? '✗ Продан' : cat.reserved ? '⏳ Забронирован' : '✓ Доступен'}
         </div>
         <div class="cat-card-name">${cat.name}</div>
         <div class="cat-card-breed">${cat.breed}</div>
@@ -189,33 +351,66 @@ function renderCatalog() {
         </div>
       </div>
     </div>
-  `).join('');
+  `).join('') + more;
 }
 
 function getFilteredCats() {
-  const q = state.search.toLowerCase();
-  return CATS.filter(cat => {
-    const catMatch = state.category === 'all' || cat.category === state.category;
-    const searchMatch = !q
-      || cat.name.toLowerCase().includes(q)
-      || cat.breed.toLowerCase().includes(q)
-      || cat.color.toLowerCase().includes(q);
-    return catMatch && searchMatch;
-  });
+  // Пол и сортировка применяются на сервере; поиск — тоже (см. runSearch)
+  if (!state.searchIds) return CATS;
+  return state.searchIds
+    .map(findCat)
+    .filter(cat => cat && (state.category === 'all' || cat.gender === state.category));
 }
 
-function setCategory(cat, btn) {
+async function setCategory(cat, btn) {
   state.category = cat;
   document.querySelectorAll('.chip').forEach(el => el.classList.remove('active'));
   btn.classList.add('active');
+  await loadCats();
+  renderCatalog();
+  syncCatalog();
+}
+
+async function setSort(sort) {
+  state.sort = sort;
+  await loadCats();
   renderCatalog();
+  syncCatalog();
 }
 
+let searchTimer = null;
+
 function handleSearch(value) {
   state.search = value;
   const clearBtn = document.getElementById('search-clear');
   if (clearBtn) clearBtn.classList.toggle('hidden', !value);
-  renderCatalog();
+  clearTimeout(searchTimer);
+  if (!value.trim()) {
+    state.searchIds = null;
+    renderCatalog();
+    return;
+  }
+  searchTimer = setTimeout(() => runSearch(value), 250);
+}
+
+/** Полнотекстовый поиск на сервере: id по релевантности → карточки. */
+async function runSearch(value) {
+  if (!BOT_API_URL) return;
+  try {
+    const resp = await fetch(BOT_API_URL + '/cats/search?q=' + encodeURIComponent(value));
+    if (!resp.ok) throw new Error('HTTP ' + resp.status);
+    const ids = (await resp.json()).items.map(item => item.id);
+    const missing = ids.filter(id => !catIndex.has(id));
+    if (missing.length) {
+      const more = await fetch(BOT_API_URL + '/cats?ids=' + missing.join(','));
+      if (more.ok) rememberCats((await more.json()).items);
+    }
+    if (state.search !== value) return;   // пока ждали ответ, запрос уже изменился
+    state.searchIds = ids;
+    renderCatalog();
+  } catch (err) {
+    console.error('[runSearch]', err);
+  }
 }
 
 function clearSearch() {
@@ -228,18 +423,15 @@ function clearSearch() {
 //  CAT DETAIL
 // ============================================================
 function renderDetail(catId) {
-  const cat = CATS.find(c => c.id === catId);
+  const cat = findCat(catId);
   if (!cat) return;
 
   const inCart = state.cart.includes(cat.id);
 
   document.getElementById('detail-content').innerHTML = `
-    <img
-      class="detail-image"
-      src="${cat.image}"
-      alt="${cat.name}"
+    ${catImage(cat, 'detail-image', '100vw', `
       onerror="this.outerHTML='<div class=\\'detail-image-placeholder\\'>🐱</div>'"
-    >
+    `)}
     <div class="detail-body">
       <div class="detail-header">
         <div class="detail-name">${cat.name}</div>
@@ -255,7 +447,9 @@ function renderDetail(catId) {
       </div>
       <div class="detail-section-label">Описание</div>
       <div class="detail-desc">${cat.description}</div>
-      ${cat.available
+      ${cat.available && cat.reserved
+        ? `<button class="btn-add-cart" disabled>Котёнок забронирован</button>`
+        : cat.available
         ? `<button
             id="btn-add-${cat.id}"
             class="btn-add-cart"
@@ -330,19 +524,16 @@ function renderCart() {
     return;
   }
 
-  const items = state.cart.map(id => CATS.find(c => c.id === id)).filter(Boolean);
+  const items = state.cart.map(findCat).filter(Boolean);
   const total = items.reduce((s, c) => s + c.price, 0);
 
   el.innerHTML = `
     <div class="cart-wrap">
       ${items.map(cat => `
         <div class="cart-item">
-          <img
-            class="cart-item-img"
-            src="${cat.image}"
-            alt="${cat.name}"
+          ${catImage(cat, 'cart-item-img', '80px', `
             onerror="this.style.visibility='hidden'"
-          >
+          `)}
           <div class="cart-item-info">
             <div class="cart-item-name">${cat.name}</div>
             <div class="cart-item-breed">${cat.breed}</div>
@@ -377,7 +568,7 @@ function confirmClearCart() {
 //  ORDER FORM
 // ============================================================
 function renderOrderForm() {
-  const items = state.cart.map(id => CATS.find(c => c.id === id)).filter(Boolean);
+  const items = state.cart.map(findCat).filter(Boolean);
   const total = items.reduce((s, c) => s + c.price, 0);
 
   const preview = document.getElementById('order-items-preview');
@@ -407,10 +598,10 @@ function renderOrderForm() {
 // ============================================================
 //  FORM SUBMISSIONS
 // ============================================================
-function submitOrder(e) {
+async function submitOrder(e) {
   e.preventDefault();
 
-  const items = state.cart.map(id => CATS.find(c => c.id === id)).filter(Boolean);
+  const items = state.cart.map(findCat).filter(Boolean);
   if (!items.length) {
     showToast('Корзина пуста', 'error');
     return;
@@ -427,7 +618,7 @@ function submitOrder(e) {
     ts:      new Date().toISOString(),
   };
 
-  sendToBot(data);
+  if (!await sendToBot(data)) return;
   clearCart();
   document.getElementById('order-form').reset();
   navigate('catalog');
@@ -475,10 +666,23 @@ async function sendToBot(data) {
       headers: {
         'Content-Type': 'application/json',
         'X-Secret': API_SECRET,
+        // Подписанные Telegram данные пользователя — по ним бот считает лимит запросов
+        'X-Telegram-Init-Data': window.Telegram?.WebApp?.initData || '',
       },
       body: JSON.stringify(data),
     });
 
+    if (resp.status === 409) {
+      // Кого-то из котят уже забронировали или продали — убираем их из корзины
+      const err = await resp.json().catch(() => ({}));
+      markUnavailable(err.unavailable || []);
+      showToast('Часть котят уже забронирована — корзина обновлена', 'error');
+      return false;
+    }
+    if (resp.status === 429) {
+      showToast('Слишком много запросов — попробуйте чуть позже', 'error');
+      return false;
+    }
     if (!resp.ok) {
       const err = await resp.json().catch(() => ({}));
       throw new Error(err.error || 'Server error ' + resp.status);
@@ -491,6 +695,17 @@ async function sendToBot(data) {
   }
 }
 
+function markUnavailable(ids) {
+  ids.forEach(id => {
+    const cat = findCat(id);
+    if (cat) cat.reserved = true;
+  });
+  state.cart = state.cart.filter(id => !ids.includes(id));
+  saveCart();
+  updateCartBadge();
+  if (state.page === 'order') renderOrderForm();
+}
+
 // ============================================================
 //  UTILS
 // ============================================================
@@ -502,6 +717,18 @@ function formatPrice(price) {
   }).format(price);
 }
 
+/** Фото кота: адаптивные превью (WebP + JPEG), если сервер их отдал, иначе исходник. */
+function catImage(cat, className, sizes, attrs = '') {
+  if (!cat.images) {
+    return `<img class="${className}" src="${cat.image}" alt="${cat.name}" ${attrs}>`;
+  }
+  return `<picture>
+      <source type="image/webp" srcset="${cat.images.srcset_webp}" sizes="${sizes}">
+      <img class="${className}" src="${cat.images.thumb}" srcset="${cat.images.srcset}"
+           sizes="${sizes}" alt="${cat.name}" ${attrs}>
+    </picture>`;
+}
+
 function formatAge(months) {
   if (months < 12) {
     const s = months === 1 ? 'месяц' : months < 5 ? 'месяца' : 'месяцев';
@@ -0,0 +1,88 @@
+'use strict';
+
+// ============================================================
+//  SERVICE WORKER — Mini App открывается из кэша, без ожидания сети
+//
+//  Оболочка (HTML/CSS/JS) и страницы каталога GET /cats?... отдаются из
+//  кэша сразу, а в фоне обновляются. Что изменилось с тех пор, app.js
+//  догружает через /cats/changes — обычно это несколько десятков байт.
+// ============================================================
+const SHELL_CACHE = 'cats-shell-v1';
+const DATA_CACHE  = 'cats-data-v1';
+const SHELL_FILES = ['./', 'index.html', 'style.css', 'app.js'];
+const DATA_MAX_ENTRIES = 50;   // страниц каталога в кэше; самые старые удаляются
+
+self.addEventListener('install', event => {
+  event.waitUntil(
+    caches.open(SHELL_CACHE)
+      .then(cache => cache.addAll(SHELL_FILES))
+      .then(() => self.skipWaiting())
+  );
+});
+
+self.addEventListener('activate', event => {
+  // Кэши прошлых версий воркера больше не нужны
+  event.waitUntil(
+    caches.keys()
+      .then(keys => Promise.all(keys
+        .filter(key => key !== SHELL_CACHE && key !== DATA_CACHE)
+        .map(key => caches.delete(key))))
+      .then(() => self.clients.claim())
+  );
+});
+
+self.addEventListener('fetch', event => {
+  const { request } = event;
+  if (request.method !== 'GET') return;
+  const url = new URL(request.url);
+
+  if (url.pathname === '/cats' && url.search) {
+    // Явный запрос в обход кэша (cache: 'no-cache') — из сети, но кэш обновляем
+    event.respondWith(request.cache === 'no-cache'
+      ? fromNetwork(request)
+      : staleWhileRevalidate(event, DATA_CACHE));
+  } else if (url.origin === self.location.origin && isShellRequest(request)) {
+    event.respondWith(staleWhileRevalidate(event, SHELL_CACHE));
+  }
+  // Остальное (поиск, /cats/changes, /cats/stream, фото, заказы) — как без воркера
+});
+
+/** Страница и её скрипты/стили. API бота может жить на том же домене — его не трогаем. */
+function isShellRequest(request) {
+  return request.mode === 'navigate' || ['script', 'style'].includes(request.destination);
+}
+
+async function fromNetwork(request) {
+  const resp = await fetch(request);
+  if (resp.ok) {
+    const cache = await caches.open(DATA_CACHE);
+    await cache.put(request, resp.clone());
+    trimCache(cache);
+  }
+  return resp;
+}
+
+/** Ответ из кэша сразу, если он есть; свежая копия скачивается в фоне для следующего раза. */
+async function staleWhileRevalidate(event, cacheName) {
+  const cache = await caches.open(cacheName);
+  // Telegram добавляет к адресу Mini App свои параметры — оболочка от них не зависит
+  const cached = await cache.match(event.request, { ignoreSearch: cacheName === SHELL_CACHE });
+  // fetch идёт через HTTP-кэш браузера: без изменений сервер ответит 304
+  const network = fetch(event.request).then(async resp => {
+    if (resp.ok) {
+      await cache.put(event.request, resp.clone());
+      if (cacheName === DATA_CACHE) trimCache(cache);
+    }
+    return resp;
+  });
+  if (cached) {
+    event.waitUntil(network.catch(() => {}));
+    return cached;
+  }
+  return network;
+}
+
+async function trimCache(cache) {
+  const keys = await cache.keys();
+  await Promise.all(keys.slice(0, -DATA_MAX_ENTRIES).map(key => cache.delete(key)));
+}
@@ -0,0 +1,93 @@
+"""
+Общие фикстуры тестов хранилища.
+
+Каждый тест с фикстурой storage идёт дважды: на SQLite во временном файле и
+на PostgreSQL. PostgreSQL берётся из TEST_DATABASE_URL, а без неё
+поднимается временный сервер через pgserver (pip install pgserver); если нет
+ни того, ни другого, PostgreSQL-варианты пропускаются. Каждый тест получает
+свою пустую схему PostgreSQL, так что тесты не видят данных друг друга.
+"""
+
+import os
+import sys
+import uuid
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'bot'))
+
+import storage as storage_module   # noqa: E402
+
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
+try:
+    import pgserver
+except ImportError:
+    pgserver = None
+
+
+@pytest.fixture
+def anyio_backend():
+    # aiosqlite и asyncpg работают только на asyncio
+    return 'asyncio'
+
+
+@pytest.fixture(scope='session')
+def pg_dsn(tmp_path_factory):
+    """Строка подключения к PostgreSQL для тестов или skip."""
+    if asyncpg is None:
+        pytest.skip('asyncpg не установлен')
+    dsn = os.getenv('TEST_DATABASE_URL')
+    if dsn:
+        yield dsn
+        return
+    if pgserver is None:
+        pytest.skip('нет TEST_DATABASE_URL и pgserver не установлен')
+    server = pgserver.get_server(tmp_path_factory.mktemp('pgdata'))
+    try:
+        yield server.get_uri()
+    finally:
+        server.cleanup()
+
+
+def _with_search_path(dsn, schema):
+    # Незнакомые параметры DSN asyncpg передаёт серверу как настройки сессии
+    return '{}{}search_path={}'.format(dsn, '&' if '?' in dsn else '?', schema)
+
+
+@pytest.fixture(params=['sqlite', 'postgres'])
+async def empty_storage(request, tmp_path):
+    """Открытое хранилище без схемы: init() ещё не вызывался."""
+    if request.param == 'sqlite':
+        db = storage_module.SqliteStorage(str(tmp_path / 'cats.db'), readers=2)
+        await db.open()
+        try:
+            yield db
+        finally:
+            await db.close()
+        return
+
+    dsn = request.getfixturevalue('pg_dsn')
+    schema = 'test_{}'.format(uuid.uuid4().hex[:12])
+    conn = await asyncpg.connect(dsn)
+    try:
+        await conn.execute('CREATE SCHEMA {}'.format(schema))
+        db = storage_module.PostgresStorage(_with_search_path(dsn, schema), pool_size=4)
+        await db.open()
+        try:
+            yield db
+        finally:
+            await db.close()
+            await conn.execute('DROP SCHEMA {} CASCADE'.format(schema))
+    finally:
+        await conn.close()
+
+
+@pytest.fixture
+async def storage(empty_storage):
+    """Хранилище с последней схемой и пустым каталогом."""
+    await empty_storage.init(())
+    return empty_storage
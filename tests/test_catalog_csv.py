@@ -0,0 +1,37 @@
+"""
+Импорт и экспорт каталога: parse_cats_file читает то, что пишет export_chunk.
+"""
+
+import pytest
+
+import bot
+
+CATS = [
+    (1, 'Барсик', 'Донской сфинкс', 3, 'male', 15000, 'серый',
+     'Ласковая, игривая; любит "тепло"', '', 1),
+    (2, 'Мурка "Звёздочка"', 'Мейн-кун', 4, 'female', 20000, '', '"Кавычки" в начале, и\tтаб', '', 0),
+]
+
+
+@pytest.mark.parametrize('rows', [CATS[:1], CATS[1:], CATS])
+def test_export_import_round_trip(rows):
+    data = bot.export_chunk(rows[:1], 'csv', True) + bot.export_chunk(rows[1:], 'csv', False)
+    assert bot.parse_cats_file(data.encode(), 'csv') == [row[1:] for row in rows]
+
+
+@pytest.mark.parametrize('delimiter', [',', ';', '\t'])
+def test_import_delimiters(delimiter):
+    lines = [
+        ['name', 'breed', 'age_months', 'gender', 'price', 'description'],
+        ['Барсик', 'Сфинкс', '3', 'кот', '15 000', '"Ласковая, игривая; любит ""тепло"""'],
+    ]
+    data = '\r\n'.join(delimiter.join(line) for line in lines).encode('utf-8-sig')
+    assert bot.parse_cats_file(data, 'csv') == [
+        ('Барсик', 'Сфинкс', 3, 'male', 15000, '', 'Ласковая, игривая; любит "тепло"', '', 1)]
+
+
+def test_import_reports_errors():
+    data = 'name,age_months,gender,price\nБарсик,3,кот,0\n,3,кот,100\n'.encode()
+    with pytest.raises(bot.CatalogImportError) as exc:
+        bot.parse_cats_file(data, 'csv')
+    assert exc.value.errors == ['строка 2: price должен быть больше нуля', 'строка 3: нет имени']
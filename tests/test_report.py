@@ -0,0 +1,41 @@
+"""
+/report и /orders: дни и время считаются в часовом поясе REPORT_TZ.
+"""
+
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+import bot
+import templates
+
+BERLIN = ZoneInfo('Europe/Berlin')
+
+
+def utc(ts):
+    return datetime.fromtimestamp(ts, timezone.utc)
+
+
+def test_report_since_starts_at_midnight():
+    now = datetime(2025, 7, 15, 15, 20, tzinfo=BERLIN)
+    assert utc(bot.report_since(1, now)) == datetime(2025, 7, 14, 22, 0, tzinfo=timezone.utc)
+    assert utc(bot.report_since(7, now)) == datetime(2025, 7, 8, 22, 0, tzinfo=timezone.utc)
+
+
+def test_report_since_across_dst():
+    # 30 марта 2025 Берлин перешёл на летнее время: неделя назад полночь была в UTC+1
+    now = datetime(2025, 3, 31, 0, 10, tzinfo=BERLIN)
+    assert utc(bot.report_since(1, now)) == datetime(2025, 3, 30, 22, 0, tzinfo=timezone.utc)
+    assert utc(bot.report_since(7, now)) == datetime(2025, 3, 24, 23, 0, tzinfo=timezone.utc)
+
+
+def test_order_times_in_report_zone():
+    # 2025-07-15 22:30 UTC — уже 16.07 00:30 в Берлине
+    created = 1752618600
+    text = templates.order_message(7, {'name': 'Аня', 'phone': '+7'},
+                                   [{'name': 'Барсик', 'breed': 'Сфинкс', 'price': 15000}],
+                                   15000, created + 3600, BERLIN)
+    assert 'Бронь до 16.07 01:30' in text
+
+    orders = [{'id': 7, 'created_at': created, 'name': 'Аня', 'phone': '+7', 'total': 15000,
+               'items': 1}]
+    assert '16.07 00:30' in templates.pending_orders(orders, BERLIN)
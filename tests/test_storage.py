@@ -0,0 +1,332 @@
+"""
+Поведение, одинаковое для SqliteStorage и PostgresStorage.
+
+Тесты параметризованы фикстурой storage (см. conftest.py): один и тот же
+сценарий проверяется на обеих СУБД.
+"""
+
+import time
+
+import pytest
+
+import storage as storage_module
+from storage import CAT_FIELDS, CatsUnavailable, PostgresStorage, Storage
+
+pytestmark = pytest.mark.anyio
+
+
+def cat(name, price=10000, breed='Донской сфинкс', age_months=3, gender='male', available=1):
+    """Кортеж CAT_FIELDS для add_cat, import_cats и seed."""
+    return (name, breed, age_months, gender, price, '', '', '', available)
+
+
+def render(order_id, items, total, reserved_until):
+    return 'Заказ #{}: {} на {}'.format(order_id, ', '.join(i['name'] for i in items), total)
+
+
+async def order(storage, cat_ids, now, reserved_until, chats=()):
+    items = [(cat_id, 'Из формы', 'Из формы', 1) for cat_id in cat_ids]
+    return await storage.create_order('Покупатель', '+70000000000', '', '', items, list(chats),
+                                      render, now, reserved_until)
+
+
+def test_backend_must_implement_every_method():
+    class Partial(Storage):
+        def placeholder(self, n):
+            return '?'
+
+    with pytest.raises(TypeError):
+        Partial()
+
+
+# ──────────────── Миграции ────────────────
+SEED = [cat('Барсик'), cat('Мурка', gender='female')]
+
+
+@pytest.fixture
+def migrations(empty_storage, monkeypatch):
+    """Функция, добавляющая хранилищу шаг миграции из SQL-скрипта."""
+    def add(name, sql):
+        if isinstance(empty_storage, PostgresStorage):
+            monkeypatch.setattr(storage_module, 'PG_MIGRATIONS',
+                                storage_module.PG_MIGRATIONS + ((name, sql),))
+        else:
+            async def step(self, db):
+                await self._script(db, sql)
+            monkeypatch.setattr(empty_storage, 'MIGRATIONS',
+                                empty_storage.MIGRATIONS + ((name, step),), raising=False)
+    return add
+
+
+async def test_init_creates_schema_and_seeds_once(empty_storage):
+    latest = len(storage_module.PG_MIGRATIONS)
+    assert await empty_storage.init(SEED) == (0, latest)
+    assert [c['name'] for c in await empty_storage.get_cats()] == ['Барсик', 'Мурка']
+
+    assert await empty_storage.init(SEED) == (latest, latest)
+    assert len(await empty_storage.get_cats()) == 2
+
+
+async def test_init_applies_only_new_migrations(empty_storage, migrations):
+    latest = len(storage_module.PG_MIGRATIONS)
+    await empty_storage.init(SEED)
+    migrations('заметки', 'CREATE TABLE notes (id INTEGER PRIMARY KEY, text TEXT NOT NULL);')
+
+    assert await empty_storage.init(SEED) == (latest, latest + 1)
+    assert await empty_storage._fetch('SELECT * FROM notes') == []
+    assert len(await empty_storage.get_cats()) == 2
+
+
+async def test_failed_migration_rolls_back(empty_storage, migrations, monkeypatch):
+    latest = len(storage_module.PG_MIGRATIONS)
+    await empty_storage.init(SEED)
+    migrations('сломанная', 'CREATE TABLE notes (id INTEGER PRIMARY KEY);\n'
+                            'INSERT INTO no_such_table VALUES (1);')
+
+    with pytest.raises(Exception):
+        await empty_storage.init(SEED)
+    with pytest.raises(Exception):
+        await empty_storage._fetch('SELECT * FROM notes')
+    assert len(await empty_storage.get_cats()) == 2
+
+    # Версия схемы осталась прежней: без сломанного шага мигрировать нечего
+    monkeypatch.undo()
+    assert await empty_storage.init(SEED) == (latest, latest)
+
+
+# ──────────────── Каталог ────────────────
+async def test_catalog_crud(storage):
+    version, _ = await storage.get_catalog_version()
+
+    cat_id, added, row = await storage.add_cat(cat('Барсик', price=15000), 'key1')
+    assert added > version
+    assert row['name'] == 'Барсик' and row['price'] == 15000 and row['photo_key'] == 'key1'
+    assert (await storage.get_cat(cat_id))['name'] == 'Барсик'
+
+    hidden = await storage.set_available(cat_id, False)
+    assert hidden > added
+    assert (await storage.get_cat(cat_id))['available'] == 0
+    assert await storage.set_available(cat_id, False) is None
+
+    await storage.set_cat_file_id(cat_id, 'AgAD')
+    assert (await storage.get_cat(cat_id))['tg_file_id'] == 'AgAD'
+    assert (await storage.get_catalog_version())[0] == hidden
+
+    removed = await storage.remove_cat(cat_id)
+    assert removed > hidden
+    assert await storage.get_cat(cat_id) is None
+    assert await storage.remove_cat(cat_id) is None
+
+    now, cats, gone = await storage.get_catalog_changes(version, 100)
+    assert now == removed and cats == [] and gone == [cat_id]
+
+
+async def test_import_cats(storage):
+    await storage.add_cat(cat('Первый'), '')
+    rows = [cat('Кот {}'.format(i), price=1000 + i) for i in range(500)]
+
+    version = await storage.import_cats(rows)
+    assert version == (await storage.get_catalog_version())[0]
+    cats = await storage.get_cats()
+    assert len(cats) == 501
+    assert [c['name'] for c in cats[1:]] == [r[0] for r in rows]
+
+    batches = [batch async for batch in storage.iter_cats(200)]
+    assert [len(b) for b in batches] == [200, 200, 101]
+    assert tuple(batches[-1][-1])[1:] == rows[-1]
+    assert len(tuple(batches[0][0])) == len(CAT_FIELDS) + 1
+
+
+@pytest.mark.parametrize('sort', sorted(storage_module.CAT_SORTS))
+async def test_query_cats_keyset_pages(storage, sort):
+    # Повторяющиеся цены и возраст: порядок внутри них держит вторичный ключ id
+    await storage.import_cats([
+        cat('Кот {}'.format(i), price=1000 * (i % 4), age_months=2 + i % 3,
+            gender='female' if i % 2 else 'male')
+        for i in range(23)
+    ])
+    column, direction = storage_module.CAT_SORTS[sort]
+    everyone = await storage.get_cats()
+    expected = sorted(everyone, key=lambda c: (c[column], c['id']),
+                      reverse=direction == 'DESC')
+
+    pages, after = [], None
+    while True:
+        cats, after = await storage.query_cats(sort=sort, after=after, limit=5)
+        pages.append(cats)
+        if after is None:
+            break
+    assert [len(p) for p in pages] == [5, 5, 5, 5, 3]
+    assert [c['id'] for p in pages for c in p] == [c['id'] for c in expected]
+
+
+async def test_query_cats_filters(storage):
+    await storage.import_cats([
+        cat('А', price=5000, gender='male', breed='Сфинкс'),
+        cat('Б', price=7000, gender='female', breed='Сфинкс'),
+        cat('В', price=9000, gender='female', breed='Мейн-кун', available=0),
+    ])
+    ids = {c['name']: c['id'] for c in await storage.get_cats()}
+
+    async def names(**filters):
+        cats, after = await storage.query_cats(**filters)
+        assert after is None
+        return [c['name'] for c in cats]
+
+    assert await names(gender='female') == ['Б', 'В']
+    assert await names(available=True) == ['А', 'Б']
+    assert await names(breed='Сфинкс', min_price=6000) == ['Б']
+    assert await names(max_price=7000, sort='price_desc') == ['Б', 'А']
+    assert await names(ids=[ids['В'], ids['А']]) == ['А', 'В']
+    assert await names(ids=[]) == []
+
+
+# ──────────────── Заказы и бронь ────────────────
+async def test_create_order_reserves_and_takes_catalog_data(storage):
+    await storage.import_cats([cat('Барсик', price=15000, breed='Сфинкс'), cat('Мурка', price=9000)])
+    barsik, murka = [c['id'] for c in await storage.get_cats()]
+    now = int(time.time())
+
+    order_id, reserved, version = await order(storage, [murka, barsik, None], now, now + 600,
+                                              chats=['-100'])
+    assert reserved == sorted([barsik, murka])
+    assert version == (await storage.get_catalog_version())[0]
+    assert (await storage.get_cat(barsik))['reserved_order'] == order_id
+
+    # Имя, порода и цена известных котят — из каталога, а не из формы
+    items = await storage._fetch(
+        'SELECT cat_id, name, breed, price FROM order_items WHERE order_id = {} ORDER BY id'.format(
+            storage.placeholder(1)), (order_id,))
+    assert [(i['cat_id'], i['name'], i['breed'], i['price']) for i in items] == [
+        (murka, 'Мурка', 'Донской сфинкс', 9000),
+        (barsik, 'Барсик', 'Сфинкс', 15000),
+        (None, 'Из формы', 'Из формы', 1),
+    ]
+    pending = await storage.get_pending_orders(10)
+    assert [(o['id'], o['total'], o['items']) for o in pending] == [(order_id, 24001, 3)]
+
+    # В outbox чата: текст заказа, за ним карточки забронированных котят
+    messages, _ = await storage.get_due_outbox(10)
+    assert [m['cat_id'] for m in messages] == [None] + sorted([barsik, murka])
+    assert messages[0]['text'] == 'Заказ #{}: Мурка, Барсик, Из формы на 24001'.format(order_id)
+
+
+async def test_create_order_conflict_rolls_back(storage):
+    await storage.import_cats([cat('Барсик'), cat('Мурка'), cat('Пушок', available=0)])
+    barsik, murka, pushok = [c['id'] for c in await storage.get_cats()]
+    now = int(time.time())
+    first, _, _ = await order(storage, [barsik], now, now + 600)
+    version, _ = await storage.get_catalog_version()
+
+    with pytest.raises(CatsUnavailable) as exc:
+        await order(storage, [murka, barsik, pushok, 999999], now, now + 600, chats=['-100'])
+    assert exc.value.cat_ids == sorted([barsik, pushok, 999999])
+
+    # Откатилось всё: бронь Мурки, сам заказ и его сообщения
+    assert (await storage.get_cat(murka))['reserved_until'] is None
+    assert (await storage.get_cat(barsik))['reserved_order'] == first
+    assert [o['id'] for o in await storage.get_pending_orders(10)] == [first]
+    assert (await storage.get_due_outbox(10))[0] == []
+    assert (await storage.get_catalog_version())[0] == version
+
+    # Истёкшая бронь не мешает новому заказу
+    second, reserved, _ = await order(storage, [barsik], now + 600, now + 1200)
+    assert reserved == [barsik]
+    assert (await storage.get_cat(barsik))['reserved_order'] == second
+
+
+async def test_expire_reservations(storage):
+    await storage.import_cats([cat('Барсик'), cat('Мурка'), cat('Пушок')])
+    barsik, murka, pushok = [c['id'] for c in await storage.get_cats()]
+    now = int(time.time())
+    await order(storage, [barsik], now, now + 100)
+    await order(storage, [murka], now, now + 300)
+
+    assert await storage.expire_reservations(now + 50) == ([], None)
+
+    expired, version = await storage.expire_reservations(now + 100)
+    assert expired == [barsik]
+    assert version == (await storage.get_catalog_version())[0]
+    assert (await storage.get_cat(barsik))['reserved_until'] is None
+    assert (await storage.get_cat(murka))['reserved_until'] == now + 300
+
+    _, cats, removed = await storage.get_catalog_changes(version - 1, 10)
+    assert [c['id'] for c in cats] == [barsik] and removed == []
+    assert (await storage.get_cat(pushok))['reserved_until'] is None
+
+
+async def test_order_status(storage):
+    await storage.import_cats([cat('Барсик'), cat('Мурка')])
+    barsik, murka = [c['id'] for c in await storage.get_cats()]
+    now = int(time.time())
+    sold, _, _ = await order(storage, [barsik], now, now + 600)
+    cancelled, _, _ = await order(storage, [murka], now, now + 600)
+
+    assert (await storage.set_order_status(sold, 'done'))[0] == [barsik]
+    assert (await storage.get_cat(barsik))['available'] == 0
+    assert (await storage.set_order_status(cancelled, 'cancelled'))[0] == [murka]
+    assert (await storage.get_cat(murka))['reserved_until'] is None
+    assert await storage.set_order_status(999999, 'done') is None
+
+
+async def test_revenue_by_day_in_time_zone(storage):
+    await storage.import_cats([cat('Барсик', price=15000), cat('Мурка', price=9000),
+                               cat('Пушок', price=5000)])
+    barsik, murka, pushok = [c['id'] for c in await storage.get_cats()]
+    # В Берлине зимой UTC+1, летом UTC+2: оба заказа сделаны в 00:30 по местному времени
+    winter = 1736983800    # 2025-01-15 23:30 UTC
+    summer = 1752618600    # 2025-07-15 22:30 UTC
+    evening = summer - 3600
+    for cat_id, created_at in ((barsik, winter), (murka, summer), (pushok, evening)):
+        await order(storage, [cat_id], created_at, created_at + 600)
+
+    def days(rows):
+        return [(r['day'], r['orders'], r['revenue']) for r in rows]
+
+    assert days(await storage.revenue_by_day(0, 'UTC')) == [
+        ('2025-01-15', 1, 15000), ('2025-07-15', 2, 14000)]
+    assert days(await storage.revenue_by_day(0, 'Europe/Berlin')) == [
+        ('2025-01-16', 1, 15000), ('2025-07-15', 1, 5000), ('2025-07-16', 1, 9000)]
+    assert days(await storage.revenue_by_day(summer, 'Europe/Berlin')) == [('2025-07-16', 1, 9000)]
+
+
+# ──────────────── Outbox ────────────────
+async def test_outbox_sent_and_retry(storage):
+    await storage.enqueue_messages([(1, 'первое'), (2, 'второе'), (3, 'третье')], 'HTML')
+    messages, next_at = await storage.get_due_outbox(10)
+    assert [m['text'] for m in messages] == ['первое', 'второе', 'третье']
+    assert [m['chat_id'] for m in messages] == ['1', '2', '3']
+    first, second, third = [m['id'] for m in messages]
+
+    retry_at = time.time() + 1000
+    await storage.outbox_sent(first)
+    await storage.outbox_failed(second, 1, 'timeout', retry_at)
+    await storage.outbox_failed(third, 5, 'chat not found', None)
+
+    messages, next_at = await storage.get_due_outbox(10)
+    assert messages == []
+    assert next_at == pytest.approx(retry_at)
+    rows = await storage._fetch('SELECT id, status, attempts, last_error FROM outbox ORDER BY id')
+    assert [tuple(r.values()) for r in rows] == [
+        (second, 'pending', 1, 'timeout'), (third, 'failed', 5, 'chat not found')]
+
+
+async def test_outbox_lease(storage):
+    await storage.enqueue_messages([(1, 'a'), (2, 'b'), (3, 'c')], 'HTML')
+
+    taken, _ = await storage.get_due_outbox(2)
+    assert [m['text'] for m in taken] == ['a', 'b']
+    again, next_at = await storage.get_due_outbox(10)
+    if isinstance(storage, PostgresStorage):
+        # Реплики делят outbox: взятые сообщения скрыты на OUTBOX_LEASE секунд
+        assert [m['text'] for m in again] == ['c']
+        assert next_at == pytest.approx(time.time() + PostgresStorage.OUTBOX_LEASE, abs=5)
+    else:
+        # SQLite — один процесс-отправитель, аренда не нужна
+        assert [m['text'] for m in again] == ['a', 'b', 'c']
+        assert next_at is None
+
+    # Неудачная отправка возвращает сообщение в очередь к назначенному времени
+    await storage.outbox_failed(taken[0]['id'], 1, 'timeout', time.time() - 1)
+    retried, _ = await storage.get_due_outbox(10)
+    assert taken[0]['id'] in [m['id'] for m in retried]